@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+"""
+Compare the CEL correlation grouping of the generator against the previous
+pairwise implementation on synthetic CEL batches.
+
+usage: python3 contribs/benchmarks/group_cels_by_shared_channels.py [--cels 100000]
+"""
+
+import argparse
+import random
+import time
+from collections import namedtuple
+from itertools import groupby
+from operator import attrgetter
+
+from wazo_call_logd.generator import _group_cels_by_shared_channels
+
+FakeCEL = namedtuple('FakeCEL', ('id', 'linkedid', 'uniqueid', 'eventtime'))
+
+
+def legacy_group_cels_by_shared_channels(cels):
+    cels = sorted(cels, key=attrgetter('linkedid'))
+    linkedid_sequences = [
+        (linkedid, list(cels))
+        for linkedid, cels in groupby(cels, key=attrgetter('linkedid'))
+    ]
+    correlation_groups = []
+    for linkedid, cels in linkedid_sequences:
+        uniqueids = {cel.uniqueid for cel in cels}
+        correlated_sequences = False
+        for (
+            correlated_uniqueids,
+            correlated_linkedids,
+            correlated_cels,
+        ) in correlation_groups:
+            if uniqueids & correlated_uniqueids:
+                correlated_cels.extend(cels)
+                correlated_uniqueids.update(uniqueids)
+                correlated_sequences = True
+                correlated_linkedids.add(linkedid)
+        if not correlated_sequences:
+            correlation_groups.append((uniqueids, {linkedid}, list(cels)))
+
+    yield from (
+        (linkedids, sorted(cels, key=attrgetter('eventtime')))
+        for (uniqueids, linkedids, cels) in correlation_groups
+    )
+
+
+def generate_cels(
+    cel_count, cels_per_channel=8, channels_per_call=3, pickup_ratio=0.05
+):
+    cels = []
+    call = 0
+    previous_uniqueid = None
+    while len(cels) < cel_count:
+        linkedid = f'1700000000.{call}'
+        uniqueids = [f'1700000000.{call}-{i}' for i in range(channels_per_call)]
+        if previous_uniqueid and random.random() < pickup_ratio:
+            # a channel shared with the previous call, e.g. a call pickup
+            uniqueids.append(previous_uniqueid)
+        for uniqueid in uniqueids:
+            for _ in range(cels_per_channel):
+                cels.append(
+                    FakeCEL(len(cels), linkedid, uniqueid, call + random.random())
+                )
+        previous_uniqueid = uniqueids[0]
+        call += 1
+    random.shuffle(cels)
+    return cels[:cel_count]
+
+
+def measure(name, grouping, cels):
+    start = time.perf_counter()
+    groups = list(grouping(cels))
+    elapsed = time.perf_counter() - start
+    grouped_cels = sum(len(group_cels) for _, group_cels in groups)
+    print(
+        f'{name:>12}: {elapsed:8.3f}s, {len(groups)} groups, {grouped_cels} grouped CEL'
+    )
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cels', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args()
+
+    random.seed(options.seed)
+    cels = generate_cels(options.cels)
+    print(f'{len(cels)} CEL')
+    union_find = measure('union-find', _group_cels_by_shared_channels, cels)
+    legacy = measure('pairwise', legacy_group_cels_by_shared_channels, cels)
+    print(f'speedup: {legacy / union_find:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
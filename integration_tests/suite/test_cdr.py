@@ -1,7 +1,9 @@
-# Copyright 2017-2024 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2017-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import base64
 import csv
+import json
 from io import StringIO
 
 import requests
@@ -20,6 +22,8 @@ from hamcrest import (
     has_key,
     has_length,
     has_properties,
+    none,
+    starts_with,
 )
 from wazo_call_logd_client.exceptions import CallLogdError
 from wazo_test_helpers.auth import MockUserToken
@@ -1089,6 +1093,29 @@ class TestListCDR(IntegrationTest):
                 ),
             )
 
+    @call_log(
+        **{'id': 12},
+        date='2017-03-23 00:00:00',
+        date_answer='2017-03-23 00:01:00',
+        date_end='2017-03-23 00:02:27',
+        destination_exten='3378',
+        source_exten='7687',
+        recordings=[
+            {
+                'start_time': '2017-03-23 00:01:01',
+                'end_time': '2017-03-23 00:01:26',
+                'path': '/tmp/foobar.wav',
+            },
+        ],
+    )
+    def test_list_cdr_in_csv_has_the_same_columns_as_get_cdr_by_id_csv(self):
+        listed_raw = self.call_logd.cdr.list_csv()
+        single_raw = self.call_logd.cdr.get_by_id_csv(12)
+
+        listed_headers = next(csv.reader(StringIO(listed_raw)))
+        single_headers = next(csv.reader(StringIO(single_raw)))
+        assert_that(listed_headers, equal_to(single_headers))
+
     def test_given_error_when_list_cdr_as_csv_then_return_error_in_csv(self):
         assert_that(
             calling(self.call_logd.cdr.list_csv).with_args(from_='wrong'),
@@ -1240,6 +1267,111 @@ class TestListCDR(IntegrationTest):
             ),
         )
 
+    @call_log(date='2017-04-10', date_answer=None, date_end='2017-04-10')
+    @call_log(date='2017-04-11', date_answer=None, date_end='2017-04-11')
+    @call_log(
+        date='2017-04-12', date_answer='2017-04-12', date_end='2017-04-12 00:00:01'
+    )
+    @call_log(
+        date='2017-04-12', date_answer='2017-04-12', date_end='2017-04-12 00:00:01'
+    )
+    @call_log(
+        date='2017-04-13', date_answer='2017-04-13', date_end='2017-04-13 00:00:02'
+    )
+    def test_given_call_logs_when_list_cdr_with_cursor_then_list_next_cdr(self):
+        for order, direction in (
+            ('start', 'desc'),
+            ('start', 'asc'),
+            ('duration', 'desc'),
+            ('duration', 'asc'),
+        ):
+            expected = self.call_logd.cdr.list(order=order, direction=direction)
+
+            items, cursor = [], None
+            while True:
+                params = {'order': order, 'direction': direction, 'limit': 2}
+                if cursor:
+                    params['cursor'] = cursor
+                result = self.call_logd.cdr.list(**params)
+                items.extend(result['items'])
+                cursor = result.get('next')
+                if not cursor:
+                    break
+
+            assert_that(items, contains_exactly(*expected['items']))
+
+    @call_log(date='2017-04-10')
+    @call_log(date='2017-04-11')
+    def test_given_call_logs_when_list_cdr_without_count_then_no_totals(self):
+        result = self.call_logd.cdr.list(count='none', limit=1)
+
+        assert_that(
+            result,
+            has_entries(items=has_length(1), total=None, filtered=None),
+        )
+
+    @call_log(**{'id': 1}, date='2017-04-10')
+    @call_log(**{'id': 2}, date='2017-04-11')
+    @call_log(**{'id': 3}, date='2017-04-12')
+    def test_given_call_logs_when_list_cdr_as_ndjson_then_one_cdr_per_line(self):
+        port = self.service_port(9298, 'call-logd')
+        url = f'http://127.0.0.1:{port}/1.0/cdr'
+        expected = self.call_logd.cdr.list(order='start', direction='desc')
+
+        for params, headers in (
+            ({'format': 'ndjson'}, {}),
+            ({}, {'Accept': 'application/x-ndjson'}),
+        ):
+            response = requests.get(
+                url,
+                params={'order': 'start', 'direction': 'desc', **params},
+                headers={'X-Auth-Token': MASTER_TOKEN, **headers},
+            )
+
+            assert_that(response.status_code, equal_to(200))
+            assert_that(
+                response.headers['Content-Type'],
+                starts_with('application/x-ndjson'),
+            )
+            result = [json.loads(line) for line in response.text.splitlines()]
+            assert_that(result, contains_exactly(*expected['items']))
+
+    @call_log(date='2017-04-10')
+    @call_log(date='2017-04-11')
+    def test_given_cursor_of_other_order_when_list_cdr_then_400(self):
+        cursor = self.call_logd.cdr.list(order='start', limit=1)['next']
+
+        for params in ({'cursor': 'invalid'}, {'order': 'id', 'cursor': cursor}):
+            assert_that(
+                calling(self.call_logd.cdr.list).with_args(**params),
+                raises(CallLogdError).matching(
+                    has_properties(status_code=400, details=has_key('cursor'))
+                ),
+            )
+
+    @call_log(
+        date='2017-04-10',
+        participants=[{'user_uuid': str(USER_1_UUID), 'role': 'source'}],
+    )
+    @call_log(
+        date='2017-04-11',
+        participants=[{'user_uuid': str(USER_2_UUID), 'role': 'source'}],
+    )
+    def test_given_participant_order_when_list_cdr_with_cursor_then_400(self):
+        result = self.call_logd.cdr.list(order='source_user_uuid', limit=1)
+        assert_that(result.get('next'), none())
+
+        cursor = ['source_user_uuid', 'desc', str(USER_2_UUID), 1]
+        cursor = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+        assert_that(
+            calling(self.call_logd.cdr.list).with_args(
+                order='source_user_uuid', direction='desc', cursor=cursor
+            ),
+            raises(CallLogdError).matching(
+                has_properties(status_code=400, details=has_key('cursor'))
+            ),
+        )
+
     @call_log(date='2016-04-10')
     @call_log(date='2017-04-10')
     @call_log(date='2016-04-12', source_exten='prefix2017')
@@ -1,4 +1,4 @@
-# Copyright 2017-2024 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2017-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from datetime import datetime as dt
@@ -9,13 +9,20 @@ from hamcrest import (
     contains_exactly,
     contains_inanyorder,
     empty,
+    equal_to,
     has_entries,
     has_length,
     has_properties,
     has_property,
+    is_in,
 )
 
-from wazo_call_logd.database.models import CallLog, CallLogParticipant, Recording
+from wazo_call_logd.database.models import (
+    CallLog,
+    CallLogParticipant,
+    Recording,
+    TenantCallLogCount,
+)
 from wazo_call_logd.database.queries.call_log import ListParams
 
 from .helpers.base import DBIntegrationTest, cdr
@@ -172,6 +179,90 @@ class TestCallLog(DBIntegrationTest):
         result = self.dao.call_log.count_in_period(params)
         assert_that(result, has_entries(total=4, filtered=2))
 
+    @call_log(**cdr(id_=1, caller=ALICE, callee=BOB, start_time=NOW))
+    @call_log(**cdr(id_=2, caller=ALICE, callee=BOB, start_time=NOW + 1 * MINUTES))
+    @call_log(**cdr(id_=3, caller=BOB, callee=ALICE, start_time=NOW + 2 * MINUTES))
+    def test_count_in_period_modes(self):
+        params = {'tenant_uuids': [MASTER_TENANT], 'cdr_ids': [1, 2]}
+
+        result = self.dao.call_log.count_in_period(params | {'count': 'estimated'})
+        assert_that(result, has_entries(total=3, filtered=2))
+
+        result = self.dao.call_log.count_in_period(params | {'count': 'none'})
+        assert_that(result, has_entries(total=None, filtered=None))
+
+    @call_log(
+        **cdr(id_=1, caller=ALICE, callee=BOB),
+        recordings=[{'path': '/tmp/one.wav'}, {'path': '/tmp/two.wav'}],
+    )
+    @call_log(**cdr(id_=2, caller=ALICE, callee=CHARLES))
+    def test_count_in_period_counts_each_call_log_once(self):
+        params = {'user_uuids': [ALICE['id'], BOB['id']], 'recorded': True}
+
+        result = self.dao.call_log.count_in_period(params)
+
+        assert_that(result, has_entries(total=2, filtered=1))
+
+    @call_log(
+        **cdr(id_=1, caller=ALICE, callee=BOB, start_time=NOW),
+        recordings=[{'path': '/tmp/one.wav'}, {'path': '/tmp/two.wav'}],
+    )
+    @call_log(
+        **cdr(id_=2, caller=ALICE, callee=BOB, start_time=NOW + 1 * MINUTES),
+        recordings=[{'path': '/tmp/three.wav'}],
+    )
+    @call_log(**cdr(id_=3, caller=BOB, callee=ALICE, start_time=NOW + 2 * MINUTES))
+    def test_iter_in_period(self):
+        params = {'order': 'start', 'direction': 'desc', 'limit': 2}
+
+        result = list(self.dao.call_log.iter_in_period(params))
+        assert_that(
+            result,
+            contains_exactly(
+                has_properties(id=3, recordings=empty()),
+                has_properties(id=2, recordings=has_length(1)),
+            ),
+        )
+
+        result = self.dao.call_log.find_max_recordings_in_period(params)
+        assert_that(result, equal_to(1))
+        result = self.dao.call_log.find_max_recordings_in_period({})
+        assert_that(result, equal_to(2))
+
+    @call_log(**cdr(id_=1))
+    @call_log(**cdr(id_=2))
+    def test_count_in_period_total_sums_every_shard(self):
+        params = {'tenant_uuids': [MASTER_TENANT]}
+        with transaction(self.session):
+            self.session.add_all(
+                [
+                    TenantCallLogCount(tenant_uuid=MASTER_TENANT, shard=15, count=3),
+                    TenantCallLogCount(tenant_uuid=MASTER_TENANT, shard=14, count=-1),
+                ]
+            )
+
+        result = self.dao.call_log.count_in_period(params)
+
+        assert_that(result, has_entries(total=4))
+
+    @call_log(**cdr(id_=1))
+    @call_log(**cdr(id_=2))
+    @call_log(**cdr(id_=3))
+    def test_count_in_period_total_follows_writes(self):
+        params = {'tenant_uuids': [MASTER_TENANT]}
+        assert_that(self.dao.call_log.count_in_period(params), has_entries(total=3))
+
+        self.dao.call_log.delete_from_list([1])
+        assert_that(self.dao.call_log.count_in_period(params), has_entries(total=2))
+
+        self.dao.call_log.create_from_list(
+            [CallLog(date=NOW, tenant_uuid=str(MASTER_TENANT))]
+        )
+        assert_that(self.dao.call_log.count_in_period(params), has_entries(total=3))
+
+        self.dao.call_log.delete()
+        assert_that(self.dao.call_log.count_in_period(params), has_entries(total=0))
+
     @call_log(**cdr(id_=1, caller=ALICE, callee=BOB, start_time=NOW))
     @call_log(**cdr(id_=2, caller=ALICE, callee=BOB, start_time=NOW + 1 * MINUTES))
     @call_log(**cdr(id_=3, caller=BOB, callee=ALICE, start_time=NOW + 2 * MINUTES))
@@ -246,6 +337,116 @@ class TestCallLog(DBIntegrationTest):
             self.session.query(CallLogParticipant).delete()
             self.session.query(Recording).delete()
 
+    @call_log(**cdr(id_=1))
+    def test_bulk_create_from_list(self):
+        end_time = dt.now()
+        start_time = end_time - td(hours=1)
+
+        call_log_1 = CallLog(
+            date=NOW,
+            tenant_uuid=str(MASTER_TENANT),
+            participants=[
+                CallLogParticipant(role='source', user_uuid=str(USER_1_UUID)),
+                CallLogParticipant(role='destination', user_uuid=str(USER_2_UUID)),
+            ],
+            recordings=[Recording(start_time=start_time, end_time=end_time)],
+        )
+        call_log_2 = CallLog(date=NOW, tenant_uuid=str(MASTER_TENANT))
+
+        self.dao.call_log.bulk_create_from_list([call_log_1, call_log_2], [1])
+
+        result = self.session.query(CallLog).all()
+        assert_that(
+            result,
+            contains_inanyorder(
+                has_property('id', call_log_1.id),
+                has_property('id', call_log_2.id),
+            ),
+        )
+        assert_that(
+            self.session.query(CallLogParticipant).all(),
+            contains_inanyorder(
+                has_properties(call_log_id=call_log_1.id, role='source', tags=[]),
+                has_properties(call_log_id=call_log_1.id, role='destination'),
+            ),
+        )
+        assert_that(
+            self.session.query(Recording).all(),
+            contains_exactly(has_property('call_log_id', call_log_1.id)),
+        )
+        assert_that(
+            call_log_1,
+            has_properties(
+                source_user_uuid=str(USER_1_UUID),
+                destination_user_uuid=str(USER_2_UUID),
+            ),
+        )
+
+        with transaction(self.session):
+            self.session.query(CallLog).delete()
+            self.session.query(CallLogParticipant).delete()
+            self.session.query(Recording).delete()
+
+    @call_log(**cdr(id_=1), conversation_id='1.0')
+    @call_log(**cdr(id_=2), conversation_id='2.0')
+    def test_upsert_from_list(self):
+        previous_participant_uuids = {
+            participant.uuid
+            for participant in self.session.query(CallLogParticipant).filter(
+                CallLogParticipant.call_log_id == 1
+            )
+        }
+        call_log_1 = CallLog(
+            date=NOW,
+            tenant_uuid=str(MASTER_TENANT),
+            conversation_id='1.0',
+            source_name='Alice Regenerated',
+            participants=[
+                CallLogParticipant(
+                    role='source', user_uuid=ALICE['id'], line_id=11, answered=False
+                ),
+                CallLogParticipant(role='destination', user_uuid=BOB['id'], line_id=22),
+            ],
+        )
+        call_log_3 = CallLog(
+            date=NOW, tenant_uuid=str(MASTER_TENANT), conversation_id='3.0'
+        )
+
+        deleted_ids = self.dao.call_log.upsert_from_list(
+            [call_log_1, call_log_3], [1, 2]
+        )
+
+        assert_that(deleted_ids, contains_exactly(2))
+        assert_that(call_log_1.id, equal_to(1))
+        assert_that(
+            self.session.query(CallLog).all(),
+            contains_inanyorder(
+                has_properties(id=1, source_name='Alice Regenerated'),
+                has_properties(id=call_log_3.id, conversation_id='3.0'),
+            ),
+        )
+        participants = self.session.query(CallLogParticipant).filter(
+            CallLogParticipant.call_log_id == 1
+        )
+        assert_that(
+            participants.all(),
+            contains_inanyorder(
+                has_properties(role='source', uuid=is_in(previous_participant_uuids)),
+                has_properties(role='destination', line_id=22),
+            ),
+        )
+
+        with transaction(self.session):
+            self.session.query(CallLog).delete()
+            self.session.query(CallLogParticipant).delete()
+
+    @call_log(**cdr(id_=1), cel_fingerprint='3:fingerprint')
+    @call_log(**cdr(id_=2))
+    def test_find_cel_fingerprints(self):
+        result = self.dao.call_log.find_cel_fingerprints([1, 2, 3])
+
+        assert_that(result, equal_to({1: '3:fingerprint'}))
+
     @call_log(**cdr(id_=1))
     @call_log(**cdr(id_=2))
     @call_log(**cdr(id_=3))
@@ -1,8 +1,8 @@
-# Copyright 2013-2025 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from datetime import timedelta as td
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 from hamcrest import (
     assert_that,
@@ -69,6 +69,44 @@ class TestCEL(DBIntegrationTest):
             ),
         )
 
+    @cel(linkedid='1')
+    @cel(linkedid='2')
+    @cel(linkedid='3')
+    def test_associate_many_call_logs_in_chunks(self, cel1, cel2, cel3):
+        call_logs = [
+            Mock(id=1234, cel_ids=[cel1['id'], cel2['id']]),
+            Mock(id=5678, cel_ids=[cel3['id']]),
+        ]
+        with patch('wazo_call_logd.database.queries.cel.UPDATE_CHUNK_SIZE', 2):
+            self.dao.cel.associate_all_to_call_logs(call_logs)
+        cels = [cel1['id'], cel2['id'], cel3['id']]
+        result = self.cel_session.query(CEL).filter(CEL.id.in_(cels)).all()
+        assert_that(
+            result,
+            contains_inanyorder(
+                has_properties(call_log_id=1234),
+                has_properties(call_log_id=1234),
+                has_properties(call_log_id=5678),
+            ),
+        )
+
+    @cel(linkedid='1')
+    @cel(linkedid='1')
+    @cel(linkedid='2')
+    def test_associate_by_linked_id_when_no_cel_ids(self, cel1, cel2, cel3):
+        call_logs = [Mock(id=1234, cel_ids=[None, None], linked_ids=['1'])]
+        self.dao.cel.associate_all_to_call_logs(call_logs)
+        cels = [cel1['id'], cel2['id'], cel3['id']]
+        result = self.cel_session.query(CEL).filter(CEL.id.in_(cels)).all()
+        assert_that(
+            result,
+            contains_inanyorder(
+                has_properties(linkedid='1', call_log_id=1234),
+                has_properties(linkedid='1', call_log_id=1234),
+                has_properties(linkedid='2', call_log_id=None),
+            ),
+        )
+
     @cel(linkedid='1', call_log_id=1234)
     def test_unassociate_when_no_call_logs(self, cel):
         call_log_ids = []
@@ -244,6 +282,44 @@ class TestCEL(DBIntegrationTest):
             ),
         )
 
+    @cel(linkedid='1', uniqueid='1')
+    @cel(linkedid='2', uniqueid='1')
+    @cel(linkedid='2', uniqueid='2')
+    @cel(linkedid='3', uniqueid='2')
+    @cel(linkedid='4', uniqueid='4')
+    def test_find_from_linked_id_transitively_correlated(
+        self, cel1, cel2, cel3, cel4, _
+    ):
+        result = self.dao.cel.find_from_linked_id('1')
+        assert_that(
+            result,
+            contains_inanyorder(
+                has_property('id', cel1['id']),
+                has_property('id', cel2['id']),
+                has_property('id', cel3['id']),
+                has_property('id', cel4['id']),
+            ),
+        )
+
+    @cel(linkedid='1', uniqueid='1')
+    @cel(linkedid='2', uniqueid='1')
+    @cel(linkedid='2', uniqueid='2')
+    @cel(linkedid='3', uniqueid='2')
+    def test_find_from_linked_id_not_recursive(self, cel1, cel2, cel3, _):
+        self.dao.cel.recursive_correlation = False
+        try:
+            result = self.dao.cel.find_from_linked_id('1')
+        finally:
+            self.dao.cel.recursive_correlation = True
+        assert_that(
+            result,
+            contains_inanyorder(
+                has_property('id', cel1['id']),
+                has_property('id', cel2['id']),
+                has_property('id', cel3['id']),
+            ),
+        )
+
     def test_find_last_unprocessed_no_cels_with_older(self):
         older = NOW - td(hours=1)
         result = self.dao.cel.find_last_unprocessed(older=older)
@@ -296,3 +372,25 @@ class TestCEL(DBIntegrationTest):
         older = NOW - td(hours=1)
         result = self.dao.cel.find_last_unprocessed(older=older)
         assert_that(result, empty())
+
+    @cel(linkedid='1', eventtime=NOW - td(hours=2))
+    @cel(linkedid='1', eventtime=NOW - td(minutes=3))
+    @cel(linkedid='2', eventtime=NOW - td(minutes=2))
+    @cel(linkedid='2', eventtime=NOW - td(seconds=90))
+    @cel(linkedid='3', eventtime=NOW - td(minutes=1))
+    def test_iter_slices_since(self, _, cel2, cel3, cel4, cel5):
+        older = NOW - td(hours=1)
+        result = list(self.dao.cel.iter_slices_since(older, slice_size=2))
+        assert_that(
+            result,
+            contains_exactly(
+                contains_exactly(
+                    has_property('id', cel2['id']),
+                    has_property('id', cel3['id']),
+                ),
+                contains_exactly(
+                    has_property('id', cel4['id']),
+                    has_property('id', cel5['id']),
+                ),
+            ),
+        )
@@ -0,0 +1,52 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from datetime import datetime as dt
+from datetime import timedelta as td
+
+from hamcrest import assert_that, equal_to, has_properties, none
+
+from wazo_call_logd.database.models import Watermark
+
+from .helpers.base import DBIntegrationTest
+
+NOW = dt.fromisoformat('2023-01-01 08:00:00+00:00')
+
+
+class TestWatermark(DBIntegrationTest):
+    def tearDown(self):
+        self.session.query(Watermark).delete()
+        self.session.commit()
+        super().tearDown()
+
+    def test_find_when_none(self):
+        result = self.dao.watermark.find()
+        assert_that(result, none())
+
+    def test_update(self):
+        self.dao.watermark.update(42, NOW)
+        self.dao.watermark.update(43, NOW + td(seconds=1))
+
+        result = self.dao.watermark.find()
+        assert_that(
+            result, has_properties(cel_id=43, cel_eventtime=NOW + td(seconds=1))
+        )
+        assert_that(self.session.query(Watermark).count(), equal_to(1))
+
+    def test_rewind(self):
+        self.dao.watermark.update(42, NOW)
+
+        self.dao.watermark.rewind(NOW + td(hours=1))
+        result = self.dao.watermark.find()
+        assert_that(result, has_properties(cel_id=42, cel_eventtime=NOW))
+
+        self.dao.watermark.rewind(NOW - td(hours=1))
+        result = self.dao.watermark.find()
+        assert_that(result, has_properties(cel_id=0, cel_eventtime=NOW - td(hours=1)))
+
+    def test_delete(self):
+        self.dao.watermark.update(42, NOW)
+
+        self.dao.watermark.delete()
+
+        assert_that(self.dao.watermark.find(), none())
@@ -0,0 +1,174 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from collections.abc import Iterable
+from datetime import datetime, timezone
+
+from xivo.status import Status
+
+from .cel_interpretor import parse_eventtime
+from .database.cel_record import CEL_RECORD_FIELDS, CELRecord
+from .generator import _is_headless, _is_terminated
+
+logger = logging.getLogger(__name__)
+
+# CEL bus event (AMI) field -> CEL table column
+CEL_FIELDS = {
+    'EventName': 'eventtype',
+    'UserDefType': 'userdeftype',
+    'CallerIDname': 'cid_name',
+    'CallerIDnum': 'cid_num',
+    'CallerIDani': 'cid_ani',
+    'CallerIDrdnis': 'cid_rdnis',
+    'CallerIDdnid': 'cid_dnid',
+    'Exten': 'exten',
+    'Context': 'context',
+    'Channel': 'channame',
+    'Application': 'appname',
+    'AppData': 'appdata',
+    'AccountCode': 'accountcode',
+    'PeerAccount': 'peeraccount',
+    'UniqueID': 'uniqueid',
+    'LinkedID': 'linkedid',
+    'Userfield': 'userfield',
+    'Peer': 'peer',
+    'Extra': 'extra',
+}
+
+
+def cel_from_payload(payload: dict) -> CELRecord:
+    return CELRecord(
+        eventtime=_parse_event_time(payload['EventTime']),
+        **{
+            column: payload[field]
+            for field, column in CEL_FIELDS.items()
+            if field in payload and column in CEL_RECORD_FIELDS
+        },
+    )
+
+
+def _parse_event_time(event_time: str) -> datetime:
+    # NOTE: the AMI sends either an epoch or a date formatted with the
+    # `dateformat` of cel.conf, in the local time of the PBX
+    try:
+        return datetime.fromtimestamp(float(event_time), tz=timezone.utc)
+    except ValueError:
+        pass
+    eventtime = parse_eventtime(event_time)
+    if eventtime.tzinfo is None:
+        eventtime = eventtime.astimezone()
+    return eventtime
+
+
+class CallAssembler:
+    """
+    buffer CEL received from the bus by linkedid until their correlation group
+    is terminated, so that call logs can be generated without reading the CEL
+    back from the database; when more than `max_cels` CEL are buffered, the
+    oldest linkedids are dropped and their calls are read from the database
+    """
+
+    def __init__(self, max_cels: int = 100000):
+        self.max_cels = max_cels
+        self.assembled = 0
+        self.fallbacks = 0
+        self._cels_by_linkedid: OrderedDict[str, list[CELRecord]] = OrderedDict()
+        self._linkedids_by_uniqueid: defaultdict[str, set[str]] = defaultdict(set)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, payload: dict):
+        if not self.max_cels:
+            return
+        try:
+            cel = cel_from_payload(payload)
+        except (KeyError, ValueError, TypeError) as e:
+            logger.debug('Ignoring invalid CEL event %s: %s', payload, e)
+            return
+
+        with self._lock:
+            cels = self._cels_by_linkedid.setdefault(cel.linkedid, [])
+            cels.append(cel)
+            self._linkedids_by_uniqueid[cel.uniqueid].add(cel.linkedid)
+            self._size += 1
+            while self._size > self.max_cels:
+                linkedid = next(iter(self._cels_by_linkedid))
+                logger.debug('Dropping buffered CEL of linkedid %s', linkedid)
+                self._remove(linkedid)
+
+    def take(self, linkedids: Iterable[str]) -> tuple[list[CELRecord], list[str]]:
+        """
+        return the buffered CEL of the terminated calls of these linkedids and
+        the linkedids whose calls must be read from the database; calls
+        waiting for another linkedid to terminate stay buffered
+        """
+        assembled_cels: list[CELRecord] = []
+        missing_linkedids: list[str] = []
+        with self._lock:
+            for linkedid in linkedids:
+                if linkedid not in self._cels_by_linkedid:
+                    self.fallbacks += 1
+                    missing_linkedids.append(linkedid)
+                    continue
+
+                group_linkedids = self._correlated_linkedids(linkedid)
+                group_cels = [
+                    cel
+                    for group_linkedid in group_linkedids
+                    for cel in self._cels_by_linkedid[group_linkedid]
+                ]
+                if not _is_terminated(group_linkedids, group_cels):
+                    continue
+
+                for group_linkedid in group_linkedids:
+                    self._remove(group_linkedid)
+                if _is_headless(group_linkedids, group_cels):
+                    self.fallbacks += 1
+                    missing_linkedids.append(linkedid)
+                else:
+                    self.assembled += 1
+                    assembled_cels.extend(group_cels)
+
+        return assembled_cels, missing_linkedids
+
+    def discard(self, linkedids: Iterable[str]):
+        with self._lock:
+            for linkedid in linkedids:
+                if linkedid in self._cels_by_linkedid:
+                    self._remove(linkedid)
+
+    def provide_status(self, status):
+        status['call_assembler']['status'] = Status.ok
+        status['call_assembler']['buffered_cels'] = self._size
+        status['call_assembler']['max_cels'] = self.max_cels
+        status['call_assembler']['assembled'] = self.assembled
+        status['call_assembler']['fallbacks'] = self.fallbacks
+
+    def _correlated_linkedids(self, linkedid: str) -> set[str]:
+        linkedids = {linkedid}
+        pending = [linkedid]
+        while pending:
+            for cel in self._cels_by_linkedid[pending.pop()]:
+                for other in self._linkedids_by_uniqueid[cel.uniqueid] - linkedids:
+                    linkedids.add(other)
+                    pending.append(other)
+        return linkedids
+
+    def _remove(self, linkedid: str):
+        cels = self._cels_by_linkedid.pop(linkedid)
+        self._size -= len(cels)
+        for cel in cels:
+            linkedids = self._linkedids_by_uniqueid.get(cel.uniqueid)
+            if linkedids is None:
+                continue
+            linkedids.discard(linkedid)
+            if not linkedids:
+                del self._linkedids_by_uniqueid[cel.uniqueid]
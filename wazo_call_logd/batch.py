@@ -0,0 +1,166 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+import zlib
+from typing import Callable
+
+from xivo.status import Status
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class LinkedIdBatcher:
+    """
+    collect linkedids submitted from the bus consumer thread and hand them
+    over in batches, once `max_size` linkedids are pending or `max_delay`
+    seconds have elapsed since the first pending linkedid
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[list[str]], None],
+        max_size: int = 50,
+        max_delay: float = 0.5,
+        name: str = 'linkedid-batcher',
+        queue_size: int = 0,
+    ):
+        self._process_batch = process_batch
+        self._max_size = max(1, max_size)
+        self._max_delay = max(0.0, max_delay)
+        self._name = name
+        self._queue: queue.Queue = queue.Queue(maxsize=max(0, queue_size))
+        self._thread: threading.Thread | None = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self._name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if not self._thread:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, linked_id: str):
+        # NOTE: blocks when the queue is full, slowing down the bus consumer
+        self._queue.put(linked_id)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue.maxsize
+
+    def is_alive(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self._max_delay
+            while len(batch) < self._max_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+    def _flush(self, batch: list[str]):
+        # a linkedid may be submitted more than once, e.g. after a bus redelivery
+        linked_ids = list(dict.fromkeys(batch))
+        try:
+            self._process_batch(linked_ids)
+        except Exception:
+            logger.exception('Failed to process linkedid batch %s', linked_ids)
+
+
+class LinkedIdWorkerPool:
+    """
+    spread linkedids over a fixed number of batching workers;
+    linkedids are routed by their correlation key, so that correlated
+    calls are always processed in order by the same worker
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[list[str]], None],
+        workers: int = 1,
+        max_size: int = 50,
+        max_delay: float = 0.5,
+        queue_size: int = 1000,
+    ):
+        self._workers = [
+            LinkedIdBatcher(
+                process_batch,
+                max_size=max_size,
+                max_delay=max_delay,
+                name=f'linkedid-worker-{i}',
+                queue_size=queue_size,
+            )
+            for i in range(max(1, workers))
+        ]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+
+    def stop(self):
+        for worker in self._workers:
+            worker.stop()
+
+    def submit(self, linked_id: str, key: str | None = None):
+        self._worker_for(key or linked_id).submit(linked_id)
+
+    def _worker_for(self, key: str) -> LinkedIdBatcher:
+        index = zlib.crc32(key.encode('utf-8')) % len(self._workers)
+        return self._workers[index]
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(worker.queue_depth for worker in self._workers)
+
+    def provide_status(self, status):
+        alive = all(worker.is_alive() for worker in self._workers)
+        status['generation_workers']['status'] = Status.ok if alive else Status.fail
+        status['generation_workers']['workers'] = len(self._workers)
+        status['generation_workers']['queue_depth'] = self.queue_depth
+        status['generation_workers']['queue_size'] = sum(
+            worker.queue_size for worker in self._workers
+        )
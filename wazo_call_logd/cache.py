@@ -0,0 +1,132 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, TypeVar
+
+V = TypeVar('V')
+
+
+class TTLCache(Generic[V]):
+    """
+    thread-safe LRU cache whose entries also expire `ttl` seconds after insertion;
+    a `max_size` of 0 disables caching
+
+    loaders run without the lock: entries invalidated while being loaded are
+    not stored, and loaders raise instead of returning values not to cache
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max(0, max_size)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, tuple[float | None, V]] = OrderedDict()
+        # generation and number of loaders of the keys being loaded
+        self._loading: dict[Hashable, list[int]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            found, _ = self._get(key)
+            return found
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], V]) -> V:
+        with self._lock:
+            found, value = self._get(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            loading = self._loading.setdefault(key, [0, 0])
+            loading[1] += 1
+            generation = loading[0]
+
+        # NOTE: loaders usually do network I/O, do not hold the lock meanwhile
+        value = None
+        loaded = False
+        try:
+            value = loader()
+            loaded = True
+        finally:
+            with self._lock:
+                loading[1] -= 1
+                if not loading[1]:
+                    del self._loading[key]
+                if loaded and loading[0] == generation:
+                    self._set(key, value)
+        return value
+
+    def set(self, key: Hashable, value: V):
+        with self._lock:
+            self._set(key, value)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._invalidate_loading(key)
+
+    def remove_if(self, predicate: Callable[[Hashable, V], bool]):
+        with self._lock:
+            matching_keys = [
+                key
+                for key, (_, value) in self._entries.items()
+                if predicate(key, value)
+            ]
+            for key in matching_keys:
+                del self._entries[key]
+            # NOTE: values being loaded are unknown yet, they may match
+            self._invalidate_loading()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._invalidate_loading()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+        }
+
+    def _set(self, key: Hashable, value: V):
+        if not self.max_size:
+            return
+        expiration = self._clock() + self.ttl if self.ttl else None
+        self._entries[key] = (expiration, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _invalidate_loading(self, key: Hashable | None = None):
+        if key is None:
+            for loading in self._loading.values():
+                loading[0] += 1
+        elif key in self._loading:
+            self._loading[key][0] += 1
+
+    def _get(self, key: Hashable) -> tuple[bool, V | None]:
+        try:
+            expiration, value = self._entries[key]
+        except KeyError:
+            return False, None
+        if expiration is not None and expiration <= self._clock():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
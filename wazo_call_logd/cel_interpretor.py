@@ -1,13 +1,13 @@
-# Copyright 2022-2025 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2022-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from __future__ import annotations
 
-import json
 import logging
 import re
 import urllib.parse
 import uuid
+from collections.abc import Iterable
 from datetime import datetime
 from typing import Callable, TypedDict
 
@@ -16,6 +16,7 @@ from xivo.asterisk.line_identity import identity_from_channel
 from xivo_dao.alchemy.cel import CEL
 
 from .database.cel_event_type import CELEventType
+from .database.cel_record import CELRecord, extract_cel_extra
 from .database.models import Destination, Recording
 from .exceptions import CELInterpretationError
 from .raw_call_log import BridgeInfo, RawCallLog
@@ -52,18 +53,10 @@ def parse_key_pair_sequence(text: str) -> list[tuple[str, str]]:
     return key_pairs
 
 
-def extract_cel_extra(extra: str | None) -> dict | None:
-    if not extra:
-        logger.debug('missing CEL extra')
-        return
-
-    try:
-        extra = json.loads(extra)
-    except json.decoder.JSONDecodeError:
-        logger.debug('invalid CEL extra: %s', repr(extra))
-        return
-
-    return extra
+def cel_extra(cel: CEL | CELRecord) -> dict | None:
+    if isinstance(cel, CELRecord):
+        return cel.extra_dict
+    return extract_cel_extra(cel.extra)
 
 
 def is_valid_mixmonitor_start_extra(extra):
@@ -180,6 +173,52 @@ def parse_eventtime(eventtime: str | datetime) -> datetime:
 EventInterpretor = Callable[[CEL, RawCallLog], RawCallLog]
 
 
+class CELIndex(list):
+    """
+    the CEL of a correlated call, in chronological order, indexed once by
+    channel and by event type so that interpretors do not rescan the whole call
+    """
+
+    def __init__(self, cels: Iterable[CEL]):
+        super().__init__(cels)
+        self._by_uniqueid: dict[str, list[CEL]] = {}
+        self._by_eventtype: dict[str, list[CEL]] = {}
+        self._by_channel_event: dict[tuple[str, str], list[CEL]] = {}
+        for cel in self:
+            self._by_uniqueid.setdefault(cel.uniqueid, []).append(cel)
+            self._by_eventtype.setdefault(cel.eventtype, []).append(cel)
+            key = (cel.uniqueid, cel.eventtype)
+            self._by_channel_event.setdefault(key, []).append(cel)
+        self.started_uniqueids = [
+            cel.uniqueid for cel in self.of_type(CELEventType.chan_start)
+        ]
+
+    @property
+    def uniqueids(self) -> Iterable[str]:
+        return self._by_uniqueid.keys()
+
+    def of_channel(self, uniqueid: str) -> list[CEL]:
+        return self._by_uniqueid.get(uniqueid, [])
+
+    def of_type(self, eventtype: str) -> list[CEL]:
+        return self._by_eventtype.get(eventtype, [])
+
+    def has_type(self, eventtype: str) -> bool:
+        return eventtype in self._by_eventtype
+
+    def first(self, uniqueid: str, eventtype: str) -> CEL | None:
+        cels = self._by_channel_event.get((uniqueid, eventtype))
+        return cels[0] if cels else None
+
+    def last(self, uniqueid: str, eventtype: str) -> CEL | None:
+        cels = self._by_channel_event.get((uniqueid, eventtype))
+        return cels[-1] if cels else None
+
+
+def index_cels(cels: Iterable[CEL]) -> CELIndex:
+    return cels if isinstance(cels, CELIndex) else CELIndex(cels)
+
+
 class AbstractCELInterpretor:
     eventtype_map: dict[str, EventInterpretor] = {}
 
@@ -212,13 +251,12 @@ class DispatchCELInterpretor:
         return call_log
 
     def split_caller_callee_cels(self, cels):
-        uniqueids = [
-            cel.uniqueid for cel in cels if cel.eventtype == CELEventType.chan_start
-        ]
+        cels = index_cels(cels)
+        uniqueids = cels.started_uniqueids
         caller_uniqueid = uniqueids[0] if len(uniqueids) > 0 else None
-        callee_uniqueids = uniqueids[1:]
+        callee_uniqueids = set(uniqueids[1:])
 
-        caller_cels = [cel for cel in cels if cel.uniqueid == caller_uniqueid]
+        caller_cels = list(cels.of_channel(caller_uniqueid))
         callee_cels = [cel for cel in cels if cel.uniqueid in callee_uniqueids]
 
         return (caller_cels, callee_cels)
@@ -302,7 +340,7 @@ class CallerCELInterpretor(AbstractCELInterpretor):
         return call
 
     def interpret_bridge_start_or_enter(self, cel: CEL, call):
-        extra_dict = extract_cel_extra(cel.extra)
+        extra_dict = cel_extra(cel)
         bridge = extra_dict and bridge_info(extra_dict)
         if not bridge:
             logger.error(
@@ -341,7 +379,7 @@ class CallerCELInterpretor(AbstractCELInterpretor):
         return call
 
     def interpret_mixmonitor_start(self, cel, call):
-        extra = extract_cel_extra(cel.extra)
+        extra = cel_extra(cel)
         if not is_valid_mixmonitor_start_extra(extra):
             return call
 
@@ -359,7 +397,7 @@ class CallerCELInterpretor(AbstractCELInterpretor):
         return call
 
     def interpret_mixmonitor_stop(self, cel, call):
-        extra = extract_cel_extra(cel.extra)
+        extra = cel_extra(cel)
         if not is_valid_mixmonitor_stop_extra(extra):
             return call
 
@@ -376,7 +414,7 @@ class CallerCELInterpretor(AbstractCELInterpretor):
 
     def interpret_xivo_incall(self, cel, call):
         call.direction = 'inbound'
-        extra = extract_cel_extra(cel.extra)
+        extra = cel_extra(cel)
         if not extra:
             return call
 
@@ -413,7 +451,7 @@ class CallerCELInterpretor(AbstractCELInterpretor):
         return call
 
     def interpret_wazo_conference(self, cel, call):
-        extra = extract_cel_extra(cel.extra)
+        extra = cel_extra(cel)
         if not extra:
             logger.error(
                 'Cannot interpret WAZO_CONFERENCE event(cel.id=%s), missing extra data',
@@ -429,7 +467,7 @@ class CallerCELInterpretor(AbstractCELInterpretor):
         return call
 
     def interpret_wazo_meeting_name(self, cel, call):
-        extra = extract_cel_extra(cel.extra)
+        extra = cel_extra(cel)
         if not extra:
             logger.error(
                 'Cannot interpret WAZO_MEETING_NAME event(cel.id=%s), missing extra data',
@@ -451,7 +489,7 @@ class CallerCELInterpretor(AbstractCELInterpretor):
         return call
 
     def interpret_wazo_user_missed_call(self, cel, call: RawCallLog):
-        extra = extract_cel_extra(cel.extra)
+        extra = cel_extra(cel)
         if not extra:
             logger.error(
                 'Cannot interpret WAZO_USER_MISSED_CALL event(cel.id=%s), missing extra data',
@@ -521,7 +559,7 @@ class CallerCELInterpretor(AbstractCELInterpretor):
         return call
 
     def interpret_wazo_call_log_destination(self, cel, call: RawCallLog):
-        extra = extract_cel_extra(cel.extra)
+        extra = cel_extra(cel)
         if not extra:
             return call
 
@@ -700,7 +738,7 @@ class CalleeCELInterpretor(AbstractCELInterpretor):
         return call
 
     def interpret_bridge_enter(self, cel: CEL, call: RawCallLog):
-        extra_dict = extract_cel_extra(cel.extra)
+        extra_dict = cel_extra(cel)
         bridge = bridge_info(extra_dict) if extra_dict else None
         if not bridge:
             logger.error(
@@ -770,7 +808,7 @@ class CalleeCELInterpretor(AbstractCELInterpretor):
         return call
 
     def interpret_mixmonitor_start(self, cel, call):
-        extra = extract_cel_extra(cel.extra)
+        extra = cel_extra(cel)
         if not is_valid_mixmonitor_start_extra(extra):
             return call
 
@@ -787,7 +825,7 @@ class CalleeCELInterpretor(AbstractCELInterpretor):
         return call
 
     def interpret_mixmonitor_stop(self, cel, call):
-        extra = extract_cel_extra(cel.extra)
+        extra = cel_extra(cel)
         if not is_valid_mixmonitor_stop_extra(extra):
             return call
 
@@ -799,7 +837,8 @@ class CalleeCELInterpretor(AbstractCELInterpretor):
 
 class LocalOriginateCELInterpretor:
     def interpret_cels(self, cels, call: RawCallLog):
-        uniqueids = [cel.uniqueid for cel in cels if cel.eventtype == 'CHAN_START']
+        cels = index_cels(cels)
+        uniqueids = cels.started_uniqueids
         try:
             (
                 local_channel1,
@@ -809,28 +848,16 @@ class LocalOriginateCELInterpretor:
         except ValueError:  # in case a CHAN_START is missing...
             return call
 
-        try:
-            local_channel1_start = next(
-                cel
-                for cel in cels
-                if cel.uniqueid == local_channel1 and cel.eventtype == 'CHAN_START'
-            )
-            source_channel_answer = next(
-                cel
-                for cel in cels
-                if cel.uniqueid == source_channel and cel.eventtype == 'ANSWER'
-            )
-            source_channel_end = next(
-                cel
-                for cel in cels
-                if cel.uniqueid == source_channel and cel.eventtype == 'CHAN_END'
-            )
-            local_channel2_answer = next(
-                cel
-                for cel in cels
-                if cel.uniqueid == local_channel2 and cel.eventtype == 'ANSWER'
-            )
-        except StopIteration:
+        local_channel1_start = cels.first(local_channel1, 'CHAN_START')
+        source_channel_answer = cels.first(source_channel, 'ANSWER')
+        source_channel_end = cels.first(source_channel, 'CHAN_END')
+        local_channel2_answer = cels.first(local_channel2, 'ANSWER')
+        if None in (
+            local_channel1_start,
+            source_channel_answer,
+            source_channel_end,
+            local_channel2_answer,
+        ):
             return call
 
         call.date = parse_eventtime(local_channel1_start.eventtime)
@@ -845,10 +872,8 @@ class LocalOriginateCELInterpretor:
         call.destination_exten = local_channel2_answer.cid_num
 
         # Adding all recordings
-        for cel in cels:
-            if cel.eventtype != CELEventType.mixmonitor_start:
-                continue
-            extra = extract_cel_extra(cel.extra)
+        for cel in cels.of_type(CELEventType.mixmonitor_start):
+            extra = cel_extra(cel)
             if not is_valid_mixmonitor_start_extra(extra):
                 return call
 
@@ -860,10 +885,8 @@ class LocalOriginateCELInterpretor:
             call.recordings.append(recording)
 
         # Check if any recordings have been stopped manually
-        for cel in cels:
-            if cel.eventtype != CELEventType.mixmonitor_stop:
-                continue
-            extra = extract_cel_extra(cel.extra)
+        for cel in cels.of_type(CELEventType.mixmonitor_stop):
+            extra = cel_extra(cel)
             if not is_valid_mixmonitor_stop_extra(extra):
                 return call
 
@@ -876,32 +899,24 @@ class LocalOriginateCELInterpretor:
             if not recording.end_time:
                 recording.end_time = call.date_end
 
-        local_channel1_app_start = next(
-            (
-                cel
-                for cel in cels
-                if cel.uniqueid == local_channel1 and cel.eventtype == 'APP_START'
-            ),
-            None,
-        )
+        local_channel1_app_start = cels.first(local_channel1, 'APP_START')
         if local_channel1_app_start:
             call.user_field = local_channel1_app_start.userfield
 
         other_channels_start = [
             cel
-            for cel in cels
-            if cel.uniqueid not in starting_channels and cel.eventtype == 'CHAN_START'
+            for cel in cels.of_type('CHAN_START')
+            if cel.uniqueid not in starting_channels
         ]
-        non_local_other_channels = [
+        non_local_other_channels = {
             cel.uniqueid
             for cel in other_channels_start
             if not cel.channame.lower().startswith('local/')
-        ]
+        }
         other_channels_bridge_enter = [
             cel
-            for cel in cels
+            for cel in cels.of_type('BRIDGE_ENTER')
             if cel.uniqueid in non_local_other_channels
-            and cel.eventtype == 'BRIDGE_ENTER'
         ]
         destination_channel = (
             other_channels_bridge_enter[-1].uniqueid
@@ -910,26 +925,14 @@ class LocalOriginateCELInterpretor:
         )
 
         if destination_channel:
-            try:
-                # in outgoing calls, destination ANSWER event has more callerid
-                # information than START event
-                destination_channel_answer = next(
-                    cel
-                    for cel in cels
-                    if cel.uniqueid == destination_channel and cel.eventtype == 'ANSWER'
-                )
-                # take the last bridge enter/exit to skip local channel optimization
-                destination_channel_bridge_enter = next(
-                    reversed(
-                        [
-                            cel
-                            for cel in cels
-                            if cel.uniqueid == destination_channel
-                            and cel.eventtype == 'BRIDGE_ENTER'
-                        ]
-                    )
-                )
-            except StopIteration:
+            # in outgoing calls, destination ANSWER event has more callerid
+            # information than START event
+            destination_channel_answer = cels.first(destination_channel, 'ANSWER')
+            # take the last bridge enter/exit to skip local channel optimization
+            destination_channel_bridge_enter = cels.last(
+                destination_channel, 'BRIDGE_ENTER'
+            )
+            if None in (destination_channel_answer, destination_channel_bridge_enter):
                 return call
 
             call.destination_name = destination_channel_answer.cid_name
@@ -944,8 +947,8 @@ class LocalOriginateCELInterpretor:
                 destination_channel_bridge_enter.eventtime
             )
 
-        is_incall = any([True for cel in cels if cel.eventtype == 'XIVO_INCALL'])
-        is_outcall = any([True for cel in cels if cel.eventtype == 'XIVO_OUTCALL'])
+        is_incall = cels.has_type('XIVO_INCALL')
+        is_outcall = cels.has_type('XIVO_OUTCALL')
         if is_incall:
             call.direction = 'inbound'
         if is_outcall:
@@ -953,12 +956,10 @@ class LocalOriginateCELInterpretor:
 
         # extract tenant and user info from WAZO_ORIGINATE_ALL_LINES custom event
         try:
-            wazo_originate_all_lines = next(
-                cel
-                for cel in cels
-                if cel.eventtype == CELEventType.wazo_originate_all_lines
-            )
-        except StopIteration:
+            wazo_originate_all_lines = cels.of_type(
+                CELEventType.wazo_originate_all_lines
+            )[0]
+        except IndexError:
             logger.debug(f'No {CELEventType.wazo_originate_all_lines} cel found')
         else:
             logger.info(f'processing {CELEventType.wazo_originate_all_lines} cel entry')
@@ -997,6 +998,7 @@ class LocalOriginateCELInterpretor:
 
     @classmethod
     def can_interpret(cls, cels):
+        cels = index_cels(cels)
         has_three_channels = cls.three_channels_minimum(cels)
         if not has_three_channels:
             logger.debug(
@@ -1025,12 +1027,11 @@ class LocalOriginateCELInterpretor:
 
     @classmethod
     def three_channels_minimum(cls, cels):
-        channels = {cel.uniqueid for cel in cels}
-        return len(channels) >= 3
+        return len(index_cels(cels).uniqueids) >= 3
 
     @classmethod
     def first_two_channels_are_local(cls, cels):
-        names = [cel.channame for cel in cels if cel.eventtype == 'CHAN_START']
+        names = [cel.channame for cel in index_cels(cels).of_type('CHAN_START')]
         return (
             len(names) >= 2
             and names[0].lower().startswith('local/')
@@ -1039,7 +1040,8 @@ class LocalOriginateCELInterpretor:
 
     @classmethod
     def first_channel_is_answered_before_any_other_operation(cls, cels):
-        first_channel_cels = [cel for cel in cels if cel.uniqueid == cels[0].uniqueid]
+        cels = index_cels(cels)
+        first_channel_cels = cels.of_channel(cels[0].uniqueid) if cels else []
         return (
             len(first_channel_cels) >= 2
             and first_channel_cels[0].eventtype == 'CHAN_START'
@@ -1,4 +1,4 @@
-# Copyright 2017-2023 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2017-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import argparse
@@ -92,6 +92,32 @@ DEFAULT_CONFIG = {
         'username': None,
         'password': None,
     },
+    'cache': {
+        'participants': {
+            'max_size': 10000,
+            'ttl': 3600,
+        },
+        'contexts': {
+            'max_size': 10000,
+            'ttl': 3600,
+        },
+    },
+    'generation': {
+        'workers': 4,
+        'queue_size': 1000,
+        'batch_max_size': 50,
+        'batch_max_delay': 0.5,
+        'bulk_write': True,
+        'buffer_max_cels': 100000,
+        'recursive_correlation': True,
+        'update_in_place': True,
+        'correlation_timeout': 600,
+    },
+    'sweep': {
+        'slice_size': 5000,
+        'max_buffered_cels': 100000,
+        'lookback': 3600,
+    },
     'retention': {
         'cdr_days': None,
         'export_days': None,
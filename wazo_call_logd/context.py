@@ -0,0 +1,118 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable
+
+import requests.exceptions
+from wazo_confd_client import Client as ConfdClient
+from xivo.status import Status
+
+from .cache import TTLCache
+from .metrics import generation_metrics
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_PAGE_SIZE = 500
+# seconds before retrying a failed preload, e.g. without token or during a
+# confd outage
+PRELOAD_RETRY_DELAY = 60
+
+
+def find_tenant_uuid_by_context_name(confd: ConfdClient, name: str) -> str | None:
+    generation_metrics.increment('confd_calls')
+    contexts = confd.contexts.list(name=name, recurse=True)['items']
+    if not contexts:
+        return None
+    return contexts[0]['tenant_uuid']
+
+
+class ContextResolver:
+    """
+    resolve the tenant of a context by its name through confd, caching results
+    so that inbound calls do not look up their context one by one; the cache is
+    preloaded with every context on first use, and again on later uses until a
+    preload succeeds; entries are updated by confd bus events or expire after
+    `ttl` seconds
+    """
+
+    _context_events = ('context_created', 'context_edited', 'context_deleted')
+
+    def __init__(
+        self,
+        confd: ConfdClient,
+        max_size: int = 0,
+        ttl: float = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.confd = confd
+        self._tenant_uuid_by_name: TTLCache[str | None] = TTLCache(max_size, ttl)
+        self._clock = clock
+        self._preloaded = False
+        self._next_preload = 0.0
+        self._preload_lock = threading.Lock()
+
+    def find_tenant_uuid(self, context_name: str) -> str | None:
+        if not self._preloaded:
+            self.preload()
+        return self._tenant_uuid_by_name.get_or_load(
+            context_name,
+            lambda: find_tenant_uuid_by_context_name(self.confd, context_name),
+        )
+
+    def preload(self):
+        with self._preload_lock:
+            if self._preloaded or self._clock() < self._next_preload:
+                return
+            if not self._tenant_uuid_by_name.max_size:
+                self._preloaded = True
+                return
+            try:
+                count = self._preload()
+            except requests.exceptions.RequestException as e:
+                logger.warning('Failed to preload contexts from confd: %s', e)
+                self._next_preload = self._clock() + PRELOAD_RETRY_DELAY
+                return
+            self._preloaded = True
+        logger.debug('Preloaded %s contexts from confd', count)
+
+    def _preload(self) -> int:
+        count = 0
+        offset = 0
+        while count < self._tenant_uuid_by_name.max_size:
+            generation_metrics.increment('confd_calls')
+            response = self.confd.contexts.list(
+                recurse=True, limit=PRELOAD_PAGE_SIZE, offset=offset
+            )
+            for context in response['items']:
+                self._tenant_uuid_by_name.set(context['name'], context['tenant_uuid'])
+            count += len(response['items'])
+            offset += PRELOAD_PAGE_SIZE
+            if offset >= response['total']:
+                break
+        return count
+
+    def subscribe(self, bus_consumer):
+        for event_name in self._context_events:
+            bus_consumer.subscribe(event_name, self._on_context_event)
+
+    def clear(self):
+        self._tenant_uuid_by_name.clear()
+
+    def provide_status(self, status):
+        status['context_cache']['status'] = Status.ok
+        status['context_cache']['by_name'] = self._tenant_uuid_by_name.stats()
+
+    def _on_context_event(self, event):
+        name = event.get('name')
+        if not name:
+            logger.debug('Invalidating context cache')
+            self._tenant_uuid_by_name.clear()
+            return
+
+        logger.debug('Invalidating context cache for context %s', name)
+        self._tenant_uuid_by_name.pop(name)
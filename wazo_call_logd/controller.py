@@ -1,4 +1,4 @@
-# Copyright 2017-2023 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2017-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import logging
@@ -15,15 +15,21 @@ from xivo.token_renewer import TokenRenewer
 
 from wazo_call_logd import celery
 from wazo_call_logd.cel_interpretor import default_interpretors
+from wazo_call_logd.context import ContextResolver
 from wazo_call_logd.generator import CallLogsGenerator
 from wazo_call_logd.manager import CallLogsManager
+from wazo_call_logd.participant import ParticipantResolver
 from wazo_call_logd.writer import CallLogsWriter
 
+from .assembler import CallAssembler
 from .auth import init_master_tenant
+from .batch import LinkedIdWorkerPool
 from .bus import BusConsumer, BusPublisher
+from .correlation import CorrelationTracker
 from .database.helpers import new_db_session
 from .database.queries import DAO
 from .http_server import HTTPServer, api, app
+from .metrics import generation_metrics
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +41,14 @@ class Controller:
         DBSession = new_db_session(config['db_uri'])
         CELDBSession = new_db_session(config['cel_db_uri'])
         self.dao = DAO(DBSession, CELDBSession)
-        writer = CallLogsWriter(self.dao)
+        self.dao.cel.recursive_correlation = config['generation'][
+            'recursive_correlation'
+        ]
+        writer = CallLogsWriter(
+            self.dao,
+            bulk=config['generation']['bulk_write'],
+            update_in_place=config['generation']['update_in_place'],
+        )
 
         # NOTE(afournier): it is important to load the tasks before configuring the Celery app
         self.celery_task_manager = plugin_helpers.load(
@@ -52,9 +65,17 @@ class Controller:
 
         auth_client = AuthClient(**config['auth'])
         confd_client = ConfdClient(**config['confd'])
+        self.participant_resolver = ParticipantResolver(
+            confd_client, **config['cache']['participants']
+        )
+        self.context_resolver = ContextResolver(
+            confd_client, **config['cache']['contexts']
+        )
         generator = CallLogsGenerator(
             confd_client,
             default_interpretors(),
+            self.participant_resolver,
+            self.context_resolver,
         )
         self.token_renewer = TokenRenewer(auth_client)
         self.token_renewer.subscribe_to_token_change(confd_client.set_token)
@@ -65,6 +86,26 @@ class Controller:
         self.bus_publisher = BusPublisher.from_config(config['uuid'], config['bus'])
         self.bus_consumer = BusConsumer.from_config(config['bus'])
         self.manager = CallLogsManager(self.dao, generator, writer, self.bus_publisher)
+        self.call_assembler = CallAssembler(config['generation']['buffer_max_cels'])
+        self.correlation_tracker = CorrelationTracker(
+            config['generation']['correlation_timeout']
+        )
+        workers = config['generation']['workers']
+        if not config['generation']['correlation_timeout'] and workers > 1:
+            # NOTE: without the tracker, each linkedid is routed on its own and
+            # correlated linkedids would be generated concurrently
+            logger.warning(
+                'correlation_timeout is 0: using 1 generation worker instead of %s',
+                workers,
+            )
+            workers = 1
+        self.linkedid_workers = LinkedIdWorkerPool(
+            self._handle_linked_id_batch,
+            workers=workers,
+            max_size=config['generation']['batch_max_size'],
+            max_delay=config['generation']['batch_max_delay'],
+            queue_size=config['generation']['queue_size'],
+        )
 
         self._bus_subscribe()
 
@@ -100,12 +141,19 @@ class Controller:
         self.status_aggregator.add_provider(self.bus_consumer.provide_status)
         self.status_aggregator.add_provider(self.token_status.provide_status)
         self.status_aggregator.add_provider(celery.provide_status)
+        self.status_aggregator.add_provider(self.linkedid_workers.provide_status)
+        self.status_aggregator.add_provider(self.participant_resolver.provide_status)
+        self.status_aggregator.add_provider(self.call_assembler.provide_status)
+        self.status_aggregator.add_provider(self.correlation_tracker.provide_status)
+        self.status_aggregator.add_provider(self.context_resolver.provide_status)
+        self.status_aggregator.add_provider(generation_metrics.provide_status)
         self._update_db_from_config_file()
 
         try:
-            with self.bus_consumer:
-                with self.token_renewer:
-                    self.http_server.run()
+            with self.linkedid_workers:
+                with self.bus_consumer:
+                    with self.token_renewer:
+                        self.http_server.run()
         finally:
             logger.info('Stopping wazo-call-logd...')
             self._celery_process.terminate()
@@ -144,25 +192,47 @@ class Controller:
             self.dao.config.update(config)
 
     def _bus_subscribe(self):
-        self.bus_consumer.subscribe('CEL', self._handle_linked_id_end)
-
-    def _handle_linked_id_end(self, payload):
-        if payload['EventName'] != 'LINKEDID_END':
-            return
-
-        linked_id = payload['LinkedID']
+        self.bus_consumer.subscribe('CEL', self._handle_cel)
+        self.participant_resolver.subscribe(self.bus_consumer)
+        self.context_resolver.subscribe(self.bus_consumer)
+
+    def _handle_cel(self, payload):
+        self.call_assembler.add(payload)
+        ended, expired = self.correlation_tracker.observe(payload)
+        if expired:
+            # NOTE: read the calls of expired groups back from the database
+            self.call_assembler.discard(linked_id for linked_id, _ in expired)
+        for linked_id, key in ended + expired:
+            self.linkedid_workers.submit(linked_id, key)
+
+    def _handle_linked_id_batch(self, linked_ids):
         start_time = time.time()
-        try:
-            self.manager.generate_from_linked_id(linked_id)
-        except Exception:
-            logger.exception(
-                'Failed to generate call log for linkedid \"%s\"', linked_id
-            )
-        else:
+        cels, missing_linked_ids = self.call_assembler.take(linked_ids)
+        failed = False
+        if cels:
+            try:
+                self.manager.generate_from_assembled_cels(cels)
+            except Exception:
+                failed = True
+                logger.exception(
+                    'Failed to generate call logs for assembled linkedids %s',
+                    ', '.join(sorted({cel.linkedid for cel in cels})),
+                )
+        if missing_linked_ids:
+            try:
+                self.manager.generate_from_linked_ids(missing_linked_ids)
+            except Exception:
+                failed = True
+                logger.exception(
+                    'Failed to generate call logs for linkedids %s',
+                    ', '.join(missing_linked_ids),
+                )
+        if not failed:
             processing_time = time.time() - start_time
             logger.info(
-                'Generated call log for linkedid \"%s\" in %.2fs',
-                linked_id,
+                'Generated call logs for %s linkedids (%s) in %.2fs',
+                len(linked_ids),
+                ', '.join(linked_ids),
                 processing_time,
             )
 
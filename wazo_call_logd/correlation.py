@@ -0,0 +1,149 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Callable, NamedTuple
+
+from xivo.status import Status
+
+from .database.cel_event_type import CELEventType
+
+logger = logging.getLogger(__name__)
+
+
+class CorrelatedLinkedId(NamedTuple):
+    linkedid: str
+    # identifies the correlation group, i.e. its smallest linkedid
+    key: str
+
+
+class CorrelationTracker:
+    """
+    track the linkedids that share channels (i.e. correlated calls) from CEL bus
+    events, so that a correlation group is generated once, when its last
+    linkedid ends, instead of once per LINKEDID_END; groups without events for
+    `timeout` seconds are expired and all their linkedids are generated from
+    the database anyway, where a missed LINKEDID_END may be found; groups that
+    did not end there either are skipped by the generator and left
+    unprocessed; a `timeout` of 0 disables the tracker, linkedids are then
+    their own correlation key
+    """
+
+    def __init__(
+        self, timeout: float = 600, clock: Callable[[], float] = time.monotonic
+    ):
+        self.timeout = timeout
+        self.deferred = 0
+        self.expired = 0
+        self._clock = clock
+        self._next_expiration = clock() + timeout
+        self._last_seen: OrderedDict[str, float] = OrderedDict()
+        self._uniqueids_by_linkedid: defaultdict[str, set[str]] = defaultdict(set)
+        self._linkedids_by_uniqueid: defaultdict[str, set[str]] = defaultdict(set)
+        self._ended: set[str] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._last_seen)
+
+    def observe(
+        self, payload: dict
+    ) -> tuple[list[CorrelatedLinkedId], list[CorrelatedLinkedId]]:
+        """
+        record a CEL event and return the linkedids whose call logs must be
+        generated now: those of a group that just ended, and those of expired
+        groups; stale groups are looked for at most once every `timeout` seconds
+        """
+        linkedid = payload['LinkedID']
+        if not self.timeout:
+            if payload['EventName'] == CELEventType.linkedid_end:
+                return [CorrelatedLinkedId(linkedid, linkedid)], []
+            return [], []
+
+        now = self._clock()
+        with self._lock:
+            expired = self._expire(now) if now >= self._next_expiration else []
+            self._last_seen[linkedid] = now
+            self._last_seen.move_to_end(linkedid)
+            uniqueid = payload.get('UniqueID')
+            if uniqueid:
+                self._uniqueids_by_linkedid[linkedid].add(uniqueid)
+                self._linkedids_by_uniqueid[uniqueid].add(linkedid)
+
+            if payload['EventName'] != CELEventType.linkedid_end:
+                return [], expired
+
+            self._ended.add(linkedid)
+            group = self._correlated_linkedids(linkedid)
+            if not group <= self._ended:
+                logger.debug(
+                    'Deferring linkedid %s until %s end',
+                    linkedid,
+                    ', '.join(sorted(group - self._ended)),
+                )
+                self.deferred += 1
+                return [], expired
+
+            for group_linkedid in group:
+                self._remove(group_linkedid)
+            return [CorrelatedLinkedId(linkedid, min(group))], expired
+
+    def provide_status(self, status):
+        status['correlation_tracker']['status'] = Status.ok
+        status['correlation_tracker']['linkedids'] = len(self._last_seen)
+        status['correlation_tracker']['deferred'] = self.deferred
+        status['correlation_tracker']['expired'] = self.expired
+
+    def _expire(self, now: float) -> list[CorrelatedLinkedId]:
+        self._next_expiration = now + self.timeout
+        deadline = now - self.timeout
+        stale_linkedids = []
+        for linkedid, last_seen in self._last_seen.items():
+            if last_seen > deadline:
+                break
+            stale_linkedids.append(linkedid)
+
+        expired_linkedids = []
+        for linkedid in stale_linkedids:
+            if linkedid not in self._last_seen:
+                continue
+            group = self._correlated_linkedids(linkedid)
+            if any(self._last_seen[other] > deadline for other in group):
+                continue
+            logger.info(
+                'Correlated linkedids %s did not end, generating %s',
+                ', '.join(sorted(group - self._ended)),
+                ', '.join(sorted(group)),
+            )
+            self.expired += 1
+            key = min(group)
+            for group_linkedid in sorted(group):
+                expired_linkedids.append(CorrelatedLinkedId(group_linkedid, key))
+                self._remove(group_linkedid)
+        return expired_linkedids
+
+    def _correlated_linkedids(self, linkedid: str) -> set[str]:
+        linkedids = {linkedid}
+        pending = [linkedid]
+        while pending:
+            for uniqueid in self._uniqueids_by_linkedid.get(pending.pop(), ()):
+                for other in self._linkedids_by_uniqueid[uniqueid] - linkedids:
+                    linkedids.add(other)
+                    pending.append(other)
+        return linkedids
+
+    def _remove(self, linkedid: str):
+        self._last_seen.pop(linkedid, None)
+        self._ended.discard(linkedid)
+        for uniqueid in self._uniqueids_by_linkedid.pop(linkedid, ()):
+            linkedids = self._linkedids_by_uniqueid.get(uniqueid)
+            if linkedids is None:
+                continue
+            linkedids.discard(linkedid)
+            if not linkedids:
+                del self._linkedids_by_uniqueid[uniqueid]
@@ -0,0 +1,26 @@
+"""create-watermark-table
+
+Revision ID: 3c8e5f1d2a47
+Revises: 57909180a021
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3c8e5f1d2a47'
+down_revision = '57909180a021'
+
+
+def upgrade():
+    op.create_table(
+        'call_logd_watermark',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('cel_id', sa.Integer, nullable=False),
+        sa.Column('cel_eventtime', sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('call_logd_watermark')
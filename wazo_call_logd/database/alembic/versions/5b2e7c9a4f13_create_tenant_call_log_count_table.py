@@ -0,0 +1,106 @@
+"""create-tenant-call-log-count-table
+
+Revision ID: 5b2e7c9a4f13
+Revises: 8d41b7a6c2e9
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import UUID
+
+# revision identifiers, used by Alembic.
+revision = '5b2e7c9a4f13'
+down_revision = '8d41b7a6c2e9'
+
+TABLE_NAME = 'call_logd_tenant_call_log_count'
+FUNCTION_NAME = 'call_logd_tenant_call_log_count_update'
+
+# NOTE: each tenant count is split in shards, one per database connection
+# (modulo SHARDS), so that concurrent writers do not wait on the same row;
+# counts are the sum of their shards, which may each be negative
+SHARDS = 16
+SHARD = f'(pg_backend_pid() % {SHARDS})::smallint'
+
+# NOTE: statement-level triggers aggregate the rows written by a statement, so
+# that bulk writes update each tenant counter once; deltas of tenants being
+# deleted (cascading to their call logs) are ignored
+CREATE_FUNCTION = f'''
+CREATE FUNCTION {FUNCTION_NAME}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO {TABLE_NAME} (tenant_uuid, shard, count)
+        SELECT tenant_uuid, {SHARD}, count(*) FROM new_rows GROUP BY tenant_uuid
+        ON CONFLICT (tenant_uuid, shard)
+        DO UPDATE SET count = {TABLE_NAME}.count + EXCLUDED.count;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO {TABLE_NAME} (tenant_uuid, shard, count)
+        SELECT tenant_uuid, {SHARD}, -count(*)
+        FROM old_rows JOIN call_logd_tenant ON call_logd_tenant.uuid = tenant_uuid
+        GROUP BY tenant_uuid
+        ON CONFLICT (tenant_uuid, shard)
+        DO UPDATE SET count = {TABLE_NAME}.count + EXCLUDED.count;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO {TABLE_NAME} (tenant_uuid, shard, count)
+        SELECT tenant_uuid, {SHARD}, sum(delta)
+        FROM (
+            SELECT old_rows.tenant_uuid, -1 AS delta
+            FROM old_rows JOIN new_rows ON new_rows.id = old_rows.id
+            WHERE new_rows.tenant_uuid <> old_rows.tenant_uuid
+            UNION ALL
+            SELECT new_rows.tenant_uuid, 1 AS delta
+            FROM old_rows JOIN new_rows ON new_rows.id = old_rows.id
+            WHERE new_rows.tenant_uuid <> old_rows.tenant_uuid
+        ) AS moved
+        JOIN call_logd_tenant ON call_logd_tenant.uuid = moved.tenant_uuid
+        GROUP BY tenant_uuid
+        ON CONFLICT (tenant_uuid, shard)
+        DO UPDATE SET count = {TABLE_NAME}.count + EXCLUDED.count;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+TRIGGERS = {
+    'call_logd_call_log_count_insert': 'INSERT REFERENCING NEW TABLE AS new_rows',
+    'call_logd_call_log_count_delete': 'DELETE REFERENCING OLD TABLE AS old_rows',
+    'call_logd_call_log_count_update': (
+        'UPDATE REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows'
+    ),
+}
+
+
+def upgrade():
+    op.create_table(
+        TABLE_NAME,
+        sa.Column(
+            'tenant_uuid',
+            UUID,
+            sa.ForeignKey(
+                'call_logd_tenant.uuid',
+                name='call_logd_tenant_call_log_count_tenant_uuid_fkey',
+                ondelete='CASCADE',
+            ),
+            primary_key=True,
+        ),
+        sa.Column('shard', sa.SmallInteger, primary_key=True, server_default='0'),
+        sa.Column('count', sa.BigInteger, nullable=False, server_default='0'),
+    )
+    op.execute(CREATE_FUNCTION)
+    for name, event in TRIGGERS.items():
+        op.execute(
+            f'CREATE TRIGGER {name} AFTER {event} ON call_logd_call_log '
+            f'FOR EACH STATEMENT EXECUTE PROCEDURE {FUNCTION_NAME}()'
+        )
+    op.execute(
+        f'INSERT INTO {TABLE_NAME} (tenant_uuid, count) '
+        'SELECT tenant_uuid, count(*) FROM call_logd_call_log GROUP BY tenant_uuid'
+    )
+
+
+def downgrade():
+    for name in TRIGGERS:
+        op.execute(f'DROP TRIGGER {name} ON call_logd_call_log')
+    op.execute(f'DROP FUNCTION {FUNCTION_NAME}()')
+    op.drop_table(TABLE_NAME)
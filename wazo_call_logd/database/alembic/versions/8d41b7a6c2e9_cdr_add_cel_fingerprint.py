@@ -0,0 +1,23 @@
+"""cdr_add_cel_fingerprint
+
+Revision ID: 8d41b7a6c2e9
+Revises: 3c8e5f1d2a47
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '8d41b7a6c2e9'
+down_revision = '3c8e5f1d2a47'
+
+CALL_LOG_TABLE_NAME = 'call_logd_call_log'
+
+
+def upgrade():
+    op.add_column(CALL_LOG_TABLE_NAME, sa.Column('cel_fingerprint', sa.String(64)))
+
+
+def downgrade():
+    op.drop_column(CALL_LOG_TABLE_NAME, 'cel_fingerprint')
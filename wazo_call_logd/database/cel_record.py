@@ -0,0 +1,73 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from __future__ import annotations
+
+import json
+import logging
+
+import dateutil.parser
+from xivo_dao.alchemy.cel import CEL
+
+logger = logging.getLogger(__name__)
+
+# columns of the CEL table read when generating call logs
+CEL_RECORD_FIELDS = (
+    'id',
+    'eventtype',
+    'eventtime',
+    'cid_name',
+    'cid_num',
+    'exten',
+    'context',
+    'channame',
+    'uniqueid',
+    'linkedid',
+    'userfield',
+    'peer',
+    'extra',
+    'call_log_id',
+)
+
+CEL_RECORD_COLUMNS = tuple(getattr(CEL, field) for field in CEL_RECORD_FIELDS)
+
+
+def extract_cel_extra(extra: str | None) -> dict | None:
+    if not extra:
+        logger.debug('missing CEL extra')
+        return
+
+    try:
+        extra = json.loads(extra)
+    except json.decoder.JSONDecodeError:
+        logger.debug('invalid CEL extra: %s', repr(extra))
+        return
+
+    return extra
+
+
+class CELRecord:
+    """
+    read-only CEL, decoded once: `eventtime` is a datetime and `extra_dict` holds
+    the decoded `extra`; records are built from column-projected rows so that no
+    ORM instance is loaded in the session
+    """
+
+    __slots__ = CEL_RECORD_FIELDS + ('extra_dict',)
+
+    def __init__(self, **fields):
+        for field in CEL_RECORD_FIELDS:
+            setattr(self, field, fields.get(field))
+        if isinstance(self.eventtime, str):
+            self.eventtime = dateutil.parser.isoparse(self.eventtime)
+        self.extra_dict = extract_cel_extra(self.extra)
+
+    @classmethod
+    def from_row(cls, row) -> CELRecord:
+        return cls(**dict(zip(CEL_RECORD_FIELDS, row)))
+
+    def __repr__(self) -> str:
+        return (
+            f'<CELRecord(id={self.id}, eventtype={self.eventtype}, '
+            f'uniqueid={self.uniqueid}, linkedid={self.linkedid})>'
+        )
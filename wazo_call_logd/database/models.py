@@ -1,4 +1,4 @@
-# Copyright 2021-2024 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2021-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from __future__ import annotations
@@ -14,7 +14,16 @@ from sqlalchemy.ext.mutable import MutableList
 from sqlalchemy.orm import relationship
 from sqlalchemy.schema import CheckConstraint, Column, ForeignKey, Index
 from sqlalchemy.sql import and_, case, select, text
-from sqlalchemy.types import Boolean, DateTime, Enum, Integer, String, Text
+from sqlalchemy.types import (
+    BigInteger,
+    Boolean,
+    DateTime,
+    Enum,
+    Integer,
+    SmallInteger,
+    String,
+    Text,
+)
 from sqlalchemy_utils import UUIDType, generic_repr
 
 Base = declarative_base()
@@ -63,6 +72,7 @@ class CallLog(Base):
     direction = Column(String(255))
     user_field = Column(String(255))
     conversation_id = Column(String(255))
+    cel_fingerprint = Column(String(64))
 
     recordings = relationship(
         'Recording',
@@ -116,6 +126,7 @@ class CallLog(Base):
     destination_line_id = association_proxy('destination_participant', 'line_id')
 
     cel_ids = []
+    linked_ids = []
 
     __table_args__ = (
         Index('call_logd_call_log__idx__conversation_id', 'conversation_id'),
@@ -338,6 +349,34 @@ class Config(Base):
     retention_recording_days_from_file = Column(Boolean)
 
 
+@generic_repr
+class TenantCallLogCount(Base):
+    # NOTE: kept current by statement-level triggers on call_logd_call_log, the
+    # count of a tenant is the sum of its shards
+    __tablename__ = 'call_logd_tenant_call_log_count'
+
+    tenant_uuid = Column(
+        UUIDType,
+        ForeignKey(
+            'call_logd_tenant.uuid',
+            name='call_logd_tenant_call_log_count_tenant_uuid_fkey',
+            ondelete='CASCADE',
+        ),
+        primary_key=True,
+    )
+    shard = Column(SmallInteger, primary_key=True, server_default='0')
+    count = Column(BigInteger, nullable=False, server_default='0')
+
+
+@generic_repr
+class Watermark(Base):
+    __tablename__ = 'call_logd_watermark'
+
+    id = Column(Integer, primary_key=True)
+    cel_id = Column(Integer, nullable=False)
+    cel_eventtime = Column(DateTime(timezone=True), nullable=False)
+
+
 @generic_repr
 class Export(Base):
     __tablename__ = 'call_logd_export'
@@ -1,21 +1,39 @@
-# Copyright 2017-2024 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2017-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from __future__ import annotations
 
 import datetime as dt
+import uuid
+from collections import defaultdict
+from collections.abc import Iterator
 from typing import Any, TypedDict
 
 import sqlalchemy as sa
-from sqlalchemy import and_, distinct, func, sql
+from sqlalchemy import and_, func, sql
 from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlalchemy.ext.associationproxy import AssociationProxyInstance
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Query, joinedload, selectinload, subqueryload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql.expression import ClauseElement, Executable
 
 from wazo_call_logd.datatypes import CallDirection, OrderDirection
 
-from ..models import CallLog, CallLogParticipant
+from ..models import (
+    CallLog,
+    CallLogParticipant,
+    Destination,
+    Recording,
+    TenantCallLogCount,
+)
 from .base import BaseDAO
 
+BULK_INSERT_CHUNK_SIZE = 1000
+STREAM_FETCH_SIZE = 1000
+# estimated counts are exact below this number of call logs
+ESTIMATED_COUNT_CAP = 10000
+
 
 class ListParams(TypedDict, total=False):
     search: str
@@ -23,6 +41,8 @@ class ListParams(TypedDict, total=False):
     direction: OrderDirection
     limit: int
     offset: int
+    cursor: dict[str, Any]
+    count: str
     distinct: str
     start: dt.datetime
     end: dt.datetime
@@ -39,6 +59,88 @@ class ListParams(TypedDict, total=False):
     recorded: bool
 
 
+class _Explain(Executable, ClauseElement):
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain, 'postgresql')
+def _compile_explain(element, compiler, **kwargs):
+    return 'EXPLAIN (FORMAT JSON) ' + compiler.process(element.statement, **kwargs)
+
+
+# values stored for unset columns with a server default
+_SERVER_DEFAULT_VALUES = {'false': False, '{}': ()}
+
+
+def _comparable(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def _order_field(order: str):
+    if order == 'marshmallow_duration':
+        return CallLog.date_end - CallLog.date_answer
+    if order == 'marshmallow_answered':
+        return CallLog.date_answer
+    return getattr(CallLog, order)
+
+
+def order_key(call_log: CallLog, order: str):
+    """
+    value of the `order` sort key of a call log, as compared in `_seek`
+    """
+    if order == 'marshmallow_duration':
+        if call_log.date_end is None or call_log.date_answer is None:
+            return None
+        return call_log.date_end - call_log.date_answer
+    if order == 'marshmallow_answered':
+        return call_log.date_answer
+    return getattr(call_log, order)
+
+
+def supports_cursor(order: str) -> bool:
+    """
+    whether a cursor can page through call logs sorted by `order`; association
+    proxies compare with an EXISTS clause, not with the value of the sort key
+    """
+    return not isinstance(getattr(CallLog, order, None), AssociationProxyInstance)
+
+
+def _seek(order_field, direction: OrderDirection, key, id_: int):
+    # NOTE: rows after (key, id) in `order_field DESC NULLS LAST, id DESC` or
+    # `order_field ASC NULLS FIRST, id ASC` order
+    if direction == 'desc':
+        after_id = CallLog.id < id_
+        if key is None:
+            return and_(order_field.is_(None), after_id)
+        return sql.or_(
+            order_field < key,
+            and_(order_field == key, after_id),
+            order_field.is_(None),
+        )
+
+    after_id = CallLog.id > id_
+    if key is None:
+        return sql.or_(and_(order_field.is_(None), after_id), order_field.isnot(None))
+    return sql.or_(order_field > key, and_(order_field == key, after_id))
+
+
+def _child_key(model, child):
+    key = []
+    for column in model.__table__.columns:
+        if column.key in ('uuid', 'call_log_id'):
+            continue
+        value = getattr(child, column.key)
+        if value is None and column.server_default is not None:
+            value = _SERVER_DEFAULT_VALUES.get(column.server_default.arg)
+        key.append(_comparable(value))
+    return tuple(key)
+
+
 class CallLogDAO(BaseDAO):
     searched_columns = (
         CallLog.source_name,
@@ -68,28 +170,7 @@ class CallLogDAO(BaseDAO):
 
     def find_all_in_period(self, params: ListParams):
         with self.new_session() as session:
-            query = self._list_query(session, params)
-            order_field = None
-            if params.get('order'):
-                if params['order'] == 'marshmallow_duration':
-                    order_field = CallLog.date_end - CallLog.date_answer
-                elif params['order'] == 'marshmallow_answered':
-                    order_field = CallLog.date_answer
-                else:
-                    order_field = getattr(CallLog, params['order'])
-            if params.get('direction') == 'desc':
-                order_field = order_field.desc().nullslast()
-            if params.get('direction') == 'asc':
-                order_field = order_field.asc().nullsfirst()
-
-            if order_field is not None:
-                query = query.order_by(order_field)
-
-            if params.get('limit'):
-                query = query.limit(params['limit'])
-            if params.get('offset'):
-                query = query.offset(params['offset'])
-
+            query = self._paginate(self._list_query(session, params), params)
             call_log_rows = query.all()
 
             if not call_log_rows:
@@ -99,51 +180,159 @@ class CallLogDAO(BaseDAO):
 
             return call_log_rows
 
-    def _list_query(self, session, params):
-        distinct_ = params.get('distinct')
-        if distinct_ == 'peer_exten':
-            # TODO(pcm) use the most recent call log not the most recent id
-            sub_query = (
-                session.query(func.max(CallLogParticipant.call_log_id).label('max_id'))
-                .group_by(CallLogParticipant.user_uuid, CallLogParticipant.peer_exten)
+    def iter_in_period(self, params: ListParams) -> Iterator[CallLog]:
+        """
+        yield the call logs of `find_all_in_period` one at a time, read through a
+        server-side cursor; each call log is expunged once the next one is
+        requested, so that memory does not grow with the number of call logs
+        """
+        with self.new_session() as session:
+            query = self._paginate(
+                self._list_query(session, params, streamed=True), params
+            )
+            query = query.execution_options(stream_results=True).yield_per(
+                STREAM_FETCH_SIZE
+            )
+            for call_log in query:
+                yield call_log
+                session.expunge(call_log)
+
+    def find_max_recordings_in_period(self, params: ListParams) -> int:
+        """
+        highest number of recordings of a call log of `find_all_in_period`
+        """
+        with self.new_session() as session:
+            call_log_ids = self._paginate(self._count_query(session, params), params)
+            recording_counts = (
+                session.query(func.count().label('count'))
+                .select_from(Recording)
+                .filter(Recording.call_log_id.in_(call_log_ids))
+                .group_by(Recording.call_log_id)
                 .subquery()
             )
+            return session.query(
+                func.coalesce(func.max(recording_counts.c.count), 0)
+            ).scalar()
+
+    def _paginate(self, query: Query, params: ListParams) -> Query:
+        order_field = None
+        if params.get('order'):
+            order_field = _order_field(params['order'])
+        if order_field is not None and (cursor := params.get('cursor')):
+            query = query.filter(
+                _seek(order_field, cursor['direction'], cursor['key'], cursor['id'])
+            )
+        # NOTE: ties are ordered by id for cursors to point to a single row
+        if params.get('direction') == 'desc':
+            order_field = order_field.desc().nullslast()
+            query = query.order_by(order_field, CallLog.id.desc())
+        elif params.get('direction') == 'asc':
+            order_field = order_field.asc().nullsfirst()
+            query = query.order_by(order_field, CallLog.id.asc())
+        elif order_field is not None:
+            query = query.order_by(order_field)
+
+        if params.get('limit'):
+            query = query.limit(params['limit'])
+        if params.get('offset'):
+            query = query.offset(params['offset'])
+        return query
 
+    def _peer_exten_query(self, session):
+        # TODO(pcm) use the most recent call log not the most recent id
+        return session.query(
+            func.max(CallLogParticipant.call_log_id).label('max_id')
+        ).group_by(CallLogParticipant.user_uuid, CallLogParticipant.peer_exten)
+
+    def _list_query(self, session, params, streamed=False):
+        distinct_ = params.get('distinct')
+        if distinct_ == 'peer_exten':
+            sub_query = self._peer_exten_query(session).subquery()
             query = session.query(CallLog).join(
                 sub_query, and_(CallLog.id == sub_query.c.max_id)
             )
         else:
             query = session.query(CallLog)
 
-        query = query.options(
-            joinedload('participants'),
-            joinedload('recordings'),
-            selectinload('recordings.call_log'),
-            subqueryload('source_participant'),
-            subqueryload('destination_participant'),
-        )
+        if streamed:
+            # NOTE: joined and subquery eager loads of collections are not
+            # compatible with yield_per, relationships are loaded by batches
+            query = query.options(
+                selectinload('participants'),
+                selectinload('recordings'),
+                selectinload('recordings.call_log'),
+                selectinload('source_participant'),
+                selectinload('destination_participant'),
+                selectinload('destination_details'),
+            )
+        else:
+            query = query.options(
+                joinedload('participants'),
+                joinedload('recordings'),
+                selectinload('recordings.call_log'),
+                subqueryload('source_participant'),
+                subqueryload('destination_participant'),
+            )
 
         query = self._apply_user_filter(query, params)
         query = self._apply_filters(query, params)
         return query
 
+    def _count_query(self, session, params):
+        """
+        ids of the call logs matching `params`, without the joins and eager
+        loads of `_list_query`: every filter on other tables is a semi-join, so
+        that each call log is counted once
+        """
+        query = session.query(CallLog.id)
+        if params.get('distinct') == 'peer_exten':
+            query = query.filter(CallLog.id.in_(self._peer_exten_query(session)))
+        # NOTE: `_apply_filters` also applies the `me_user_uuid` filter
+        return self._apply_filters(query, params)
+
     def count_in_period(self, params):
+        """
+        `count` is either `exact` (the default), `estimated` (exact up to
+        ESTIMATED_COUNT_CAP, planner estimates beyond) or `none`
+        """
+        count = params.get('count') or 'exact'
+        if count == 'none':
+            return {'total': None, 'filtered': None}
+
         with self.new_session() as session:
-            query = session.query(CallLog)
-            query = self._apply_user_filter(query, params)
+            if params.get('me_user_uuid'):
+                segregation_fields = ('tenant_uuids', 'me_user_uuid')
+                count_params = {p: params.get(p) for p in segregation_fields}
+                query = self._count_query(session, count_params)
+                total = self._count(session, query, count)
+            else:
+                total = self._count_tenant_call_logs(
+                    session, params.get('tenant_uuids')
+                )
 
-            segregation_fields = ('tenant_uuids', 'me_user_uuid')
-            count_params = {p: params.get(p) for p in segregation_fields}
-            query = self._apply_filters(query, count_params)
+            query = self._count_query(session, params)
+            filtered = self._count(session, query, count)
 
-            total = query.count()
+        return {'total': total, 'filtered': filtered}
 
-            session.expunge_all()
+    def _count_tenant_call_logs(self, session, tenant_uuids):
+        query = session.query(func.coalesce(func.sum(TenantCallLogCount.count), 0))
+        if tenant_uuids:
+            query = query.filter(
+                TenantCallLogCount.tenant_uuid.in_(str(uuid) for uuid in tenant_uuids)
+            )
+        return int(query.scalar())
 
-            subquery = self._list_query(session, params).subquery()
-            filtered = session.query(func.count(distinct(subquery.c.id))).scalar()
+    def _count(self, session, query, count):
+        if count != 'estimated':
+            return session.query(func.count()).select_from(query.subquery()).scalar()
 
-        return {'total': total, 'filtered': filtered}
+        capped_query = query.limit(ESTIMATED_COUNT_CAP).subquery()
+        capped = session.query(func.count()).select_from(capped_query).scalar()
+        if capped < ESTIMATED_COUNT_CAP:
+            return capped
+        (plan,) = session.execute(_Explain(query.statement)).scalar()
+        return max(capped, int(plan['Plan']['Plan Rows']))
 
     def _apply_user_filter(self, query: Query, params: dict[str, Any]) -> Query:
         if me_user_uuid := params.get('me_user_uuid'):
@@ -206,11 +395,13 @@ class CallLogDAO(BaseDAO):
             )
 
         if user_uuids := params.get('user_uuids'):
-            filters = (
-                CallLog.participants.any(CallLogParticipant.user_uuid == str(user_uuid))
-                for user_uuid in user_uuids
+            query = query.filter(
+                CallLog.participants.any(
+                    CallLogParticipant.user_uuid.in_(
+                        str(user_uuid) for user_uuid in user_uuids
+                    )
+                )
             )
-            query = query.filter(sql.or_(*filters))
 
         if terminal_user_uuids := params.get('terminal_user_uuids'):
             # consider only source participant
@@ -281,6 +472,212 @@ class CallLogDAO(BaseDAO):
                 call_log.destination_participant
             session.expunge_all()
 
+    def bulk_create_from_list(self, call_logs, call_log_ids_to_delete=None):
+        """
+        replace call logs in a single transaction:
+        delete the previous ones and insert the new call logs and their
+        children with multi-row INSERTs; tenants must already exist
+        """
+        with self.new_session() as session:
+            if call_log_ids_to_delete:
+                query = session.query(CallLog)
+                query = query.filter(CallLog.id.in_(call_log_ids_to_delete))
+                query.delete(synchronize_session=False)
+
+            self._insert_new(session, call_logs)
+
+        for call_log in call_logs:
+            self._set_viewonly_relationships(call_log)
+
+    def upsert_from_list(self, call_logs, call_log_ids_to_replace=None):
+        """
+        regenerate call logs in place, in a single transaction: a new call log
+        takes the id of the replaced call log of the same conversation, only
+        its changed columns and child rows are written; other new call logs are
+        inserted and the remaining replaced call logs are deleted
+
+        return the ids of the deleted call logs
+        """
+        with self.new_session() as session:
+            previous_by_conversation_id = {}
+            if call_log_ids_to_replace:
+                query = (
+                    session.query(CallLog)
+                    .options(
+                        selectinload('participants'),
+                        selectinload('recordings'),
+                        selectinload('destination_details'),
+                    )
+                    .filter(CallLog.id.in_(call_log_ids_to_replace))
+                    .order_by(CallLog.id.desc())
+                )
+                for previous in query:
+                    previous_by_conversation_id.setdefault(
+                        previous.conversation_id, previous
+                    )
+
+            updated_ids = set()
+            new_call_logs = []
+            for call_log in call_logs:
+                previous = previous_by_conversation_id.pop(
+                    call_log.conversation_id, None
+                )
+                if previous is None:
+                    new_call_logs.append(call_log)
+                    continue
+                self._update_in_place(session, previous, call_log)
+                updated_ids.add(previous.id)
+
+            deleted_ids = sorted(set(call_log_ids_to_replace or ()) - updated_ids)
+            if deleted_ids:
+                query = session.query(CallLog).filter(CallLog.id.in_(deleted_ids))
+                query.delete(synchronize_session=False)
+
+            self._insert_new(session, new_call_logs)
+            session.expunge_all()
+
+        for call_log in call_logs:
+            self._set_viewonly_relationships(call_log)
+        return deleted_ids
+
+    def _update_in_place(self, session, previous, call_log):
+        call_log.id = previous.id
+        changes = {
+            column.key: getattr(call_log, column.key)
+            for column in CallLog.__table__.columns
+            if column.key != 'id'
+            and _comparable(getattr(call_log, column.key))
+            != _comparable(getattr(previous, column.key))
+        }
+        if changes:
+            table = CallLog.__table__
+            session.execute(
+                table.update().where(table.c.id == previous.id).values(changes)
+            )
+
+        for model, previous_children, children in (
+            (CallLogParticipant, previous.participants, call_log.participants),
+            (Recording, previous.recordings, call_log.recordings),
+            (Destination, previous.destination_details, call_log.destination_details),
+        ):
+            self._update_children_in_place(
+                session, model, previous.id, previous_children, children
+            )
+
+    def _update_children_in_place(
+        self, session, model, call_log_id, previous_children, children
+    ):
+        # NOTE: children have no natural key, unchanged rows keep their uuid
+        # and the others are deleted or inserted
+        previous_by_key = defaultdict(list)
+        for previous in previous_children:
+            previous_by_key[_child_key(model, previous)].append(previous.uuid)
+
+        new_children = []
+        for child in children:
+            child.call_log_id = call_log_id
+            uuids = previous_by_key.get(_child_key(model, child))
+            if uuids:
+                child.uuid = uuids.pop()
+            else:
+                child.uuid = child.uuid or uuid.uuid4()
+                new_children.append(child)
+
+        stale_uuids = [uuid_ for uuids in previous_by_key.values() for uuid_ in uuids]
+        if stale_uuids:
+            table = model.__table__
+            session.execute(table.delete().where(table.c.uuid.in_(stale_uuids)))
+        self._insert_all(session, model, new_children)
+
+    def _insert_new(self, session, call_logs):
+        if not call_logs:
+            return
+
+        call_log_ids = self._reserve_ids(session, len(call_logs))
+        participants, recordings, destinations = [], [], []
+        for call_log, call_log_id in zip(call_logs, call_log_ids):
+            call_log.id = call_log_id
+            for child in call_log.participants:
+                child.call_log_id = call_log_id
+                child.uuid = child.uuid or uuid.uuid4()
+                participants.append(child)
+            for child in call_log.recordings:
+                child.call_log_id = call_log_id
+                child.uuid = child.uuid or uuid.uuid4()
+                recordings.append(child)
+            for child in call_log.destination_details:
+                child.call_log_id = call_log_id
+                child.uuid = child.uuid or uuid.uuid4()
+                destinations.append(child)
+
+        self._insert_all(session, CallLog, call_logs)
+        self._insert_all(session, CallLogParticipant, participants)
+        self._insert_all(session, Recording, recordings)
+        self._insert_all(session, Destination, destinations)
+
+    def _reserve_ids(self, session, count):
+        sequence_name = func.pg_get_serial_sequence(CallLog.__tablename__, 'id')
+        query = session.query(func.nextval(sequence_name)).select_from(
+            func.generate_series(1, count)
+        )
+        return [id_ for (id_,) in query.all()]
+
+    def _insert_all(self, session, model, objects):
+        table = model.__table__
+        rows = []
+        for obj in objects:
+            row = {}
+            for column in table.columns:
+                value = getattr(obj, column.key)
+                if value is None and column.server_default is not None:
+                    value = sql.literal_column('DEFAULT')
+                row[column.key] = value
+            rows.append(row)
+
+        for i in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+            chunk = rows[i : i + BULK_INSERT_CHUNK_SIZE]
+            session.execute(table.insert().values(chunk))
+
+    def _set_viewonly_relationships(self, call_log):
+        # NOTE: mirror the relationships the ORM would have loaded after a flush
+        sources = [p for p in call_log.participants if p.role == 'source']
+        destinations = sorted(
+            (p for p in call_log.participants if p.role == 'destination'),
+            key=lambda p: (bool(p.answered), str(p.user_uuid)),
+            reverse=True,
+        )
+        set_committed_value(
+            call_log, 'source_participant', sources[0] if sources else None
+        )
+        set_committed_value(
+            call_log,
+            'destination_participant',
+            destinations[0] if destinations else None,
+        )
+        for child in call_log.participants + call_log.recordings:
+            set_committed_value(child, 'call_log', call_log)
+
+    def find_cel_fingerprints(self, call_log_ids):
+        if not call_log_ids:
+            return {}
+
+        with self.new_session() as session:
+            query = session.query(CallLog.id, CallLog.cel_fingerprint).filter(
+                CallLog.id.in_(call_log_ids),
+                CallLog.cel_fingerprint.isnot(None),
+            )
+            return dict(query.all())
+
+    def find_ids_from_conversation_ids(self, conversation_ids):
+        if not conversation_ids:
+            return []
+
+        with self.new_session() as session:
+            query = session.query(CallLog.id).filter(
+                CallLog.conversation_id.in_(conversation_ids)
+            )
+            return [id_ for (id_,) in query.all()]
+
     def delete_from_list(self, call_log_ids):
         with self.new_session() as session:
             query = session.query(CallLog)
@@ -1,39 +1,120 @@
-# Copyright 2013-2025 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+from sqlalchemy import Integer, Text, bindparam, text, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import aliased
 from xivo_dao.alchemy.cel import CEL
 
+from ..cel_record import CEL_RECORD_COLUMNS, CELRecord
 from .base import BaseDAO
 
+UPDATE_CHUNK_SIZE = 10000
+STREAM_FETCH_SIZE = 1000
 
-def eject(session, objects):
-    for obj in objects:
-        session.expunge(obj)
-    return objects
+_ASSOCIATE_QUERY = text('''
+    UPDATE cel SET call_log_id = pairs.call_log_id
+    FROM unnest(:cel_ids, :call_log_ids) AS pairs(cel_id, call_log_id)
+    WHERE cel.id = pairs.cel_id
+    AND cel.call_log_id IS DISTINCT FROM pairs.call_log_id
+    ''').bindparams(
+    bindparam('cel_ids', type_=ARRAY(Integer)),
+    bindparam('call_log_ids', type_=ARRAY(Integer)),
+)
+
+_ASSOCIATE_BY_LINKEDID_QUERY = text('''
+    UPDATE cel SET call_log_id = pairs.call_log_id
+    FROM unnest(:linked_ids, :call_log_ids) AS pairs(linkedid, call_log_id)
+    WHERE cel.linkedid = pairs.linkedid
+    AND cel.call_log_id IS DISTINCT FROM pairs.call_log_id
+    ''').bindparams(
+    bindparam('linked_ids', type_=ARRAY(Text)),
+    bindparam('call_log_ids', type_=ARRAY(Integer)),
+)
+
+_UNASSOCIATE_QUERY = text(
+    'UPDATE cel SET call_log_id = NULL WHERE call_log_id = ANY(:call_log_ids)'
+).bindparams(bindparam('call_log_ids', type_=ARRAY(Integer)))
+
+
+def to_records(rows):
+    return [CELRecord.from_row(row) for row in rows]
 
 
 class CELDAO(BaseDAO):
+    # follow the uniqueid <-> linkedid relation transitively, in PostgreSQL
+    recursive_correlation = True
+
     def associate_all_to_call_logs(self, call_logs):
+        pairs, linked_pairs = [], []
+        for call_log in call_logs:
+            cel_ids = call_log.cel_ids or []
+            if None in cel_ids:
+                # NOTE: CEL received from the bus have no id yet
+                linked_pairs.extend(
+                    (linked_id, call_log.id) for linked_id in call_log.linked_ids
+                )
+            else:
+                pairs.extend((cel_id, call_log.id) for cel_id in cel_ids)
+        if not (pairs or linked_pairs):
+            return
+
         with self.new_session() as session:
-            for call_log in call_logs:
-                if not call_log.cel_ids:
-                    continue
-                query = session.query(CEL).filter(CEL.id.in_(call_log.cel_ids))
-                query.update({'call_log_id': call_log.id}, synchronize_session=False)
+            self._update_in_chunks(session, _ASSOCIATE_QUERY, 'cel_ids', pairs)
+            self._update_in_chunks(
+                session, _ASSOCIATE_BY_LINKEDID_QUERY, 'linked_ids', linked_pairs
+            )
+
+    def _update_in_chunks(self, session, query, key, pairs):
+        for i in range(0, len(pairs), UPDATE_CHUNK_SIZE):
+            keys, call_log_ids = zip(*pairs[i : i + UPDATE_CHUNK_SIZE])
+            session.execute(
+                query, {key: list(keys), 'call_log_ids': list(call_log_ids)}
+            )
 
     def unassociate_all_from_call_log_ids(self, call_log_ids):
         if not call_log_ids:
             return
 
+        call_log_ids = list(call_log_ids)
         with self.new_session() as session:
-            query = session.query(CEL).filter(CEL.call_log_id.in_(call_log_ids))
-            query.update({'call_log_id': None}, synchronize_session=False)
+            for i in range(0, len(call_log_ids), UPDATE_CHUNK_SIZE):
+                chunk = call_log_ids[i : i + UPDATE_CHUNK_SIZE]
+                session.execute(_UNASSOCIATE_QUERY, {'call_log_ids': chunk})
 
     def unassociate_all(self):
         with self.new_session() as session:
             query = session.query(CEL)
             query.update({'call_log_id': None}, synchronize_session=False)
 
+    def _correlated_cels(self, session, base_cels):
+        if self.recursive_correlation:
+            return self._correlated_cels_recursively(session, base_cels)
+        return self._correlated_cels_by_uniqueid(session, base_cels)
+
+    def _correlated_cels_recursively(self, session, base_cels):
+        """
+        CEL of every linkedid reachable from the uniqueids of `base_cels`
+        through shared uniqueids, in a single WITH RECURSIVE query
+        """
+        linked = (
+            session.query(CEL.linkedid)
+            .filter(CEL.uniqueid.in_(base_cels))
+            .cte('linked', recursive=True)
+        )
+        linked_cel = aliased(CEL)
+        correlated_cel = aliased(CEL)
+        linked = linked.union(
+            session.query(correlated_cel.linkedid)
+            .join(linked_cel, linked_cel.uniqueid == correlated_cel.uniqueid)
+            .filter(linked_cel.linkedid == linked.c.linkedid)
+        )
+        return (
+            session.query(*CEL_RECORD_COLUMNS)
+            .filter(CEL.linkedid.in_(session.query(linked.c.linkedid)))
+            .order_by(CEL.eventtime.asc())
+        )
+
     def _correlated_cels_by_uniqueid(self, session, base_cels):
         unique_ids = {row.uniqueid for row in base_cels.all()}
         correlated_linkedids = {
@@ -44,7 +125,7 @@ class CELDAO(BaseDAO):
             .all()
         }
         correlated_cels = (
-            session.query(CEL)
+            session.query(*CEL_RECORD_COLUMNS)
             .filter(CEL.linkedid.in_(correlated_linkedids))
             .order_by(CEL.eventtime.asc())
         )
@@ -65,17 +146,47 @@ class CELDAO(BaseDAO):
             elif older:
                 subquery = subquery.filter(CEL.eventtime >= older)
 
-            cels = list(self._correlated_cels_by_uniqueid(session, subquery))
-            return eject(session, cels)
+            return to_records(self._correlated_cels(session, subquery))
+
+    def iter_slices_since(self, older, slice_size, newer=None):
+        """
+        yield every CEL since `older` (if any, and before `newer`) in (eventtime, id)
+        order, one slice of at most `slice_size` CEL at a time; each slice is
+        read with a keyset query through a server-side cursor
+        """
+        last_key = None
+        while True:
+            with self.new_session() as session:
+                query = session.query(*CEL_RECORD_COLUMNS)
+                if older is not None:
+                    query = query.filter(CEL.eventtime >= older)
+                if newer is not None:
+                    query = query.filter(CEL.eventtime < newer)
+                if last_key:
+                    query = query.filter(tuple_(CEL.eventtime, CEL.id) > last_key)
+                query = (
+                    query.order_by(CEL.eventtime.asc(), CEL.id.asc())
+                    .limit(slice_size)
+                    .execution_options(stream_results=True)
+                    .yield_per(STREAM_FETCH_SIZE)
+                )
+                cels = to_records(query)
+
+            if not cels:
+                return
+            yield cels
+            if len(cels) < slice_size:
+                return
+            last_key = (cels[-1].eventtime, cels[-1].id)
 
     def find_from_linked_id(self, linked_id):
+        return self.find_from_linked_ids([linked_id])
+
+    def find_from_linked_ids(self, linked_ids):
         with self.new_session() as session:
             linked_cels = (
                 session.query(CEL.uniqueid)
                 .distinct(CEL.uniqueid)
-                .filter(CEL.linkedid == linked_id)
-            )
-            correlated_cels = list(
-                self._correlated_cels_by_uniqueid(session, linked_cels)
+                .filter(CEL.linkedid.in_(linked_ids))
             )
-            return eject(session, correlated_cels)
+            return to_records(self._correlated_cels(session, linked_cels))
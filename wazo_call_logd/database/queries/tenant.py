@@ -1,17 +1,44 @@
-# Copyright 2021-2023 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2021-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import threading
+
+from sqlalchemy.dialects.postgresql import insert
+
 from ..models import Tenant
 from .base import BaseDAO
 
 
+def create_tenants_if_not_exist(session, tenant_uuids):
+    if not tenant_uuids:
+        return
+
+    query = insert(Tenant).values([{'uuid': uuid} for uuid in tenant_uuids])
+    session.execute(query.on_conflict_do_nothing(index_elements=['uuid']))
+
+
 class TenantDAO(BaseDAO):
+    def __init__(self, Session):
+        super().__init__(Session)
+        # NOTE: tenants deleted from wazo-auth are forgotten by the tenant
+        # plugin; those removed by another process (e.g. wazo-call-logd-sync-db)
+        # are forgotten by writers when their call logs violate the tenant
+        # foreign key
+        self._known_uuids = set()
+        self._known_uuids_lock = threading.Lock()
+
     def create_all_uuids_if_not_exist(self, tenant_uuids):
+        with self._known_uuids_lock:
+            unknown_uuids = {str(uuid) for uuid in tenant_uuids} - self._known_uuids
+        if not unknown_uuids:
+            return
+
         with self.new_session() as session:
-            for tenant_uuid in tenant_uuids:
-                if session.query(Tenant).get(tenant_uuid):
-                    continue
+            create_tenants_if_not_exist(session, sorted(unknown_uuids))
+
+        with self._known_uuids_lock:
+            self._known_uuids.update(unknown_uuids)
 
-                tenant = Tenant(uuid=tenant_uuid)
-                session.add(tenant)
-                session.flush()
+    def forget(self, tenant_uuid):
+        with self._known_uuids_lock:
+            self._known_uuids.discard(str(tenant_uuid))
@@ -0,0 +1,39 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from sqlalchemy.dialects.postgresql import insert
+
+from ..models import Watermark
+from .base import BaseDAO
+
+WATERMARK_ID = 1
+
+
+class WatermarkDAO(BaseDAO):
+    def find(self):
+        with self.new_session() as session:
+            watermark = session.query(Watermark).get(WATERMARK_ID)
+            if watermark:
+                session.expunge(watermark)
+            return watermark
+
+    def update(self, cel_id, cel_eventtime):
+        values = {'cel_id': cel_id, 'cel_eventtime': cel_eventtime}
+        query = insert(Watermark).values(id=WATERMARK_ID, **values)
+        query = query.on_conflict_do_update(index_elements=['id'], set_=values)
+        with self.new_session() as session:
+            session.execute(query)
+
+    def rewind(self, cel_eventtime):
+        with self.new_session() as session:
+            query = session.query(Watermark).filter(
+                Watermark.cel_eventtime > cel_eventtime
+            )
+            query.update(
+                {'cel_id': 0, 'cel_eventtime': cel_eventtime},
+                synchronize_session=False,
+            )
+
+    def delete(self):
+        with self.new_session() as session:
+            session.query(Watermark).delete()
@@ -1,11 +1,13 @@
-# Copyright 2022-2025 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2022-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from __future__ import annotations
 
+import hashlib
 import logging
+import time
 from collections import namedtuple
-from collections.abc import Iterator
+from collections.abc import Iterable, Iterator
 from itertools import groupby
 from operator import attrgetter
 
@@ -13,13 +15,15 @@ from wazo_confd_client import Client as ConfdClient
 from xivo.asterisk.protocol_interface import protocol_interface_from_channel
 from xivo_dao.alchemy.cel import CEL
 
-from wazo_call_logd.cel_interpretor import AbstractCELInterpretor
+from wazo_call_logd.cel_interpretor import AbstractCELInterpretor, CELIndex
 from wazo_call_logd.database.cel_event_type import CELEventType
 from wazo_call_logd.exceptions import InvalidCallLogException
 from wazo_call_logd.raw_call_log import RawCallLog
 
+from .context import ContextResolver
 from .database.models import CallLog, CallLogParticipant
-from .participant import ParticipantInfo, find_participant, find_participant_by_uuid
+from .metrics import generation_metrics
+from .participant import ParticipantInfo, ParticipantResolver, line_name_from_channel
 
 logger = logging.getLogger(__name__)
 
@@ -30,8 +34,13 @@ CallLogsCreation = namedtuple(
 
 
 class _ParticipantsProcessor:
-    def __init__(self, confd_client: ConfdClient):
+    def __init__(
+        self,
+        confd_client: ConfdClient,
+        participant_resolver: ParticipantResolver | None = None,
+    ):
         self.confd: ConfdClient = confd_client
+        self.resolver = participant_resolver or ParticipantResolver(confd_client)
         self.confd_participants: dict[str, ParticipantInfo] = {}
 
     def __call__(self, call_log: RawCallLog) -> RawCallLog:
@@ -39,7 +48,7 @@ class _ParticipantsProcessor:
         return call_log
 
     def _fetch_participant_from_channel(self, channel: str) -> ParticipantInfo | None:
-        confd_participant = find_participant(self.confd, channel)
+        confd_participant = self.resolver.find_participant(channel)
         if not confd_participant:
             logger.debug('No participant found for channel %s', channel)
             return
@@ -61,7 +70,7 @@ class _ParticipantsProcessor:
     ) -> ParticipantInfo | None:
         confd_participant = self.confd_participants.get(user_uuid)
         if not confd_participant:
-            confd_participant = find_participant_by_uuid(self.confd, user_uuid)
+            confd_participant = self.resolver.find_participant_by_uuid(user_uuid)
             if not confd_participant:
                 logger.error('No user found for user_uuid %s', user_uuid)
                 return
@@ -159,57 +168,187 @@ class _ParticipantsProcessor:
         call_log.participants = connected_participants + unreached_participants
 
 
+class _DisjointSet:
+    def __init__(self):
+        self._parent: list[int] = []
+        self._size: list[int] = []
+
+    def add(self) -> int:
+        node = len(self._parent)
+        self._parent.append(node)
+        self._size.append(1)
+        return node
+
+    def find(self, node: int) -> int:
+        parent = self._parent
+        while parent[node] != node:
+            # path halving
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def union(self, a: int, b: int):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return
+        if self._size[root_a] < self._size[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self._size[root_a] += self._size[root_b]
+
+
 def _group_cels_by_shared_channels(
     cels: list[CEL],
 ) -> Iterator[tuple[set[str], list[CEL]]]:
-    cels = sorted(cels, key=attrgetter('linkedid'))
-    linkedid_sequences = [
-        (linkedid, list(cels))
-        for linkedid, cels in groupby(cels, key=attrgetter('linkedid'))
-    ]
-
     # identify linkedid-based cel sequences that share uniqueids(i.e. channels)
     # this correlation is transitive,
     # i.e. if a channel is shared between sequence a and b, and between b and c,
     # then a and c are also correlated
-    correlation_groups: list[tuple[set[str], set[str], list[CEL]]] = []
-    for linkedid, cels in linkedid_sequences:
-        uniqueids = {cel.uniqueid for cel in cels}
-        correlated_sequences = False
-        for (
-            correlated_uniqueids,
-            correlated_linkedids,
-            correlated_cels,
-        ) in correlation_groups:
-            # correlation identified if any channel in this cel sequence
-            # are also in other sequences in the group
-            if uniqueids & correlated_uniqueids:
-                correlated_cels.extend(cels)  # add cels to correlation group
-                correlated_uniqueids.update(
-                    uniqueids
-                )  # expand the correlation group to the channels of this sequence
-                correlated_sequences = True
-                correlated_linkedids.add(linkedid)
-        if not correlated_sequences:
-            # if no correlation found, create a new correlation group
-            correlation_groups.append((uniqueids, {linkedid}, list(cels)))
+    cels = sorted(cels, key=attrgetter('linkedid'))
+
+    disjoint_set = _DisjointSet()
+    linkedid_nodes: dict[str, int] = {}
+    uniqueid_nodes: dict[str, int] = {}
+    for cel in cels:
+        linkedid_node = linkedid_nodes.get(cel.linkedid)
+        if linkedid_node is None:
+            linkedid_node = linkedid_nodes[cel.linkedid] = disjoint_set.add()
+        uniqueid_node = uniqueid_nodes.get(cel.uniqueid)
+        if uniqueid_node is None:
+            uniqueid_node = uniqueid_nodes[cel.uniqueid] = disjoint_set.add()
+        disjoint_set.union(linkedid_node, uniqueid_node)
+
+    correlation_groups: dict[int, tuple[set[str], list[CEL]]] = {}
+    for cel in cels:
+        root = disjoint_set.find(linkedid_nodes[cel.linkedid])
+        if root not in correlation_groups:
+            correlation_groups[root] = (set(), [])
+        linkedids, correlated_cels = correlation_groups[root]
+        linkedids.add(cel.linkedid)
+        correlated_cels.append(cel)
 
     yield from (
-        (linkedids, sorted(cels, key=attrgetter('eventtime')))
-        for (uniqueids, linkedids, cels) in correlation_groups
+        (linkedids, sorted(correlated_cels, key=attrgetter('eventtime')))
+        for linkedids, correlated_cels in correlation_groups.values()
+    )
+
+
+def cel_fingerprint(cels: list[CEL]) -> str | None:
+    # NOTE: CEL received from the bus have no id yet
+    cel_ids = sorted(cel.id for cel in cels if cel.id is not None)
+    if not cel_ids or len(cel_ids) != len(cels):
+        return None
+    digest = hashlib.sha1(','.join(map(str, cel_ids)).encode()).hexdigest()
+    return f'{cel_ids[-1]}:{digest}'
+
+
+def _is_terminated(linkedids: set[str], cels: list[CEL]) -> bool:
+    terminated_links = {
+        cel.linkedid for cel in cels if cel.eventtype == CELEventType.linkedid_end
+    }
+    return linkedids == terminated_links
+
+
+def _is_headless(linkedids: set[str], cels: list[CEL]) -> bool:
+    # the first CEL of a linkedid starts the channel whose uniqueid is the linkedid;
+    # NOTE: later CEL of that channel (e.g. LINKEDID_END) are not enough, a window
+    # or a buffer may start after its CHAN_START
+    started_links = {
+        cel.uniqueid for cel in cels if cel.eventtype == CELEventType.chan_start
+    }
+    return not linkedids <= started_links
+
+
+def _is_unprocessed(cels: list[CEL]) -> bool:
+    return any(
+        cel.call_log_id is None
+        and cel.channame != 'Message/ast_msg_queue'  # ignore SIP chat
+        for cel in cels
     )
 
 
+class CELStreamBuffer:
+    """
+    hold CEL streamed in eventtime order until their correlation group is
+    terminated; when more than `max_cels` CEL are held, the oldest groups are
+    evicted and must be regenerated from the database by linkedid
+    """
+
+    def __init__(self, max_cels: int):
+        self.max_cels = max_cels
+        self._cels: list[CEL] = []
+
+    def __len__(self) -> int:
+        return len(self._cels)
+
+    def feed(self, cels: list[CEL]) -> tuple[list[CEL], set[str]]:
+        """
+        return the CEL of terminated unprocessed groups and the linkedids of
+        unprocessed groups that are not entirely held by the buffer
+        """
+        self._cels.extend(cels)
+
+        ready_cels: list[CEL] = []
+        refetch_linkedids: set[str] = set()
+        pending: list[tuple[set[str], list[CEL]]] = []
+        for linkedids, group in _group_cels_by_shared_channels(self._cels):
+            if not _is_terminated(linkedids, group):
+                pending.append((linkedids, group))
+            elif not _is_unprocessed(group):
+                continue
+            elif _is_headless(linkedids, group):
+                refetch_linkedids |= linkedids
+            else:
+                ready_cels.extend(group)
+
+        held = sum(len(group) for _, group in pending)
+        if held > self.max_cels:
+            pending.sort(key=lambda item: item[1][0].eventtime, reverse=True)
+            while held > self.max_cels:
+                linkedids, group = pending.pop()
+                held -= len(group)
+                logger.debug('Evicting unterminated linkedids %s', linkedids)
+                if _is_unprocessed(group):
+                    refetch_linkedids |= linkedids
+
+        self._cels = [cel for _, group in pending for cel in group]
+        return ready_cels, refetch_linkedids
+
+    def oldest(self) -> CEL | None:
+        return min(self._cels, key=attrgetter('eventtime', 'id'), default=None)
+
+    def unprocessed_linkedids(self) -> set[str]:
+        linkedids: set[str] = set()
+        for group_linkedids, group in _group_cels_by_shared_channels(self._cels):
+            if _is_unprocessed(group):
+                linkedids |= group_linkedids
+        return linkedids
+
+
 class CallLogsGenerator:
-    def __init__(self, confd, cel_interpretors: list[AbstractCELInterpretor]):
+    def __init__(
+        self,
+        confd,
+        cel_interpretors: list[AbstractCELInterpretor],
+        participant_resolver: ParticipantResolver | None = None,
+        context_resolver: ContextResolver | None = None,
+    ):
         self.confd: ConfdClient = confd
         self._cel_interpretors = cel_interpretors
+        self._participant_resolver = participant_resolver
+        self._context_resolver = context_resolver or ContextResolver(confd)
         self._service_tenant_uuid = None
 
     def set_default_tenant_uuid(self, token):
         self._service_tenant_uuid = token['metadata']['tenant_uuid']
 
-    def from_cel(self, cels):
+    def from_cel(self, cels, fingerprints=None):
+        """
+        `fingerprints` are the CEL fingerprints of the call logs the CEL are
+        associated to, calls whose CEL did not change are not generated again
+        """
+        if fingerprints:
+            cels = self._skip_unchanged_calls(cels, fingerprints)
         call_logs_to_delete = self.list_call_log_ids(cels)
         new_call_logs = self.call_logs_from_cel(cels)
         return CallLogsCreation(
@@ -218,8 +357,10 @@ class CallLogsGenerator:
         )
 
     def call_logs_from_cel(self, cels: list[CEL]) -> list[CallLog]:
-        result = []
-        for linkedids, cels_by_call in _group_cels_by_shared_channels(cels):
+        interpreted_call_logs = []
+        with generation_metrics.time('correlation_grouping'):
+            correlation_groups = list(_group_cels_by_shared_channels(cels))
+        for linkedids, cels_by_call in correlation_groups:
             logger.debug(
                 'interpreting %d cels from correlated linkedids(%s)',
                 len(cels_by_call),
@@ -246,15 +387,39 @@ class CallLogsGenerator:
             # In that case, use the linkedid of the caller, i.e. the smaller one.
             call_log.conversation_id = min(linkedids)
             call_log.cel_ids = [cel.id for cel in cels_by_call]
+            call_log.linked_ids = sorted(linkedids)
+            call_log.cel_fingerprint = cel_fingerprint(cels_by_call)
 
+            # NOTE: indexed once, then shared by the interpretors and their predicates
+            cels_by_call = CELIndex(cels_by_call)
             interpretor = self._get_interpretor(cels_by_call)
-            logger.debug('interpreting cels using %s', interpretor.__class__.__name__)
+            interpretor_name = interpretor.__class__.__name__
+            logger.debug('interpreting cels using %s', interpretor_name)
             try:
-                call_log = interpretor.interpret_cels(cels_by_call, call_log)
-
+                with generation_metrics.time(f'interpretation.{interpretor_name}'):
+                    call_log = interpretor.interpret_cels(cels_by_call, call_log)
                 self._remove_duplicate_participants(call_log)
+            except Exception as e:
+                logger.exception(
+                    'CEL interpretation failure for linkedid group %s: %s', linkedids, e
+                )
+                # this CEL sequence failed to be interpreted,
+                # but the next one should be given a chance
+                continue
+            interpreted_call_logs.append((linkedids, call_log))
+
+        # NOTE: participant resolution is observed once per batch of calls
+        resolution_start = time.monotonic()
+        self._prefetch_participants(call_log for _, call_log in interpreted_call_logs)
+        resolution_time = time.monotonic() - resolution_start
+
+        result = []
+        for linkedids, call_log in interpreted_call_logs:
+            try:
+                resolution_start = time.monotonic()
                 self._fetch_participants(call_log)
                 self._ensure_tenant_uuid_is_set(call_log)
+                resolution_time += time.monotonic() - resolution_start
                 self._fill_extensions_from_participants(call_log)
                 self._remove_incomplete_recordings(call_log)
                 self._handle_recording_pauses(call_log)
@@ -269,12 +434,27 @@ class CallLogsGenerator:
                 logger.exception(
                     'CEL interpretation failure for linkedid group %s: %s', linkedids, e
                 )
-                # this CEL sequence failed to be interpreted,
-                # but the next one should be given a chance
                 continue
 
+        generation_metrics.observe('participant_resolution', resolution_time)
         return result
 
+    def _skip_unchanged_calls(self, cels, fingerprints: dict[int, str]):
+        changed_cels = []
+        for linkedids, cels_by_call in _group_cels_by_shared_channels(cels):
+            call_log_ids = {cel.call_log_id for cel in cels_by_call}
+            if len(call_log_ids) == 1:
+                (call_log_id,) = call_log_ids
+                fingerprint = fingerprints.get(call_log_id)
+                if fingerprint and fingerprint == cel_fingerprint(cels_by_call):
+                    logger.debug(
+                        'Skipping unchanged call of linkedids (%s)',
+                        ', '.join(sorted(linkedids)),
+                    )
+                    continue
+            changed_cels.extend(cels_by_call)
+        return changed_cels
+
     def list_call_log_ids(self, cels):
         return {cel.call_log_id for cel in cels if cel.call_log_id}
 
@@ -297,8 +477,31 @@ class CallLogsGenerator:
             for duplicate_channel_name in duplicate_channel_names:
                 call_log.raw_participants.pop(duplicate_channel_name, None)
 
+    def _prefetch_participants(self, call_logs: Iterable[RawCallLog]):
+        if not self._participant_resolver:
+            return
+
+        line_names, user_uuids = set(), set()
+        for call_log in call_logs:
+            for channel_name in call_log.raw_participants:
+                if line_name := line_name_from_channel(channel_name):
+                    line_names.add(line_name)
+            user_uuids.update(
+                str(participant_info['user_uuid'])
+                for participant_info in call_log.participants_info
+                if 'user_uuid' in participant_info
+            )
+
+        try:
+            self._participant_resolver.prefetch(line_names, user_uuids)
+        except Exception:
+            # participants will be looked up one by one instead
+            logger.exception('Failed to prefetch participants from confd')
+
     def _fetch_participants(self, call_log: RawCallLog):
-        participant_processor = _ParticipantsProcessor(self.confd)
+        participant_processor = _ParticipantsProcessor(
+            self.confd, self._participant_resolver
+        )
         call_log = participant_processor(call_log)
         logger.debug('fetched participants: %s', call_log.participants)
         return call_log
@@ -315,11 +518,11 @@ class CallLogsGenerator:
         if not call_log.tenant_uuid:
             # NOTE(sileht): requested_context
             if call_log.requested_context:
-                contexts = self.confd.contexts.list(
-                    name=call_log.requested_context, recurse=True
-                )['items']
-                if contexts:
-                    call_log.set_tenant_uuid(contexts[0]['tenant_uuid'])
+                tenant_uuid = self._context_resolver.find_tenant_uuid(
+                    call_log.requested_context
+                )
+                if tenant_uuid:
+                    call_log.set_tenant_uuid(tenant_uuid)
                     return
 
             logger.debug(
@@ -1,9 +1,12 @@
-# Copyright 2012-2024 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2012-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import argparse
 import logging
+import multiprocessing
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 
 from wazo_auth_client import Client as AuthClient
 from wazo_confd_client import Client as ConfdClient
@@ -21,13 +24,14 @@ from xivo_dao import init_db_from_config
 from wazo_call_logd.bus import BusPublisher
 from wazo_call_logd.cel_interpretor import default_interpretors
 from wazo_call_logd.config import DEFAULT_CONFIG
+from wazo_call_logd.context import ContextResolver
 from wazo_call_logd.database.helpers import new_db_session
 from wazo_call_logd.database.queries import DAO
 from wazo_call_logd.generator import CallLogsGenerator
-from wazo_call_logd.manager import CallLogsManager
+from wazo_call_logd.manager import DEFAULT_CEL_COUNT, CallLogsManager
+from wazo_call_logd.participant import ParticipantResolver
 from wazo_call_logd.writer import CallLogsWriter
 
-DEFAULT_CEL_COUNT = 20000
 PIDFILENAME = '/run/wazo-call-logs.pid'
 
 logger = logging.getLogger(__name__)
@@ -52,10 +56,103 @@ def _print_deprecation_notice():
 
 
 def _generate_call_logs(cli_options: argparse.Namespace):
+    config = _load_config()
+    options = vars(cli_options)
+
+    jobs = max(1, options.get('jobs') or 1)
+    if options.get('action') != 'delete' and options.get('days') and jobs > 1:
+        _generate_call_logs_in_parallel(config, options['days'], jobs, options['debug'])
+        return
+
+    manager, token_renewer = _new_manager(config)
+    with token_renewer:
+        if options.get('action') == 'delete':
+            if options.get('all'):
+                manager.delete_all()
+            elif options.get('days'):
+                manager.delete_from_days(options['days'])
+        else:
+            if options.get('incremental'):
+                manager.generate_incremental(
+                    lookback=timedelta(seconds=config['sweep']['lookback']),
+                    slice_size=config['sweep']['slice_size'],
+                    max_buffered_cels=config['sweep']['max_buffered_cels'],
+                    cel_count=options['cel_count'],
+                )
+            elif options.get('days'):
+                manager.generate_from_days(
+                    days=options['days'],
+                    slice_size=config['sweep']['slice_size'],
+                    max_buffered_cels=config['sweep']['max_buffered_cels'],
+                )
+            else:
+                manager.generate_from_count(cel_count=options['cel_count'])
+
+
+def _generate_call_logs_in_parallel(config, days, jobs, debug):
+    end = datetime.now()
+    shards = _time_shards(end - timedelta(days=days), end, jobs)
+    logger.debug('Generating call logs in %s shards', len(shards))
+
+    # NOTE: each worker process builds its own database engines and clients,
+    # spawning avoids inheriting connections and threads from this process
+    context = multiprocessing.get_context('spawn')
+    edge_linked_ids = set()
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=context,
+        initializer=_init_shard_worker,
+        initargs=(debug,),
+    ) as executor:
+        for linked_ids in executor.map(_generate_shard, shards):
+            edge_linked_ids |= linked_ids
+
+    # calls crossing the edges of shards are generated once, by this process
+    manager, token_renewer = _new_manager(config)
+    with token_renewer:
+        manager.generate_from_edge_linked_ids(edge_linked_ids)
+
+
+def _time_shards(start, end, count):
+    # the last shard is left open to include calls ending during the generation
+    step = (end - start) / count
+    bounds = [start + step * i for i in range(count)] + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _init_shard_worker(debug):
+    setup_logging('/dev/null', debug=debug)
+    silence_loggers(['urllib3.connectionpool'], level=logging.WARNING)
+
+
+def _generate_shard(shard):
+    start, end = shard
+    config = _load_config()
+    manager, token_renewer = _new_manager(config)
+    with token_renewer:
+        return manager.generate_from_period(
+            start,
+            end,
+            slice_size=config['sweep']['slice_size'],
+            max_buffered_cels=config['sweep']['max_buffered_cels'],
+        )
+
+
+def _load_config():
     file_config = {
         key: value
         for key, value in read_config_file_hierarchy(DEFAULT_CONFIG).items()
-        if key in ('confd', 'bus', 'auth', 'db_uri', 'cel_db_uri')
+        if key
+        in (
+            'confd',
+            'bus',
+            'auth',
+            'db_uri',
+            'cel_db_uri',
+            'cache',
+            'generation',
+            'sweep',
+        )
     }
 
     key_config = {}
@@ -68,41 +165,44 @@ def _generate_call_logs(cli_options: argparse.Namespace):
     logger.debug('Config: %s', config)
 
     set_xivo_uuid(config, logger)
+    return config
+
+
+def _new_manager(config):
     logger.debug('CEL database is %s', config['cel_db_uri'])
     init_db_from_config({'db_uri': config['cel_db_uri']})
     logger.debug('call-logd database is %s', config['db_uri'])
     DBSession = new_db_session(config['db_uri'])
     CELDBSession = new_db_session(config['cel_db_uri'])
     dao = DAO(DBSession, CELDBSession)
+    dao.cel.recursive_correlation = config['generation']['recursive_correlation']
 
     auth_client = AuthClient(**config['auth'])
     confd_client = ConfdClient(**config['confd'])
     token_renewer = TokenRenewer(auth_client)
     token_renewer.subscribe_to_token_change(confd_client.set_token)
 
+    participant_resolver = ParticipantResolver(
+        confd_client, **config['cache']['participants']
+    )
+    context_resolver = ContextResolver(confd_client, **config['cache']['contexts'])
     generator = CallLogsGenerator(
         confd_client,
         default_interpretors(),
+        participant_resolver,
+        context_resolver,
     )
     token_renewer.subscribe_to_next_token_details_change(
         generator.set_default_tenant_uuid
     )
-    writer = CallLogsWriter(dao)
+    writer = CallLogsWriter(
+        dao,
+        bulk=config['generation']['bulk_write'],
+        update_in_place=config['generation']['update_in_place'],
+    )
     publisher = BusPublisher(service_uuid=config['uuid'], **config['bus'])
     manager = CallLogsManager(dao, generator, writer, publisher)
-
-    options = vars(cli_options)
-    with token_renewer:
-        if options.get('action') == 'delete':
-            if options.get('all'):
-                manager.delete_all()
-            elif options.get('days'):
-                manager.delete_from_days(options['days'])
-        else:
-            if options.get('days'):
-                manager.generate_from_days(days=options['days'])
-            else:
-                manager.generate_from_count(cel_count=options['cel_count'])
+    return manager, token_renewer
 
 
 def parse_args(parser: argparse.ArgumentParser):
@@ -126,6 +226,19 @@ def parse_args(parser: argparse.ArgumentParser):
         help='Minimum number of CEL entries to process',
     )
     group.add_argument('-d', '--days', type=int, help='Number of days to process')
+    group.add_argument(
+        '-i',
+        '--incremental',
+        action='store_true',
+        help='Process CEL since the previous incremental run',
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        default=1,
+        type=int,
+        help='Number of processes generating call logs. Can only be used with --days',
+    )
     parser.add_argument(
         '-D',
         '--debug',
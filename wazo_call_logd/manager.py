@@ -1,15 +1,24 @@
-# Copyright 2013-2024 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from __future__ import annotations
 
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
+from .database.cel_event_type import CELEventType
 from .database.queries import DAO
+from .generator import CELStreamBuffer
+from .metrics import generation_metrics
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_SLICE_SIZE = 5000
+DEFAULT_MAX_BUFFERED_CELS = 100000
+REFETCH_BATCH_SIZE = 100
+DEFAULT_LOOKBACK = timedelta(hours=1)
+DEFAULT_CEL_COUNT = 20000
+
 
 class CallLogsManager:
     def __init__(self, dao, generator, writer, publisher):
@@ -21,35 +30,223 @@ class CallLogsManager:
     def delete_all(self):
         self.dao.call_log.delete()
         self.dao.cel.unassociate_all()
+        self.dao.watermark.delete()
 
     def delete_from_days(self, days):
         older = datetime.now() - timedelta(days=days)
         deleted_call_log_ids = self.dao.call_log.delete(older=older)
         self.dao.cel.unassociate_all_from_call_log_ids(deleted_call_log_ids)
+        self.dao.watermark.rewind(older)
 
-    def generate_from_days(self, days):
+    def generate_from_days(
+        self,
+        days,
+        slice_size=DEFAULT_SLICE_SIZE,
+        max_buffered_cels=DEFAULT_MAX_BUFFERED_CELS,
+    ):
         older_cel = datetime.now() - timedelta(days=days)
-        cels = self.dao.cel.find_last_unprocessed(older=older_cel)
-        self._generate_from_cels(cels)
+        edge_linked_ids = self.generate_from_period(
+            older_cel, None, slice_size, max_buffered_cels
+        )
+        self.generate_from_edge_linked_ids(edge_linked_ids)
+
+    def generate_from_period(
+        self,
+        start,
+        end=None,
+        slice_size=DEFAULT_SLICE_SIZE,
+        max_buffered_cels=DEFAULT_MAX_BUFFERED_CELS,
+    ):
+        """
+        generate the call logs of the calls entirely within the period and
+        return the linkedids of the unprocessed calls crossing its edges or
+        evicted from the buffer; calls still in progress at the end of an
+        open period are left alone
+        """
+        buffer = CELStreamBuffer(max_buffered_cels)
+        edge_linked_ids = set()
+        for _, linked_ids in self._stream(buffer, start, end, slice_size):
+            edge_linked_ids |= linked_ids
+
+        if end is not None:
+            edge_linked_ids |= buffer.unprocessed_linkedids()
+        return edge_linked_ids
+
+    def generate_incremental(
+        self,
+        lookback=DEFAULT_LOOKBACK,
+        slice_size=DEFAULT_SLICE_SIZE,
+        max_buffered_cels=DEFAULT_MAX_BUFFERED_CELS,
+        cel_count=DEFAULT_CEL_COUNT,
+    ):
+        """
+        generate call logs from the watermark left by the previous run, looking
+        back `lookback` before it for calls that were not terminated yet; the
+        first run processes the last `cel_count` unprocessed CEL, as runs did
+        before the watermark existed, and seeds the watermark from them
+        """
+        watermark = self.dao.watermark.find()
+        if watermark:
+            start = watermark.cel_eventtime - lookback
+        else:
+            start = self._seed_watermark(cel_count, lookback)
+        logger.debug('Generating call logs since %s', start)
+
+        buffer = CELStreamBuffer(max_buffered_cels)
+        for cels, linked_ids in self._stream(buffer, start, None, slice_size):
+            self.generate_from_edge_linked_ids(linked_ids)
+
+            # every CEL before the oldest one held has been processed, unless
+            # it belongs to a call that seems to never end
+            last_cel = cels[-1]
+            oldest_cel = buffer.oldest()
+            if oldest_cel and oldest_cel.eventtime >= last_cel.eventtime - lookback:
+                last_cel = oldest_cel
+            self.dao.watermark.update(last_cel.id, last_cel.eventtime)
+
+    def _seed_watermark(self, cel_count, lookback):
+        cels = self.generate_from_count(cel_count)
+        if not cels:
+            return datetime.now() - lookback
+
+        newest_cel = max(cels, key=lambda cel: (cel.eventtime, cel.id))
+        self.dao.watermark.update(newest_cel.id, newest_cel.eventtime)
+        return newest_cel.eventtime - lookback
+
+    def _stream(self, buffer, start, end, slice_size):
+        slices = self.dao.cel.iter_slices_since(start, slice_size, end)
+        while True:
+            with generation_metrics.time('cel_fetch'):
+                cels = next(slices, None)
+            if cels is None:
+                return
+            ready_cels, linked_ids = buffer.feed(cels)
+            logger.debug(
+                'Read %s CEL: %s ready, %s held, %s linkedids to refetch',
+                len(cels),
+                len(ready_cels),
+                len(buffer),
+                len(linked_ids),
+            )
+            if ready_cels:
+                self._generate_from_cels(ready_cels)
+            yield cels, linked_ids
+
+    def generate_from_edge_linked_ids(self, linked_ids):
+        # NOTE: groups crossing the edges of a period or evicted from the
+        # buffer are read again from the database, a few at a time
+        linked_ids = sorted(linked_ids)
+        logger.debug('Generating call logs for %s edge linkedids', len(linked_ids))
+        for i in range(0, len(linked_ids), REFETCH_BATCH_SIZE):
+            self.generate_from_linked_ids(linked_ids[i : i + REFETCH_BATCH_SIZE])
 
     def generate_from_count(self, cel_count):
-        cels = self.dao.cel.find_last_unprocessed(cel_count)
+        with generation_metrics.time('cel_fetch'):
+            cels = self.dao.cel.find_last_unprocessed(cel_count)
         logger.debug(
             'Generating call logs from the last %s CEL (found %s)',
             cel_count,
             len(cels),
         )
         self._generate_from_cels(cels)
+        return cels
 
     def generate_from_linked_id(self, linked_id):
-        cels = self.dao.cel.find_from_linked_id(linked_id)
+        with generation_metrics.time('cel_fetch'):
+            cels = self.dao.cel.find_from_linked_id(linked_id)
         logger.debug(
             'Generating call log for linked_id %s from %s CEL', linked_id, len(cels)
         )
         self._generate_from_cels(cels)
 
-    def _generate_from_cels(self, cels):
+    def generate_from_linked_ids(self, linked_ids):
+        with generation_metrics.time('cel_fetch'):
+            cels = self.dao.cel.find_from_linked_ids(linked_ids)
+        logger.debug(
+            'Generating call logs for %s linked_ids from %s CEL',
+            len(linked_ids),
+            len(cels),
+        )
+        try:
+            self._generate_from_cels(cels)
+        except Exception:
+            if len(linked_ids) == 1:
+                raise
+            logger.exception(
+                'Failed to generate call logs for a batch of %s linked_ids,'
+                ' retrying one linked_id at a time',
+                len(linked_ids),
+            )
+            self._generate_one_by_one(linked_ids)
+
+    def generate_from_assembled_cels(self, cels):
+        try:
+            self._generate_from_assembled_cels(cels)
+        except Exception:
+            # NOTE: the assembled CEL are gone, the calls are read back from the
+            # database to isolate the failing ones
+            linked_ids = sorted({cel.linkedid for cel in cels})
+            logger.exception(
+                'Failed to generate call logs for %s assembled linked_ids,'
+                ' reading them from the database',
+                len(linked_ids),
+            )
+            self.generate_from_linked_ids(linked_ids)
+
+    def _generate_from_assembled_cels(self, cels):
+        # NOTE: CEL received from the bus are not associated to call logs yet,
+        # previous call logs of the same calls are found by conversation
         call_logs = self.generator.from_cel(cels)
+        conversation_ids = [
+            call_log.conversation_id for call_log in call_logs.new_call_logs
+        ]
+        call_log_ids = self.dao.call_log.find_ids_from_conversation_ids(
+            conversation_ids
+        )
+        call_logs = call_logs._replace(
+            call_logs_to_delete=set(call_logs.call_logs_to_delete) | set(call_log_ids)
+        )
         logger.debug('Generated %s call logs', len(call_logs.new_call_logs))
-        self.writer.write(call_logs)
-        self.publisher.publish_call_log(*call_logs.new_call_logs)
+        self._write(cels, call_logs)
+
+    def _generate_one_by_one(self, linked_ids):
+        for linked_id in linked_ids:
+            try:
+                self.generate_from_linked_id(linked_id)
+            except Exception:
+                logger.exception(
+                    'Failed to generate call log for linkedid \"%s\"', linked_id
+                )
+
+    def _generate_from_cels(self, cels):
+        call_log_ids = {cel.call_log_id for cel in cels if cel.call_log_id}
+        fingerprints = self.dao.call_log.find_cel_fingerprints(call_log_ids)
+        call_logs = self.generator.from_cel(cels, fingerprints)
+        logger.debug('Generated %s call logs', len(call_logs.new_call_logs))
+        self._write(cels, call_logs)
+
+    def _write(self, cels, call_logs):
+        with generation_metrics.time('db_write'):
+            self.writer.write(call_logs)
+        _observe_end_to_end_lag(cels, call_logs.new_call_logs)
+        with generation_metrics.time('bus_publish'):
+            self.publisher.publish_call_log(*call_logs.new_call_logs)
+
+
+def _observe_end_to_end_lag(cels, call_logs):
+    """
+    observe the time between the end of each written call and its commit
+    """
+    linked_ids = {
+        linked_id for call_log in call_logs for linked_id in call_log.linked_ids
+    }
+    committed_at = datetime.now(timezone.utc)
+    for cel in cels:
+        if cel.eventtype != CELEventType.linkedid_end or cel.linkedid not in linked_ids:
+            continue
+        eventtime = cel.eventtime
+        if eventtime.tzinfo is None:
+            # NOTE: CEL from the database are in the local time of the PBX
+            eventtime = eventtime.astimezone()
+        lag = (committed_at - eventtime).total_seconds()
+        generation_metrics.observe('end_to_end_lag', lag)
@@ -0,0 +1,123 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from typing import Any
+
+from xivo.status import Status
+
+# upper bounds of the histogram buckets, in seconds
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    300,
+)
+
+
+class Histogram:
+    """
+    thread-safe histogram of observed values, with cumulative bucket counts in
+    the manner of Prometheus histograms
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.count = 0
+        self.sum = 0.0
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            self._counts[index] += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            counts = list(self._counts)
+            result = {'count': self.count, 'sum': self.sum}
+
+        buckets = {}
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        result['buckets'] = buckets
+        return result
+
+
+class GenerationMetrics:
+    """
+    latency histograms of each stage of the call log generation, in seconds,
+    and counters of the work done; exposed in the status as
+    `generation_metrics`
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self._buckets = buckets
+        self._histograms: dict[str, Histogram] = {}
+        self._counters: defaultdict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram(self._buckets))
+        histogram.observe(value)
+
+    @contextmanager
+    def time(self, name: str) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start)
+
+    def increment(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+        return {
+            'histograms': {
+                name: histogram.snapshot()
+                for name, histogram in sorted(histograms.items())
+            },
+            'counters': counters,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def provide_status(self, status):
+        status['generation_metrics']['status'] = Status.ok
+        status['generation_metrics'].update(self.snapshot())
+
+
+generation_metrics = GenerationMetrics()
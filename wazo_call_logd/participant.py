@@ -1,9 +1,10 @@
-# Copyright 2021-2024 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2021-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from __future__ import annotations
 
 import logging
+from collections.abc import Iterable
 from typing import NamedTuple
 
 import requests.exceptions
@@ -12,9 +13,23 @@ from xivo.asterisk.protocol_interface import (
     InvalidChannelError,
     protocol_interface_from_channel,
 )
+from xivo.status import Status
+
+from .cache import TTLCache
+from .metrics import generation_metrics
 
 logger = logging.getLogger(__name__)
 
+# below this number of unknown lines, looking them up one by one is cheaper
+# than paging through every line of the stack
+PREFETCH_MIN_LINES = 10
+PREFETCH_PAGE_SIZE = 500
+PREFETCH_USERS_CHUNK_SIZE = 100
+
+
+class _UserUnavailable(Exception):
+    pass
+
 
 class ParticipantInfo(NamedTuple):
     uuid: str
@@ -32,13 +47,27 @@ def find_participant_by_uuid(
     confd: ConfdClient, user_uuid: str
 ) -> ParticipantInfo | None:
     try:
-        user = confd.users.get(user_uuid)
+        return _fetch_participant_by_uuid(confd, user_uuid)
+    except _UserUnavailable:
+        return None
+
+
+def _fetch_participant_by_uuid(confd: ConfdClient, user_uuid: str) -> ParticipantInfo:
+    return _participant_from_user(_get_user(confd, user_uuid))
+
+
+def _get_user(confd: ConfdClient, user_uuid: str) -> dict:
+    generation_metrics.increment('confd_calls')
+    try:
+        return confd.users.get(user_uuid)
     except requests.exceptions.HTTPError as ex:
         logger.error(
             "Error retrieving user(user_uuid=%s) from confd: %s", user_uuid, str(ex)
         )
-        return None
+        raise _UserUnavailable() from ex
+
 
+def _participant_from_user(user: dict) -> ParticipantInfo:
     tags = get_tags(user['userfield'])
     logger.debug(
         'Found participant with user uuid %s, tenant uuid %s',
@@ -53,7 +82,7 @@ def find_participant_by_uuid(
         # the main line of the user is provided
         main_line = user['lines'][0]
         main_line_id = main_line['id']
-        logger.debug("user(user_uuid=%s) has main line: %s", user_uuid, main_line)
+        logger.debug("user(user_uuid=%s) has main line: %s", user['uuid'], main_line)
         if main_line["extensions"]:
             main_extension = main_line['extensions'][0]
 
@@ -66,11 +95,7 @@ def find_participant_by_uuid(
     )
 
 
-def find_participant(confd: ConfdClient, channame: str) -> ParticipantInfo | None:
-    """
-    find and fetch participant information from confd,
-    using the channel name
-    """
+def line_name_from_channel(channame: str) -> str | None:
     try:
         protocol, line_name = protocol_interface_from_channel(channame)
     except InvalidChannelError:
@@ -85,6 +110,33 @@ def find_participant(confd: ConfdClient, channame: str) -> ParticipantInfo | Non
         protocol,
         line_name,
     )
+    return line_name
+
+
+def find_participant(confd: ConfdClient, channame: str) -> ParticipantInfo | None:
+    """
+    find and fetch participant information from confd,
+    using the channel name
+    """
+    line_name = line_name_from_channel(channame)
+    if not line_name:
+        return None
+    return find_participant_by_line_name(confd, line_name)
+
+
+def find_participant_by_line_name(
+    confd: ConfdClient, line_name: str
+) -> ParticipantInfo | None:
+    try:
+        return _fetch_participant_by_line_name(confd, line_name)
+    except _UserUnavailable:
+        return None
+
+
+def _fetch_participant_by_line_name(
+    confd: ConfdClient, line_name: str
+) -> ParticipantInfo | None:
+    generation_metrics.increment('confd_calls')
     lines = confd.lines.list(name=line_name, recurse=True)['items']
     if not lines:
         return None
@@ -95,8 +147,11 @@ def find_participant(confd: ConfdClient, channame: str) -> ParticipantInfo | Non
     if not users:
         return None
 
-    user_uuid = users[0]['uuid']
+    user = _get_user(confd, users[0]['uuid'])
+    return _participant_from_line(line, user)
 
+
+def _participant_from_line(line: dict, user: dict) -> ParticipantInfo:
     extensions = line['extensions']
     main_extension = None
     if extensions:
@@ -108,14 +163,6 @@ def find_participant(confd: ConfdClient, channame: str) -> ParticipantInfo | Non
             main_extension['context'],
         )
 
-    try:
-        user = confd.users.get(user_uuid)
-    except requests.exceptions.HTTPError as ex:
-        logger.error(
-            "Error retrieving user(user_uuid=%s) from confd: %s", user_uuid, str(ex)
-        )
-        return None
-
     tags = get_tags(user['userfield'])
     logger.debug(
         'Found participant with user uuid %s, tenant uuid %s',
@@ -130,3 +177,178 @@ def find_participant(confd: ConfdClient, channame: str) -> ParticipantInfo | Non
         tags=tags,
         main_extension=main_extension,
     )
+
+
+class ParticipantResolver:
+    """
+    resolve participants through confd, caching results by line name and by user
+    uuid so that they survive across call logs; entries are invalidated by confd
+    bus events or after `ttl` seconds, and confd errors are not cached
+    """
+
+    _user_events = ('user_edited', 'user_deleted')
+    _line_events = ('line_created', 'line_edited', 'line_deleted')
+    _association_events = (
+        'extension_edited',
+        'extension_deleted',
+        'line_extension_associated',
+        'line_extension_dissociated',
+        'user_line_associated',
+        'user_line_dissociated',
+    )
+
+    def __init__(self, confd: ConfdClient, max_size: int = 0, ttl: float = 0):
+        self.confd = confd
+        self._by_line_name: TTLCache[ParticipantInfo | None] = TTLCache(max_size, ttl)
+        self._by_user_uuid: TTLCache[ParticipantInfo | None] = TTLCache(max_size, ttl)
+
+    def find_participant(self, channame: str) -> ParticipantInfo | None:
+        line_name = line_name_from_channel(channame)
+        if not line_name:
+            return None
+        try:
+            return self._by_line_name.get_or_load(
+                line_name,
+                lambda: _fetch_participant_by_line_name(self.confd, line_name),
+            )
+        except _UserUnavailable:
+            return None
+
+    def find_participant_by_uuid(self, user_uuid: str) -> ParticipantInfo | None:
+        try:
+            return self._by_user_uuid.get_or_load(
+                str(user_uuid),
+                lambda: _fetch_participant_by_uuid(self.confd, user_uuid),
+            )
+        except _UserUnavailable:
+            return None
+
+    def prefetch(self, line_names: Iterable[str], user_uuids: Iterable[str]):
+        """
+        resolve unknown lines and users with as few confd requests as possible,
+        so that subsequent lookups are served from the cache; lines and users
+        not found are left to be looked up one by one
+        """
+        if not self._by_line_name.max_size:
+            return
+
+        missing_line_names = {
+            name for name in line_names if name not in self._by_line_name
+        }
+        missing_user_uuids = {
+            str(uuid) for uuid in user_uuids if str(uuid) not in self._by_user_uuid
+        }
+
+        lines_by_name: dict[str, dict] = {}
+        if len(missing_line_names) >= PREFETCH_MIN_LINES:
+            lines_by_name = self._list_lines(missing_line_names)
+
+        line_user_uuids = {
+            line['users'][0]['uuid'] for line in lines_by_name.values() if line['users']
+        }
+        users_by_uuid = self._list_users(line_user_uuids | missing_user_uuids)
+
+        for line_name in missing_line_names:
+            participant = self._line_participant(
+                lines_by_name, users_by_uuid, line_name
+            )
+            if participant:
+                self._by_line_name.set(line_name, participant)
+        for user_uuid in missing_user_uuids:
+            if user := users_by_uuid.get(user_uuid):
+                self._by_user_uuid.set(user_uuid, _participant_from_user(user))
+
+        logger.debug(
+            'Prefetched %s lines and %s users from confd',
+            len(lines_by_name),
+            len(users_by_uuid),
+        )
+
+    def _line_participant(
+        self, lines_by_name: dict[str, dict], users_by_uuid: dict[str, dict], name: str
+    ) -> ParticipantInfo | None:
+        line = lines_by_name.get(name)
+        if not line or not line['users']:
+            return None
+        user = users_by_uuid.get(str(line['users'][0]['uuid']))
+        if not user:
+            return None
+        return _participant_from_line(line, user)
+
+    def _list_lines(self, line_names: set[str]) -> dict[str, dict]:
+        # NOTE: confd cannot filter lines by a list of names, pages are bounded
+        # so that listing never costs more requests than one lookup per line
+        max_offset = len(line_names) * PREFETCH_PAGE_SIZE
+        lines_by_name = {}
+        offset = 0
+        while True:
+            generation_metrics.increment('confd_calls')
+            response = self.confd.lines.list(
+                recurse=True, limit=PREFETCH_PAGE_SIZE, offset=offset
+            )
+            for line in response['items']:
+                if line['name'] in line_names:
+                    lines_by_name.setdefault(line['name'], line)
+            offset += PREFETCH_PAGE_SIZE
+            if (
+                len(lines_by_name) == len(line_names)
+                or offset >= response['total']
+                or offset >= max_offset
+            ):
+                return lines_by_name
+
+    def _list_users(self, user_uuids: set[str]) -> dict[str, dict]:
+        users_by_uuid = {}
+        user_uuids = sorted(str(uuid) for uuid in user_uuids)
+        for i in range(0, len(user_uuids), PREFETCH_USERS_CHUNK_SIZE):
+            chunk = user_uuids[i : i + PREFETCH_USERS_CHUNK_SIZE]
+            generation_metrics.increment('confd_calls')
+            response = self.confd.users.list(uuid=','.join(chunk), recurse=True)
+            for user in response['items']:
+                users_by_uuid[str(user['uuid'])] = user
+        return users_by_uuid
+
+    def subscribe(self, bus_consumer):
+        for event_name in self._user_events:
+            bus_consumer.subscribe(event_name, self._on_user_event)
+        for event_name in self._line_events:
+            bus_consumer.subscribe(event_name, self._on_line_event)
+        for event_name in self._association_events:
+            bus_consumer.subscribe(event_name, self._on_association_event)
+
+    def invalidate_user(self, user_uuid: str):
+        user_uuid = str(user_uuid)
+        self._by_user_uuid.pop(user_uuid)
+        self._by_line_name.remove_if(
+            lambda _, participant: bool(participant) and participant.uuid == user_uuid
+        )
+
+    def invalidate_line(self, line_name: str | None):
+        if line_name:
+            self._by_line_name.pop(line_name)
+        else:
+            self._by_line_name.clear()
+
+    def clear(self):
+        self._by_line_name.clear()
+        self._by_user_uuid.clear()
+
+    def provide_status(self, status):
+        status['participant_cache']['status'] = Status.ok
+        status['participant_cache']['by_line_name'] = self._by_line_name.stats()
+        status['participant_cache']['by_user_uuid'] = self._by_user_uuid.stats()
+
+    def _on_user_event(self, event):
+        logger.debug('Invalidating participant cache for user %s', event.get('uuid'))
+        self.invalidate_user(event['uuid'])
+
+    def _on_line_event(self, event):
+        logger.debug('Invalidating participant cache for line %s', event.get('name'))
+        self.invalidate_line(event.get('name'))
+
+    def _on_association_event(self, event):
+        # NOTE: these events do not identify the line names affected, which are
+        # few and cheap to fetch again
+        logger.debug('Invalidating participant cache for all lines')
+        self._by_line_name.clear()
+        self._by_user_uuid.clear()
@@ -1,11 +1,12 @@
-# Copyright 2017-2024 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2017-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import csv
+import json
 import logging
 from io import StringIO
 
-from flask import g, jsonify, make_response, request, send_file, url_for
+from flask import Response, g, jsonify, make_response, request, send_file, url_for
 from xivo import tenant_helpers
 from xivo.auth_verifier import required_acl
 from xivo.tenant_flask_helpers import Tenant, auth_client, token
@@ -68,6 +69,8 @@ CSV_HEADERS = [
     'tags',
     # recording_{x}_{key},  # Added dynamically
 ]
+# streamed listings are sent by chunks of at least this size, in characters
+STREAM_CHUNK_SIZE = 64 * 1024
 
 
 def _is_error(data):
@@ -82,6 +85,16 @@ def _is_single_cdr(data):
     return 'id' in data and 'tags' in data
 
 
+def _csv_line(cdr):
+    if 'tags' in cdr:
+        cdr['tags'] = ';'.join(cdr['tags'])
+
+    for x, recording in enumerate(cdr.pop('recordings'), start=1):
+        for key in recording.keys():
+            cdr[f'recording_{x}_{key}'] = recording[key]
+    return cdr
+
+
 def _output_csv(data, code, http_headers=None):
     if _is_error(data):
         response = jsonify(data)
@@ -90,17 +103,11 @@ def _output_csv(data, code, http_headers=None):
         csv_body = []
         items = data['items'] if _is_cdr_list(data) else [data]
         for cdr in items:
-            if 'tags' in cdr:
-                cdr['tags'] = ';'.join(cdr['tags'])
-
-            for x, recording in enumerate(cdr.pop('recordings'), start=1):
-                for key in recording.keys():
-                    csv_key = f'recording_{x}_{key}'
-                    if csv_key not in csv_headers:
-                        csv_headers.append(csv_key)
-                    cdr[csv_key] = recording[key]
-
-            csv_body.append(cdr)
+            csv_line = _csv_line(cdr)
+            for csv_key in csv_line:
+                if csv_key.startswith('recording_') and csv_key not in csv_headers:
+                    csv_headers.append(csv_key)
+            csv_body.append(csv_line)
 
         csv_text = StringIO()
         writer = csv.DictWriter(csv_text, csv_headers, extrasaction='ignore')
@@ -120,6 +127,71 @@ def _output_csv(data, code, http_headers=None):
     return response
 
 
+def _csv_recording_keys(schema):
+    return list(schema.fields['recordings'].schema.fields)
+
+
+def _generate_csv(call_logs, schema, max_recordings):
+    csv_headers = CSV_HEADERS + [
+        f'recording_{x}_{key}'
+        for x in range(1, max_recordings + 1)
+        for key in _csv_recording_keys(schema)
+    ]
+    csv_text = StringIO()
+    writer = csv.DictWriter(csv_text, csv_headers, extrasaction='ignore')
+    writer.writeheader()
+    yield csv_text.getvalue()
+
+    csv_text.seek(0)
+    csv_text.truncate()
+    for call_log in call_logs:
+        writer.writerow(_csv_line(schema.dump(call_log)))
+        if csv_text.tell() >= STREAM_CHUNK_SIZE:
+            yield csv_text.getvalue()
+            csv_text.seek(0)
+            csv_text.truncate()
+    yield csv_text.getvalue()
+
+
+def _stream_csv(call_logs, schema, max_recordings):
+    """
+    the CSV is generated while it is sent, one call log at a time; recording
+    columns are sized by `max_recordings`
+    """
+    return Response(
+        _generate_csv(call_logs, schema, max_recordings),
+        mimetype='text/csv; charset=utf-8',
+        headers={'Content-Disposition': 'attachment; filename=cdr.csv'},
+    )
+
+
+def _generate_ndjson(call_logs, schema):
+    ndjson_text = StringIO()
+    for call_log in call_logs:
+        ndjson_text.write(json.dumps(schema.dump(call_log)))
+        ndjson_text.write('\n')
+        if ndjson_text.tell() >= STREAM_CHUNK_SIZE:
+            yield ndjson_text.getvalue()
+            ndjson_text.seek(0)
+            ndjson_text.truncate()
+    yield ndjson_text.getvalue()
+
+
+def _stream_ndjson(call_logs, schema):
+    return Response(
+        _generate_ndjson(call_logs, schema), mimetype='application/x-ndjson'
+    )
+
+
+def request_wants_ndjson():
+    format_ = request.args.get('format')
+    ndjson_header = (
+        request.accept_mimetypes['application/x-ndjson']
+        > request.accept_mimetypes['application/json']
+    )
+    return format_ == 'ndjson' or (format_ is None and ndjson_header)
+
+
 def request_wants_csv():
     best = request.accept_mimetypes.best_match(
         ['text/csv; charset=utf-8', 'application/json']
@@ -174,8 +246,16 @@ class CDRResource(CDRAuthResource):
     def get(self):
         args = CDRListRequestSchema().load(request.args)
         args['tenant_uuids'] = self.query_or_header_visible_tenants(args['recurse'])
+        if request_wants_ndjson():
+            return _stream_ndjson(self.cdr_service.stream(args), CDRSchema())
+        if request_wants_csv():
+            return _stream_csv(
+                self.cdr_service.stream(args),
+                CDRSchema(),
+                self.cdr_service.max_recordings(args),
+            )
         cdrs = self.cdr_service.list(args)
-        return format_cdr_result(CDRSchemaList().dump(cdrs))
+        return CDRSchemaList().dump(cdrs)
 
 
 class CDRIdResource(CDRAuthResource):
@@ -197,8 +277,16 @@ class CDRUserResource(CDRAuthResource):
         args = CDRListRequestSchema(exclude=['user_uuid']).load(request.args)
         args['user_uuids'] = [user_uuid]
         args['tenant_uuids'] = self.query_or_header_visible_tenants(args['recurse'])
+        if request_wants_ndjson():
+            return _stream_ndjson(self.cdr_service.stream(args), CDRSchema())
+        if request_wants_csv():
+            return _stream_csv(
+                self.cdr_service.stream(args),
+                CDRSchema(),
+                self.cdr_service.max_recordings(args),
+            )
         cdrs = self.cdr_service.list(args)
-        return format_cdr_result(CDRSchemaList().dump(cdrs))
+        return CDRSchemaList().dump(cdrs)
 
 
 class CDRUserMeResource(CDRAuthResource):
@@ -215,8 +303,18 @@ class CDRUserMeResource(CDRAuthResource):
         user_uuid = get_token_pbx_user_uuid_from_request(self.auth_client)
         args['me_user_uuid'] = user_uuid
         args['tenant_uuids'] = self.query_or_header_visible_tenants(recurse=False)
+        if request_wants_ndjson():
+            return _stream_ndjson(
+                self.cdr_service.stream(args), CDRSchema(exclude=['tags'])
+            )
+        if request_wants_csv():
+            return _stream_csv(
+                self.cdr_service.stream(args),
+                CDRSchema(exclude=['tags']),
+                self.cdr_service.max_recordings(args),
+            )
         cdrs = self.cdr_service.list(args)
-        return format_cdr_result(CDRSchemaList(exclude=['items.tags']).dump(cdrs))
+        return CDRSchemaList(exclude=['items.tags']).dump(cdrs)
 
 
 class RecordingsMediaExportResource(CDRAuthResource):
@@ -231,6 +329,7 @@ class RecordingsMediaExportResource(CDRAuthResource):
         body_args = RecordingMediaExportBodySchema().load(request.get_json(force=True))
         args['tenant_uuids'] = self.visible_tenants(args['recurse'])
         args['cdr_ids'] = body_args['cdr_ids']
+        args['count'] = 'none'
 
         recordings_to_download = []
         call_logs = self.cdr_service.list(args)['items']
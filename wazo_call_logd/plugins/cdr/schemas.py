@@ -1,15 +1,84 @@
-# Copyright 2017-2024 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2017-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from marshmallow import EXCLUDE, post_dump, post_load, pre_dump, pre_load
+import base64
+import binascii
+import datetime as dt
+import json
+import uuid
+
+import dateutil.parser
+from marshmallow import (
+    EXCLUDE,
+    ValidationError,
+    post_dump,
+    post_load,
+    pre_dump,
+    pre_load,
+)
 from xivo.mallow import fields
 from xivo.mallow.validate import Length, OneOf, Range, Regexp
 from xivo.mallow_helpers import Schema
 
+from wazo_call_logd.database.queries.call_log import supports_cursor
+
 NUMBER_REGEX = r'^_?[0-9]+_?$'
 CONVERSATION_ID_REGEX = r'^[0-9]+\.[0-9]+$'
 
 
+class CursorField(fields.Field):
+    """
+    opaque pagination cursor holding the `order`, `direction`, order `key` and
+    `id` of the last item of a page, encoded as URL-safe base64 JSON
+    """
+
+    default_error_messages = {'invalid': 'not a valid cursor'}
+
+    def _serialize(self, value, attr, obj, **kwargs):
+        if value is None:
+            return None
+        cursor = [
+            value['order'],
+            value['direction'],
+            self._serialize_key(value['key']),
+            value['id'],
+        ]
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode())
+        return encoded.decode().rstrip('=')
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            padding = '=' * (-len(value) % 4)
+            cursor = json.loads(base64.urlsafe_b64decode(value + padding))
+            order, direction, key, id_ = cursor
+            key = self._deserialize_key(key)
+        except (TypeError, ValueError, binascii.Error):
+            raise self.make_error('invalid')
+        if not isinstance(id_, int):
+            raise self.make_error('invalid')
+        return {'order': order, 'direction': direction, 'key': key, 'id': id_}
+
+    @staticmethod
+    def _serialize_key(key):
+        if isinstance(key, dt.datetime):
+            return {'datetime': key.isoformat()}
+        if isinstance(key, dt.timedelta):
+            return {'timedelta': key.total_seconds()}
+        if isinstance(key, uuid.UUID):
+            return str(key)
+        return key
+
+    @staticmethod
+    def _deserialize_key(key):
+        if not isinstance(key, dict):
+            return key
+        if 'datetime' in key:
+            return dateutil.parser.isoparse(key['datetime'])
+        if 'timedelta' in key:
+            return dt.timedelta(seconds=key['timedelta'])
+        raise ValueError(key)
+
+
 class RecordingSchema(Schema):
     uuid = fields.UUID()
     start_time = fields.DateTime()
@@ -190,9 +259,13 @@ class CDRListRequestSchema(CDRListingBase):
     )
     limit = fields.Integer(validate=Range(min=0), load_default=1000)
     offset = fields.Integer(validate=Range(min=0), load_default=None)
+    cursor = CursorField(load_default=None)
+    count = fields.String(
+        validate=OneOf(['exact', 'estimated', 'none']), load_default='exact'
+    )
     distinct = fields.String(validate=OneOf(['peer_exten']), load_default=None)
     recorded = fields.Boolean(load_default=None)
-    format = fields.String(validate=OneOf(['csv', 'json']), load_default=None)
+    format = fields.String(validate=OneOf(['csv', 'json', 'ndjson']), load_default=None)
     conversation_id = fields.String(
         validate=Regexp(
             CONVERSATION_ID_REGEX, error='not a valid conversation identifier'
@@ -205,6 +278,16 @@ class CDRListRequestSchema(CDRListingBase):
         mapped_order = CDRSchema().fields[in_data['order']].attribute
         if mapped_order:
             in_data['order'] = mapped_order
+        cursor = in_data['cursor']
+        if cursor and (cursor['order'], cursor['direction']) != (
+            in_data['order'],
+            in_data['direction'],
+        ):
+            raise ValidationError(
+                'cursor was not issued for this order and direction', 'cursor'
+            )
+        if cursor and not supports_cursor(in_data['order']):
+            raise ValidationError('cursor cannot be used with this order', 'cursor')
         return in_data
 
 
@@ -212,3 +295,4 @@ class CDRSchemaList(Schema):
     items = fields.Nested(CDRSchema, many=True)
     total = fields.Integer()
     filtered = fields.Integer()
+    next = CursorField()
@@ -1,4 +1,4 @@
-# Copyright 2017-2024 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2017-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from __future__ import annotations
@@ -25,6 +25,8 @@ class SearchParams(TypedDict, total=False):
     direction: OrderDirection
     limit: int
     offset: int
+    cursor: dict
+    count: str
     distinct: str
     start: datetime
     end: datetime
@@ -44,30 +46,58 @@ class CDRService:
         self._dao: DAO = dao
 
     def list(self, search_params: SearchParams):
-        searched = search_params.get('search')
-        rec_search_params = {}
+        dao_params = self._dao_params(search_params)
+        count = self._dao.call_log.count_in_period(dao_params)
+
+        call_logs = self._dao.call_log.find_all_in_period(dao_params)
+        return {
+            'items': call_logs,
+            'filtered': count['filtered'],
+            'total': count['total'],
+            'next': self._next_cursor(search_params, call_logs),
+        }
+
+    def stream(self, search_params: SearchParams):
+        """
+        iterate over the call logs of `list` from a server-side cursor, without
+        counts
+        """
+        return self._dao.call_log.iter_in_period(self._dao_params(search_params))
+
+    def max_recordings(self, search_params: SearchParams) -> int:
+        """
+        highest number of recordings of a call log of `list`
+        """
+        dao_params = self._dao_params(search_params)
+        return self._dao.call_log.find_max_recordings_in_period(dao_params)
+
+    def _dao_params(self, search_params: SearchParams) -> call_log_dao.ListParams:
         dao_params = dict(search_params)
-        if searched:
+        if searched := search_params.get('search'):
             matches = RECORDING_FILENAME_RE.search(searched)
             if matches:
                 del dao_params['search']
                 dao_params['id'] = matches.group(1)
-                rec_search_params['uuid'] = matches.group(2)
         if user_uuids := search_params.get('user_uuids'):
             # api level 'user_uuids' is reinterpreted to avoid matching hidden participants
             del dao_params['user_uuids']
             dao_params['terminal_user_uuids'] = user_uuids
-
-        count = self._dao.call_log.count_in_period(dao_params)
-
-        call_logs = self._dao.call_log.find_all_in_period(
-            cast(call_log_dao.ListParams, dao_params)
-        )
-        rec_search_params['call_log_ids'] = [call_log.id for call_log in call_logs]
+        return cast(call_log_dao.ListParams, dao_params)
+
+    def _next_cursor(self, search_params: SearchParams, call_logs):
+        limit = search_params.get('limit')
+        order = search_params.get('order')
+        direction = search_params.get('direction')
+        if not (limit and order and direction) or len(call_logs) < limit:
+            return None
+        if not call_log_dao.supports_cursor(order):
+            return None
+        last_call_log = call_logs[-1]
         return {
-            'items': call_logs,
-            'filtered': count['filtered'],
-            'total': count['total'],
+            'order': order,
+            'direction': direction,
+            'key': call_log_dao.order_key(last_call_log, order),
+            'id': last_call_log.id,
         }
 
     def get(self, cdr_id, tenant_uuids, user_uuids=None):
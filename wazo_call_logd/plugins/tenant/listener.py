@@ -1,4 +1,4 @@
-# Copyright 2023 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2023-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import logging
@@ -21,3 +21,4 @@ class TenantEventHandler:
     def _auth_tenant_deleted(self, event):
         with self.tenant_dao.new_session() as session:
             remove_tenant(event['uuid'], session)
+        self.tenant_dao.forget(event['uuid'])
@@ -1,4 +1,4 @@
-# Copyright 2013-2024 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from __future__ import annotations
@@ -53,7 +53,9 @@ class RawCallLog:
         self.participants: list[CallLogParticipant] = []
         self.recordings: list = []
         self.cel_ids: list[int] = []
+        self.linked_ids: list[str] = []
         self.conversation_id: str | None = None
+        self.cel_fingerprint: str | None = None
         self.interpret_callee_bridge_enter: bool = True
         self.interpret_caller_xivo_user_fwd: bool = True
         # flag to indicate if authoritative destination information is identified
@@ -114,9 +116,11 @@ class RawCallLog:
             direction=self.direction,
             destination_details=self.destination_details,
             conversation_id=self.conversation_id,
+            cel_fingerprint=self.cel_fingerprint,
         )
         result.participants = self.participants
         result.cel_ids = self.cel_ids
+        result.linked_ids = self.linked_ids
         result.recordings = self.recordings
 
         return result
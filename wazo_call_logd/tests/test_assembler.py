@@ -0,0 +1,145 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from datetime import datetime, timezone
+from unittest import TestCase
+
+from hamcrest import (
+    assert_that,
+    contains_exactly,
+    empty,
+    equal_to,
+    has_length,
+    has_properties,
+)
+
+from ..assembler import CallAssembler, cel_from_payload
+
+
+def payload(event_name, uniqueid, linkedid, second=0, **kwargs):
+    return {
+        'EventName': event_name,
+        'EventTime': f'2023-05-31 00:00:{second:02}.000000+00:00',
+        'UniqueID': uniqueid,
+        'LinkedID': linkedid,
+        'Channel': 'PJSIP/abcdef-00000001',
+        'Extra': '',
+        **kwargs,
+    }
+
+
+def call(linkedid, second=0):
+    return [
+        payload('CHAN_START', linkedid, linkedid, second),
+        payload('HANGUP', linkedid, linkedid, second + 1),
+        payload('LINKEDID_END', linkedid, linkedid, second + 2),
+    ]
+
+
+class TestCelFromPayload(TestCase):
+    def test_fields(self):
+        cel = cel_from_payload(
+            payload('ANSWER', '1.1', '1.0', CallerIDnum='1001', Exten='s')
+        )
+
+        assert_that(
+            cel,
+            has_properties(
+                id=None,
+                eventtype='ANSWER',
+                eventtime=datetime(2023, 5, 31, tzinfo=timezone.utc),
+                uniqueid='1.1',
+                linkedid='1.0',
+                channame='PJSIP/abcdef-00000001',
+                cid_num='1001',
+                exten='s',
+                call_log_id=None,
+            ),
+        )
+
+    def test_epoch_event_time(self):
+        cel = cel_from_payload(dict(payload('ANSWER', '1.0', '1.0'), EventTime='0.5'))
+
+        assert_that(
+            cel.eventtime,
+            equal_to(datetime(1970, 1, 1, 0, 0, 0, 500000, tzinfo=timezone.utc)),
+        )
+
+
+class TestCallAssembler(TestCase):
+    def setUp(self):
+        self.assembler = CallAssembler(max_cels=10)
+
+    def test_take_terminated_call(self):
+        for event in call('1.0'):
+            self.assembler.add(event)
+
+        cels, missing = self.assembler.take(['1.0'])
+
+        assert_that(cels, contains_exactly(*[has_properties(linkedid='1.0')] * 3))
+        assert_that(missing, empty())
+        assert_that(len(self.assembler), equal_to(0))
+
+    def test_take_unknown_call(self):
+        cels, missing = self.assembler.take(['1.0'])
+
+        assert_that(cels, empty())
+        assert_that(missing, contains_exactly('1.0'))
+
+    def test_take_call_without_its_first_cel(self):
+        for event in call('1.0')[1:]:
+            self.assembler.add(dict(event, UniqueID='1.1'))
+
+        cels, missing = self.assembler.take(['1.0'])
+
+        assert_that(cels, empty())
+        assert_that(missing, contains_exactly('1.0'))
+        assert_that(len(self.assembler), equal_to(0))
+
+    def test_take_correlated_calls_once_all_are_terminated(self):
+        first, second = call('1.0'), call('2.0', second=10)
+        # the second call shares a channel with the first one
+        shared = payload('BRIDGE_ENTER', '1.0', '2.0', second=11)
+        for event in first[:2] + second[:2] + [shared, first[2]]:
+            self.assembler.add(event)
+
+        cels, missing = self.assembler.take(['1.0'])
+        assert_that(cels, empty())
+        assert_that(missing, empty())
+
+        self.assembler.add(second[2])
+        cels, missing = self.assembler.take(['2.0'])
+        assert_that(cels, has_length(7))
+        assert_that(missing, empty())
+
+    def test_oldest_calls_are_dropped_over_budget(self):
+        assembler = CallAssembler(max_cels=4)
+        first, second = call('1.0'), call('2.0', second=10)
+        for event in first[:2] + second:
+            assembler.add(event)
+        assembler.add(first[2])
+
+        cels, missing = assembler.take(['1.0', '2.0'])
+
+        assert_that(cels, contains_exactly(*[has_properties(linkedid='2.0')] * 3))
+        assert_that(missing, contains_exactly('1.0'))
+
+    def test_discard(self):
+        for event in call('1.0'):
+            self.assembler.add(event)
+
+        self.assembler.discard(['1.0', '2.0'])
+
+        cels, missing = self.assembler.take(['1.0'])
+        assert_that(cels, empty())
+        assert_that(missing, contains_exactly('1.0'))
+
+    def test_disabled(self):
+        assembler = CallAssembler(max_cels=0)
+        for event in call('1.0'):
+            assembler.add(event)
+
+        cels, missing = assembler.take(['1.0'])
+
+        assert_that(cels, empty())
+        assert_that(missing, contains_exactly('1.0'))
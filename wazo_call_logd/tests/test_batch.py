@@ -0,0 +1,122 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import threading
+from collections import defaultdict
+from unittest import TestCase
+
+from hamcrest import assert_that, contains_exactly, has_entries, has_length
+
+from wazo_call_logd.batch import LinkedIdBatcher, LinkedIdWorkerPool
+
+
+class TestLinkedIdBatcher(TestCase):
+    def setUp(self):
+        self.batches = []
+        self.processed = threading.Event()
+
+    def _process(self, batch):
+        self.batches.append(batch)
+        self.processed.set()
+
+    def test_batch_flushed_when_full(self):
+        batcher = LinkedIdBatcher(self._process, max_size=3, max_delay=60)
+
+        with batcher:
+            for linked_id in ('1', '2', '3'):
+                batcher.submit(linked_id)
+            assert self.processed.wait(timeout=5)
+
+        assert_that(self.batches, contains_exactly(['1', '2', '3']))
+
+    def test_batch_flushed_after_delay(self):
+        batcher = LinkedIdBatcher(self._process, max_size=100, max_delay=0.01)
+
+        with batcher:
+            batcher.submit('1')
+            assert self.processed.wait(timeout=5)
+
+        assert_that(self.batches, contains_exactly(['1']))
+
+    def test_duplicate_linked_ids_are_merged(self):
+        batcher = LinkedIdBatcher(self._process, max_size=3, max_delay=60)
+
+        with batcher:
+            for linked_id in ('1', '2', '1'):
+                batcher.submit(linked_id)
+            assert self.processed.wait(timeout=5)
+
+        assert_that(self.batches, contains_exactly(['1', '2']))
+
+    def test_pending_linked_ids_flushed_on_stop(self):
+        batcher = LinkedIdBatcher(self._process, max_size=100, max_delay=60)
+
+        batcher.start()
+        batcher.submit('1')
+        batcher.submit('2')
+        batcher.stop()
+
+        assert_that(self.batches, has_length(1))
+        assert_that(self.batches[0], contains_exactly('1', '2'))
+
+    def test_processing_errors_do_not_stop_the_batcher(self):
+        def process(batch):
+            self.batches.append(batch)
+            if len(self.batches) == 1:
+                raise Exception('failure')
+            self.processed.set()
+
+        batcher = LinkedIdBatcher(process, max_size=1, max_delay=60)
+
+        with batcher:
+            batcher.submit('1')
+            batcher.submit('2')
+            assert self.processed.wait(timeout=5)
+
+        assert_that(self.batches, contains_exactly(['1'], ['2']))
+
+
+class TestLinkedIdWorkerPool(TestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.batches_by_thread = defaultdict(list)
+
+    def _process(self, batch):
+        with self.lock:
+            self.batches_by_thread[threading.current_thread().name].extend(batch)
+
+    def test_same_linked_id_always_handled_by_the_same_worker(self):
+        pool = LinkedIdWorkerPool(self._process, workers=4, max_size=1, max_delay=0)
+
+        with pool:
+            for i in range(100):
+                pool.submit(str(i % 10))
+
+        for linked_id in (str(i) for i in range(10)):
+            threads = [
+                name
+                for name, linked_ids in self.batches_by_thread.items()
+                if linked_id in linked_ids
+            ]
+            assert_that(threads, has_length(1))
+
+    def test_correlated_linked_ids_handled_by_the_same_worker(self):
+        pool = LinkedIdWorkerPool(self._process, workers=4, max_size=1, max_delay=0)
+
+        with pool:
+            for i in range(10):
+                pool.submit(f'{i}.0', key='0.0')
+
+        assert_that(self.batches_by_thread, has_length(1))
+
+    def test_provide_status(self):
+        pool = LinkedIdWorkerPool(self._process, workers=2, queue_size=10)
+        status = defaultdict(dict)
+
+        with pool:
+            pool.provide_status(status)
+
+        assert_that(
+            status['generation_workers'],
+            has_entries(status='ok', workers=2, queue_depth=0, queue_size=20),
+        )
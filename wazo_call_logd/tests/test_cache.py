@@ -0,0 +1,119 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from unittest import TestCase
+from unittest.mock import Mock
+
+from hamcrest import assert_that, calling, equal_to, has_entries, raises
+
+from wazo_call_logd.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TTLCache(max_size=2, ttl=10, clock=self.clock)
+
+    def test_get_or_load_caches_loaded_value(self):
+        loader = Mock(return_value='value')
+
+        first = self.cache.get_or_load('key', loader)
+        second = self.cache.get_or_load('key', loader)
+
+        assert_that(first, equal_to('value'))
+        assert_that(second, equal_to('value'))
+        loader.assert_called_once_with()
+        assert_that(self.cache.stats(), has_entries(hits=1, misses=1, size=1))
+
+    def test_none_values_are_cached(self):
+        loader = Mock(return_value=None)
+
+        self.cache.get_or_load('key', loader)
+        self.cache.get_or_load('key', loader)
+
+        loader.assert_called_once_with()
+
+    def test_loader_errors_are_not_cached(self):
+        loader = Mock(side_effect=[RuntimeError(), 'value'])
+
+        assert_that(
+            calling(self.cache.get_or_load).with_args('key', loader),
+            raises(RuntimeError),
+        )
+        result = self.cache.get_or_load('key', loader)
+
+        assert_that(result, equal_to('value'))
+        assert_that(loader.call_count, equal_to(2))
+
+    def test_entry_invalidated_while_loading_is_not_stored(self):
+        for invalidate in (
+            lambda: self.cache.pop('key'),
+            lambda: self.cache.remove_if(lambda key, value: False),
+            self.cache.clear,
+        ):
+
+            def stale_loader():
+                invalidate()
+                return 'stale'
+
+            result = self.cache.get_or_load('key', stale_loader)
+            assert_that(result, equal_to('stale'))
+
+            result = self.cache.get_or_load('key', Mock(return_value='fresh'))
+            assert_that(result, equal_to('fresh'))
+            self.cache.clear()
+
+    def test_invalidating_other_key_while_loading_stores_entry(self):
+        def loader():
+            self.cache.pop('other')
+            return 'value'
+
+        self.cache.get_or_load('key', loader)
+
+        assert_that(self.cache.get_or_load('key', Mock()), equal_to('value'))
+
+    def test_entries_expire_after_ttl(self):
+        loader = Mock(side_effect=['first', 'second'])
+
+        self.cache.get_or_load('key', loader)
+        self.clock.now = 10
+        result = self.cache.get_or_load('key', loader)
+
+        assert_that(result, equal_to('second'))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get_or_load('a', Mock())
+        self.cache.set('c', 3)
+
+        assert_that(self.cache.get_or_load('a', Mock()), equal_to(1))
+        loader = Mock(return_value='reloaded')
+        assert_that(self.cache.get_or_load('b', loader), equal_to('reloaded'))
+
+    def test_remove_if(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+
+        self.cache.remove_if(lambda key, value: value == 2)
+
+        assert_that(len(self.cache), equal_to(1))
+        assert_that(self.cache.get_or_load('a', Mock()), equal_to(1))
+
+    def test_zero_max_size_disables_caching(self):
+        cache = TTLCache(max_size=0)
+        loader = Mock(return_value='value')
+
+        cache.get_or_load('key', loader)
+        cache.get_or_load('key', loader)
+
+        assert_that(loader.call_count, equal_to(2))
+        assert_that(len(cache), equal_to(0))
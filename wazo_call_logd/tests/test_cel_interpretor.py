@@ -1,7 +1,8 @@
-# Copyright 2013-2024 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import urllib.parse
+from datetime import datetime, timezone
 from unittest import TestCase
 from unittest.mock import Mock, create_autospec, sentinel
 
@@ -23,16 +24,21 @@ from wazo_call_logd.exceptions import CELInterpretationError
 from ..cel_interpretor import (
     AbstractCELInterpretor,
     CallerCELInterpretor,
+    CELIndex,
     DispatchCELInterpretor,
+    LocalOriginateCELInterpretor,
     _extract_call_log_destination_variables,
     _extract_user_missed_call_variables,
     _parse_wazo_originate_all_lines_extra,
     bridge_info,
+    cel_extra,
     extract_cel_extra,
+    index_cels,
     is_valid_mixmonitor_start_extra,
     is_valid_mixmonitor_stop_extra,
 )
 from ..database.cel_event_type import CELEventType
+from ..database.cel_record import CEL_RECORD_FIELDS, CELRecord
 from ..raw_call_log import RawCallLog
 
 
@@ -127,6 +133,43 @@ class TestExtractCELExtra:
         assert_that(result, none())
 
 
+class TestCELExtra:
+    def test_record_extra_is_decoded_once(self):
+        cel = CELRecord(extra='{"key": "value"}')
+        cel.extra = 'not decoded again'
+
+        assert_that(cel_extra(cel), has_entries(key='value'))
+
+    def test_orm_cel_extra_is_decoded(self):
+        cel = Mock(extra='{"key": "value"}')
+
+        assert_that(cel_extra(cel), has_entries(key='value'))
+
+
+class TestCELRecord:
+    def test_from_row(self):
+        eventtime = datetime(2023, 5, 31, tzinfo=timezone.utc)
+        row = tuple(range(len(CEL_RECORD_FIELDS)))
+        row = row[:2] + (eventtime,) + row[3:-2] + ('{"key": "value"}', None)
+
+        cel = CELRecord.from_row(row)
+
+        assert_that(
+            cel,
+            has_properties(
+                id=0,
+                eventtime=eventtime,
+                extra_dict=has_entries(key='value'),
+                call_log_id=None,
+            ),
+        )
+
+    def test_eventtime_is_parsed(self):
+        cel = CELRecord(eventtime='2023-05-31 00:00:00.000000+00:00')
+
+        assert_that(cel.eventtime, equal_to(datetime(2023, 5, 31, tzinfo=timezone.utc)))
+
+
 class TestParseOriginateAllLinesExtra:
     def test_valid_payloads(self):
         user_uuid = 'some-uuid-value'
@@ -293,6 +336,51 @@ class TestCELDispatcher(TestCase):
         )
 
 
+class TestCELIndex(TestCase):
+    def setUp(self):
+        self.cels = [
+            Mock(uniqueid='1', eventtype='CHAN_START', channame='Local/a'),
+            Mock(uniqueid='2', eventtype='CHAN_START', channame='Local/b'),
+            Mock(uniqueid='1', eventtype='ANSWER', channame='Local/a'),
+            Mock(uniqueid='2', eventtype='BRIDGE_ENTER', channame='Local/b'),
+            Mock(uniqueid='2', eventtype='BRIDGE_ENTER', channame='Local/b'),
+        ]
+
+    def test_index(self):
+        cels = CELIndex(self.cels)
+
+        assert_that(cels, equal_to(self.cels))
+        assert_that(cels.started_uniqueids, contains_exactly('1', '2'))
+        assert_that(cels.of_channel('1'), contains_exactly(self.cels[0], self.cels[2]))
+        assert_that(cels.of_type('ANSWER'), contains_exactly(self.cels[2]))
+        assert_that(cels.first('2', 'BRIDGE_ENTER'), same_instance(self.cels[3]))
+        assert_that(cels.last('2', 'BRIDGE_ENTER'), same_instance(self.cels[4]))
+        assert_that(cels.first('3', 'ANSWER'), none())
+        assert_that(cels.has_type('XIVO_INCALL'), equal_to(False))
+
+    def test_index_cels_reuses_index(self):
+        cels = CELIndex(self.cels)
+
+        assert_that(index_cels(cels), same_instance(cels))
+
+    def test_local_originate_predicates(self):
+        cels = CELIndex(self.cels)
+
+        assert_that(
+            LocalOriginateCELInterpretor.first_two_channels_are_local(cels),
+            equal_to(True),
+        )
+        assert_that(
+            LocalOriginateCELInterpretor.first_channel_is_answered_before_any_other_operation(
+                cels
+            ),
+            equal_to(True),
+        )
+        assert_that(
+            LocalOriginateCELInterpretor.three_channels_minimum(cels), equal_to(False)
+        )
+
+
 class TestAbstractCELInterpretor(TestCase):
     def setUp(self):
         class ConcreteCELInterpretor(AbstractCELInterpretor):
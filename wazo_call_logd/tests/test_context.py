@@ -0,0 +1,109 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from unittest import TestCase
+from unittest.mock import Mock, call, patch
+
+from hamcrest import assert_that, calling, equal_to, none, not_, raises
+from requests.exceptions import ConnectionError
+
+from ..context import PRELOAD_PAGE_SIZE, PRELOAD_RETRY_DELAY, ContextResolver
+
+
+def confd_mock(contexts):
+    confd = Mock()
+
+    def list_contexts(name=None, limit=None, offset=0, **kwargs):
+        items = [c for c in contexts if name is None or c['name'] == name]
+        if limit is not None:
+            items = items[offset : offset + limit]
+        return {'items': items, 'total': len(contexts)}
+
+    confd.contexts.list.side_effect = list_contexts
+    return confd
+
+
+class TestContextResolver(TestCase):
+    def setUp(self):
+        self.contexts = [
+            {'name': 'ctx-one', 'tenant_uuid': 'tenant-one'},
+            {'name': 'ctx-two', 'tenant_uuid': 'tenant-two'},
+            {'name': 'ctx-three', 'tenant_uuid': 'tenant-two'},
+        ]
+        self.confd = confd_mock(self.contexts)
+        self.resolver = ContextResolver(self.confd, max_size=10, ttl=60)
+
+    def test_find_tenant_uuid_preloads_every_context(self):
+        with patch('wazo_call_logd.context.PRELOAD_PAGE_SIZE', 2):
+            self.resolver.find_tenant_uuid('ctx-one')
+            result = self.resolver.find_tenant_uuid('ctx-three')
+
+        assert_that(result, equal_to('tenant-two'))
+        self.confd.contexts.list.assert_has_calls(
+            [
+                call(recurse=True, limit=2, offset=0),
+                call(recurse=True, limit=2, offset=2),
+            ]
+        )
+        assert_that(self.confd.contexts.list.call_count, equal_to(2))
+
+    def test_unknown_context_is_looked_up_once(self):
+        self.resolver.find_tenant_uuid('unknown')
+        result = self.resolver.find_tenant_uuid('unknown')
+
+        assert_that(result, none())
+        self.confd.contexts.list.assert_called_with(name='unknown', recurse=True)
+        assert_that(self.confd.contexts.list.call_count, equal_to(2))
+
+    def test_context_event_invalidates_context_entry(self):
+        self.resolver.find_tenant_uuid('ctx-one')
+
+        self.resolver._on_context_event({'id': 1, 'name': 'ctx-one'})
+        self.resolver.find_tenant_uuid('ctx-one')
+        self.resolver.find_tenant_uuid('ctx-two')
+
+        self.confd.contexts.list.assert_called_with(name='ctx-one', recurse=True)
+        assert_that(self.confd.contexts.list.call_count, equal_to(2))
+
+    def test_preload_failure_falls_back_to_lookups(self):
+        self.confd.contexts.list.side_effect = [
+            ConnectionError(),
+            {'items': [self.contexts[0]], 'total': 1},
+        ]
+
+        assert_that(
+            calling(self.resolver.find_tenant_uuid).with_args('ctx-one'),
+            not_(raises(ConnectionError)),
+        )
+        self.confd.contexts.list.assert_called_with(name='ctx-one', recurse=True)
+
+    def test_failed_preload_is_retried(self):
+        now = 0
+        resolver = ContextResolver(self.confd, max_size=10, ttl=60, clock=lambda: now)
+        list_contexts = self.confd.contexts.list.side_effect
+        self.confd.contexts.list.side_effect = ConnectionError()
+        resolver.preload()
+
+        self.confd.contexts.list.side_effect = list_contexts
+        resolver.find_tenant_uuid('ctx-one')
+        self.confd.contexts.list.assert_called_with(name='ctx-one', recurse=True)
+
+        now = PRELOAD_RETRY_DELAY
+        result = resolver.find_tenant_uuid('ctx-three')
+
+        assert_that(result, equal_to('tenant-two'))
+        self.confd.contexts.list.assert_called_with(
+            recurse=True, limit=PRELOAD_PAGE_SIZE, offset=0
+        )
+        resolver.find_tenant_uuid('ctx-two')
+        assert_that(self.confd.contexts.list.call_count, equal_to(3))
+
+    def test_no_cache_does_not_preload(self):
+        resolver = ContextResolver(self.confd)
+
+        resolver.find_tenant_uuid('ctx-one')
+        result = resolver.find_tenant_uuid('ctx-one')
+
+        assert_that(result, equal_to('tenant-one'))
+        self.confd.contexts.list.assert_called_with(name='ctx-one', recurse=True)
+        assert_that(self.confd.contexts.list.call_count, equal_to(2))
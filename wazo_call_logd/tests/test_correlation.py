@@ -0,0 +1,94 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from unittest import TestCase
+
+from hamcrest import (
+    assert_that,
+    contains_exactly,
+    contains_inanyorder,
+    empty,
+    equal_to,
+)
+
+from ..correlation import CorrelationTracker
+
+
+def event(event_name, uniqueid, linkedid):
+    return {'EventName': event_name, 'UniqueID': uniqueid, 'LinkedID': linkedid}
+
+
+class TestCorrelationTracker(TestCase):
+    def setUp(self):
+        self.now = 0
+        self.tracker = CorrelationTracker(timeout=60, clock=lambda: self.now)
+
+    def test_single_call(self):
+        self.tracker.observe(event('CHAN_START', '1.0', '1.0'))
+
+        ended, expired = self.tracker.observe(event('LINKEDID_END', '1.0', '1.0'))
+
+        assert_that(ended, contains_exactly(('1.0', '1.0')))
+        assert_that(expired, empty())
+        assert_that(len(self.tracker), equal_to(0))
+
+    def test_correlated_calls_are_generated_when_the_last_one_ends(self):
+        self.tracker.observe(event('CHAN_START', '1.0', '1.0'))
+        self.tracker.observe(event('CHAN_START', '2.0', '2.0'))
+        # call pickup: the channel of the first call joins the second one
+        self.tracker.observe(event('BRIDGE_ENTER', '1.0', '2.0'))
+
+        ended, _ = self.tracker.observe(event('LINKEDID_END', '1.0', '1.0'))
+        assert_that(ended, empty())
+        assert_that(self.tracker.deferred, equal_to(1))
+
+        ended, _ = self.tracker.observe(event('LINKEDID_END', '2.0', '2.0'))
+        assert_that(ended, contains_exactly(('2.0', '1.0')))
+        assert_that(len(self.tracker), equal_to(0))
+
+    def test_stale_calls_are_expired(self):
+        self.tracker.observe(event('CHAN_START', '1.0', '1.0'))
+        self.tracker.observe(event('BRIDGE_ENTER', '1.0', '2.0'))
+        self.tracker.observe(event('CHAN_START', '3.0', '3.0'))
+        self.tracker.observe(event('LINKEDID_END', '1.0', '1.0'))
+
+        self.now = 61
+        ended, expired = self.tracker.observe(event('CHAN_START', '4.0', '4.0'))
+
+        assert_that(ended, empty())
+        assert_that(
+            expired,
+            contains_exactly(('1.0', '1.0'), ('2.0', '1.0'), ('3.0', '3.0')),
+        )
+        assert_that(self.tracker.expired, equal_to(2))
+        assert_that(len(self.tracker), equal_to(1))
+
+    def test_every_linkedid_of_expired_groups_is_returned(self):
+        self.tracker.observe(event('CHAN_START', '1.0', '1.0'))
+        self.tracker.observe(event('BRIDGE_ENTER', '1.0', '2.0'))
+        self.tracker.observe(event('BRIDGE_ENTER', '3.0', '2.0'))
+        self.tracker.observe(event('CHAN_START', '3.0', '3.0'))
+        # a group that never got any LINKEDID_END
+        self.tracker.observe(event('CHAN_START', '4.0', '4.0'))
+
+        self.now = 61
+        _, expired = self.tracker.observe(event('CHAN_START', '5.0', '5.0'))
+
+        assert_that(
+            expired,
+            contains_inanyorder(
+                ('1.0', '1.0'), ('2.0', '1.0'), ('3.0', '1.0'), ('4.0', '4.0')
+            ),
+        )
+        assert_that(self.tracker.expired, equal_to(2))
+        assert_that(len(self.tracker), equal_to(1))
+
+    def test_disabled(self):
+        tracker = CorrelationTracker(timeout=0)
+        tracker.observe(event('BRIDGE_ENTER', '1.0', '2.0'))
+
+        ended, expired = tracker.observe(event('LINKEDID_END', '1.0', '1.0'))
+
+        assert_that(ended, contains_exactly(('1.0', '1.0')))
+        assert_that(expired, empty())
+        assert_that(len(tracker), equal_to(0))
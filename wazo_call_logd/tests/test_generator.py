@@ -1,4 +1,4 @@
-# Copyright 2013-2024 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from __future__ import annotations
@@ -31,11 +31,15 @@ from wazo_call_logd.database.cel_event_type import CELEventType
 from wazo_call_logd.exceptions import InvalidCallLogException
 from wazo_call_logd.generator import (
     CallLogsGenerator,
+    CELStreamBuffer,
     _group_cels_by_shared_channels,
     _ParticipantsProcessor,
+    cel_fingerprint,
 )
 from wazo_call_logd.raw_call_log import RawCallLog
 
+CEL_IDS = itertools.count(1)
+
 
 def mock_call():
     return create_autospec(
@@ -156,6 +160,24 @@ class TestCallLogsGenerator(TestCase):
 
         assert_that(result, contains_exactly(expected_call_1))
 
+    @patch('wazo_call_logd.generator.RawCallLog')
+    def test_call_logs_from_cel_prefetches_participants(self, raw_call_log_constructor):
+        resolver = Mock()
+        resolver.find_participant.return_value = None
+        generator = CallLogsGenerator(self.confd_client, [self.interpretor], resolver)
+        cels_1 = self._generate_cels_for_call('9328742934')
+        cels_2 = self._generate_cels_for_call('2707230959')
+        call_1 = mock_call()
+        call_1.raw_participants = {'PJSIP/abcdef-00000001': {'role': 'source'}}
+        call_2 = mock_call()
+        call_2.participants_info = [{'user_uuid': 'user-uuid', 'role': 'source'}]
+        self.interpretor.interpret_cels.side_effect = [call_1, call_2]
+        raw_call_log_constructor.side_effect = [call_1, call_2]
+
+        generator.call_logs_from_cel(cels_1 + cels_2)
+
+        resolver.prefetch.assert_called_once_with({'abcdef'}, {'user-uuid'})
+
     def test_list_call_log_ids(self):
         cel_1, cel_2 = Mock(call_log_id=1), Mock(call_log_id=1)
         cel_3, cel_4 = Mock(call_log_id=2), Mock(call_log_id=None)
@@ -191,6 +213,26 @@ class TestCallLogsGenerator(TestCase):
         assert_that(interpretor_true_2.interpret_cels.called, is_(False))
         assert_that(interpretor_false.interpret_cels.called, is_(False))
 
+    @patch('wazo_call_logd.generator.RawCallLog')
+    def test_from_cel_skips_unchanged_calls(self, raw_call_log_constructor):
+        unchanged_cels = self._generate_cels_for_call('1.0')
+        changed_cels = self._generate_cels_for_call('2.0')
+        for cel in unchanged_cels:
+            cel.call_log_id = 1
+        for cel in changed_cels:
+            cel.call_log_id = 2
+        fingerprints = {1: cel_fingerprint(unchanged_cels), 2: 'previous'}
+        raw_call_log_constructor.return_value = mock_call()
+
+        result = self.generator.from_cel(unchanged_cels + changed_cels, fingerprints)
+
+        self.interpretor.interpret_cels.assert_called_once_with(changed_cels, ANY)
+        assert_that(result.call_logs_to_delete, equal_to({2}))
+        assert_that(
+            raw_call_log_constructor.return_value.cel_fingerprint,
+            equal_to(cel_fingerprint(changed_cels)),
+        )
+
     def test_given_no_interpretor_can_interpret_then_raise(self):
         interpretor = Mock()
         interpretor.can_interpret.return_value = False
@@ -233,6 +275,7 @@ class TestCallLogsGenerator(TestCase):
                 create_autospec(
                     CEL,
                     instance=True,
+                    id=next(CEL_IDS),
                     linkedid=linked_id,
                     eventtime=f'2023-05-31 00:00:0{i}.000000+00',
                 )
@@ -241,6 +284,7 @@ class TestCallLogsGenerator(TestCase):
             create_autospec(
                 CEL,
                 instance=True,
+                id=next(CEL_IDS),
                 linkedid=linked_id,
                 eventtype=CELEventType.linkedid_end,
                 eventtime=f'2023-05-31 00:00:0{i}.000000+00',
@@ -255,6 +299,7 @@ class TestCallLogsGenerator(TestCase):
                 create_autospec(
                     CEL,
                     instance=True,
+                    id=next(CEL_IDS),
                     linkedid=linked_id,
                     eventtime=f'2023-05-31 00:00:0{i}.000000+00',
                 )
@@ -484,3 +529,117 @@ class TestGroupCelsBySharedChannels(TestCase):
                 ),
             ),
         )
+
+    def test_sequence_bridging_two_groups_merges_them(self):
+        cel_sequence_1 = self._generate_cel_sequence(
+            '1.0', iter(['1.0', '1.1']).__next__, cel_count=2
+        )
+        cel_sequence_2 = self._generate_cel_sequence(
+            '2.0', iter(['2.0', '2.1']).__next__, cel_count=2
+        )
+        # the last sequence shares a channel with both previous sequences
+        cel_sequence_3 = self._generate_cel_sequence(
+            '3.0', iter(['1.1', '2.1']).__next__, cel_count=2
+        )
+        cels = cel_sequence_1 + cel_sequence_2 + cel_sequence_3
+
+        groups = list(_group_cels_by_shared_channels(cels))
+
+        assert_that(
+            groups,
+            contains_exactly(
+                contains_exactly(
+                    contains_inanyorder('1.0', '2.0', '3.0'),
+                    contains_inanyorder(*cels),
+                )
+            ),
+        )
+
+
+class TestCELStreamBuffer(TestCase):
+    def _cel(self, linkedid, uniqueid, second, eventtype='ANSWER', call_log_id=None):
+        return Mock(
+            linkedid=linkedid,
+            uniqueid=uniqueid,
+            eventtype=eventtype,
+            eventtime=f'2023-05-31 00:00:{second:02}.000000+00',
+            call_log_id=call_log_id,
+            channame='PJSIP/abcdef-00000001',
+        )
+
+    def _call(self, linkedid, start, call_log_id=None):
+        return [
+            self._cel(linkedid, linkedid, start, 'CHAN_START', call_log_id),
+            self._cel(linkedid, linkedid, start + 1, 'HANGUP', call_log_id),
+            self._cel(
+                linkedid, linkedid, start + 2, CELEventType.linkedid_end, call_log_id
+            ),
+        ]
+
+    def test_terminated_calls_are_ready(self):
+        buffer = CELStreamBuffer(max_cels=100)
+        call = self._call('1.0', 0)
+
+        ready, refetch = buffer.feed(call)
+
+        assert_that(ready, contains_exactly(*call))
+        assert_that(refetch, empty())
+        assert_that(buffer, has_length(0))
+
+    def test_unterminated_calls_are_carried_over(self):
+        buffer = CELStreamBuffer(max_cels=100)
+        call = self._call('1.0', 0)
+
+        ready, refetch = buffer.feed(call[:2])
+        assert_that(ready, empty())
+        assert_that(buffer, has_length(2))
+
+        ready, refetch = buffer.feed(call[2:])
+        assert_that(ready, contains_inanyorder(*call))
+        assert_that(refetch, empty())
+        assert_that(buffer, has_length(0))
+
+    def test_processed_calls_are_dropped(self):
+        buffer = CELStreamBuffer(max_cels=100)
+
+        ready, refetch = buffer.feed(self._call('1.0', 0, call_log_id=42))
+
+        assert_that(ready, empty())
+        assert_that(refetch, empty())
+        assert_that(buffer, has_length(0))
+
+    def test_calls_started_before_the_window_are_refetched(self):
+        buffer = CELStreamBuffer(max_cels=100)
+        # only the CEL of a second channel are in the window
+        cels = [
+            self._cel('1.0', '1.1', 1, 'HANGUP'),
+            self._cel('1.0', '1.1', 2, CELEventType.linkedid_end),
+        ]
+
+        ready, refetch = buffer.feed(cels)
+
+        assert_that(ready, empty())
+        assert_that(refetch, contains_exactly('1.0'))
+
+    def test_calls_whose_first_channel_started_before_the_window_are_refetched(
+        self,
+    ):
+        buffer = CELStreamBuffer(max_cels=100)
+        # the first channel started before the window, its later CEL are in it
+        cels = self._call('1.0', 0)[1:]
+
+        ready, refetch = buffer.feed(cels)
+
+        assert_that(ready, empty())
+        assert_that(refetch, contains_exactly('1.0'))
+
+    def test_oldest_calls_are_evicted_over_budget(self):
+        buffer = CELStreamBuffer(max_cels=3)
+        old_call = self._call('1.0', 0)
+        new_call = self._call('2.0', 10)
+
+        ready, refetch = buffer.feed(old_call[:2] + new_call[:2])
+
+        assert_that(ready, empty())
+        assert_that(refetch, contains_exactly('1.0'))
+        assert_that(buffer, has_length(2))
@@ -1,12 +1,25 @@
-# Copyright 2015-2023 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2015-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+from datetime import datetime, timedelta, timezone
 from unittest import TestCase
-from unittest.mock import Mock
+from unittest.mock import ANY, Mock
+
+from hamcrest import (
+    assert_that,
+    close_to,
+    contains_exactly,
+    equal_to,
+    greater_than_or_equal_to,
+    has_entries,
+    less_than_or_equal_to,
+)
 
 from wazo_call_logd.bus import BusPublisher
-from wazo_call_logd.generator import CallLogsGenerator
+from wazo_call_logd.database.cel_event_type import CELEventType
+from wazo_call_logd.generator import CallLogsCreation, CallLogsGenerator
 from wazo_call_logd.manager import CallLogsManager
+from wazo_call_logd.metrics import generation_metrics
 from wazo_call_logd.writer import CallLogsWriter
 
 
@@ -23,8 +36,10 @@ class TestCallLogsManager(TestCase):
             self.publisher,
         )
 
+        generation_metrics.reset()
+
     def tearDown(self):
-        pass
+        generation_metrics.reset()
 
     def test_generate_from_count(self):
         cel_count = 132456
@@ -34,8 +49,231 @@ class TestCallLogsManager(TestCase):
         self.manager.generate_from_count(cel_count=cel_count)
 
         self.dao.cel.find_last_unprocessed.assert_called_once_with(cel_count)
-        self.generator.from_cel.assert_called_once_with(cels)
+        self.generator.from_cel.assert_called_once_with(
+            cels, self.dao.call_log.find_cel_fingerprints.return_value
+        )
+        self.writer.write.assert_called_once_with(call_logs)
+
+    def test_generate_from_days(self):
+        call = [
+            Mock(
+                linkedid='1.0',
+                uniqueid='1.0',
+                eventtype=eventtype,
+                eventtime=f'2023-05-31 00:00:0{i}',
+                call_log_id=None,
+                channame='PJSIP/abcdef-00000001',
+            )
+            for i, eventtype in enumerate(['CHAN_START', 'HANGUP', 'LINKEDID_END'])
+        ]
+        self.dao.cel.iter_slices_since.return_value = iter([call[:2], call[2:]])
+        call_logs = self.generator.from_cel.return_value = Mock(new_call_logs=[])
+
+        self.manager.generate_from_days(days=1, slice_size=2)
+
+        self.dao.cel.iter_slices_since.assert_called_once_with(ANY, 2, None)
+        self.generator.from_cel.assert_called_once_with(
+            call, self.dao.call_log.find_cel_fingerprints.return_value
+        )
         self.writer.write.assert_called_once_with(call_logs)
+        self.dao.cel.find_from_linked_ids.assert_not_called()
+
+    def test_generate_from_days_refetches_evicted_calls(self):
+        cels = [
+            Mock(
+                linkedid='1.0',
+                uniqueid='1.0',
+                eventtype='CHAN_START',
+                eventtime='2023-05-31 00:00:00',
+                call_log_id=None,
+                channame='PJSIP/abcdef-00000001',
+            )
+        ]
+        self.dao.cel.iter_slices_since.return_value = iter([cels])
+        self.dao.cel.find_from_linked_ids.return_value = []
+        self.generator.from_cel.return_value = Mock(new_call_logs=[])
+
+        self.manager.generate_from_days(days=1, max_buffered_cels=0)
+
+        self.dao.cel.find_from_linked_ids.assert_called_once_with(['1.0'])
+
+    def test_generate_from_period_returns_unterminated_linked_ids(self):
+        cels = [
+            Mock(
+                linkedid='1.0',
+                uniqueid='1.0',
+                eventtype='CHAN_START',
+                eventtime='2023-05-31 00:00:00',
+                call_log_id=None,
+                channame='PJSIP/abcdef-00000001',
+            )
+        ]
+        self.dao.cel.iter_slices_since.return_value = iter([cels])
+
+        result = self.manager.generate_from_period(start=Mock(), end=Mock())
+
+        assert_that(result, contains_exactly('1.0'))
+        self.generator.from_cel.assert_not_called()
+
+    def test_generate_incremental_from_watermark(self):
+        eventtime = datetime(2023, 5, 31)
+        self.dao.watermark.find.return_value = Mock(cel_eventtime=eventtime)
+        cels = [
+            Mock(
+                id=42,
+                linkedid='1.0',
+                uniqueid='1.0',
+                eventtype='CHAN_START',
+                eventtime=eventtime + timedelta(seconds=1),
+                call_log_id=None,
+                channame='PJSIP/abcdef-00000001',
+            ),
+            Mock(
+                id=43,
+                linkedid='2.0',
+                uniqueid='2.0',
+                eventtype='LINKEDID_END',
+                eventtime=eventtime + timedelta(seconds=2),
+                call_log_id=1,
+                channame='PJSIP/abcdef-00000002',
+            ),
+        ]
+        self.dao.cel.iter_slices_since.return_value = iter([cels])
+
+        self.manager.generate_incremental(lookback=timedelta(hours=1), slice_size=10)
+
+        self.dao.cel.iter_slices_since.assert_called_once_with(
+            eventtime - timedelta(hours=1), 10, None
+        )
+        # the unterminated call is looked at again by the next run
+        self.dao.watermark.update.assert_called_once_with(42, cels[0].eventtime)
+
+    def test_generate_incremental_without_watermark(self):
+        self.dao.watermark.find.return_value = None
+        eventtime = datetime(2023, 5, 31)
+        cels = [
+            Mock(
+                id=42,
+                linkedid='1.0',
+                uniqueid='1.0',
+                eventtype='LINKEDID_END',
+                eventtime=eventtime - timedelta(hours=20),
+                call_log_id=None,
+                channame='PJSIP/abcdef-00000001',
+            ),
+            Mock(
+                id=43,
+                linkedid='2.0',
+                uniqueid='2.0',
+                eventtype='LINKEDID_END',
+                eventtime=eventtime,
+                call_log_id=None,
+                channame='PJSIP/abcdef-00000002',
+            ),
+        ]
+        self.dao.cel.find_last_unprocessed.return_value = cels
+        self.generator.from_cel.return_value = Mock(new_call_logs=[])
+        self.dao.cel.iter_slices_since.return_value = iter([])
+
+        self.manager.generate_incremental(
+            lookback=timedelta(hours=1), slice_size=10, cel_count=1000
+        )
+
+        # unprocessed CEL older than the lookback are swept like before
+        self.dao.cel.find_last_unprocessed.assert_called_once_with(1000)
+        self.generator.from_cel.assert_called_once_with(
+            cels, self.dao.call_log.find_cel_fingerprints.return_value
+        )
+        self.dao.watermark.update.assert_called_once_with(43, eventtime)
+        self.dao.cel.iter_slices_since.assert_called_once_with(
+            eventtime - timedelta(hours=1), 10, None
+        )
+
+    def test_generate_incremental_without_watermark_nor_unprocessed_cel(self):
+        self.dao.watermark.find.return_value = None
+        self.dao.cel.find_last_unprocessed.return_value = []
+        self.generator.from_cel.return_value = Mock(new_call_logs=[])
+        self.dao.cel.iter_slices_since.return_value = iter([])
+
+        before = datetime.now()
+        self.manager.generate_incremental(lookback=timedelta(hours=1), slice_size=10)
+
+        start, slice_size, end = self.dao.cel.iter_slices_since.call_args[0]
+        assert_that(start, greater_than_or_equal_to(before - timedelta(hours=1)))
+        assert_that(start, less_than_or_equal_to(datetime.now() - timedelta(hours=1)))
+        assert_that((slice_size, end), equal_to((10, None)))
+        self.dao.watermark.update.assert_not_called()
+
+    def test_generate_from_assembled_cels(self):
+        cels = [Mock(), Mock()]
+        new_call_logs = [Mock(conversation_id='1.0', linked_ids=['1.0'])]
+        self.generator.from_cel.return_value = CallLogsCreation(
+            new_call_logs=new_call_logs, call_logs_to_delete=set()
+        )
+        self.dao.call_log.find_ids_from_conversation_ids.return_value = [42]
+
+        self.manager.generate_from_assembled_cels(cels)
+
+        self.dao.call_log.find_ids_from_conversation_ids.assert_called_once_with(
+            ['1.0']
+        )
+        self.writer.write.assert_called_once_with(
+            CallLogsCreation(new_call_logs=new_call_logs, call_logs_to_delete={42})
+        )
+        self.dao.cel.find_from_linked_ids.assert_not_called()
+
+    def test_generate_from_assembled_cels_isolates_failures(self):
+        cels = [Mock(linkedid='1.0'), Mock(linkedid='2.0'), Mock(linkedid='3.0')]
+        self.dao.cel.find_from_linked_ids.return_value = cels
+        self.dao.cel.find_from_linked_id.side_effect = lambda linked_id: [
+            cel for cel in cels if cel.linkedid == linked_id
+        ]
+
+        def from_cel(cels, *args):
+            if any(cel.linkedid == '2.0' for cel in cels):
+                raise Exception('malformed call')
+            return CallLogsCreation(
+                new_call_logs=[Mock(conversation_id=cel.linkedid) for cel in cels],
+                call_logs_to_delete=set(),
+            )
+
+        self.generator.from_cel.side_effect = from_cel
+
+        self.manager.generate_from_assembled_cels(cels)
+
+        self.dao.cel.find_from_linked_ids.assert_called_once_with(['1.0', '2.0', '3.0'])
+        written = [
+            call_log.conversation_id
+            for call in self.writer.write.call_args_list
+            for call_log in call.args[0].new_call_logs
+        ]
+        assert_that(written, contains_exactly('1.0', '3.0'))
+
+    def test_generate_from_assembled_cels_observes_end_to_end_lag(self):
+        ended_at = datetime.now(timezone.utc) - timedelta(seconds=30)
+        cels = [
+            Mock(eventtype=CELEventType.chan_start, linkedid='1.0'),
+            Mock(
+                eventtype=CELEventType.linkedid_end, linkedid='1.0', eventtime=ended_at
+            ),
+        ]
+        self.generator.from_cel.return_value = CallLogsCreation(
+            new_call_logs=[Mock(conversation_id='1.0', linked_ids=['1.0'])],
+            call_logs_to_delete=set(),
+        )
+        self.dao.call_log.find_ids_from_conversation_ids.return_value = []
+
+        self.manager.generate_from_assembled_cels(cels)
+
+        histograms = generation_metrics.snapshot()['histograms']
+        assert_that(
+            histograms,
+            has_entries(
+                end_to_end_lag=has_entries(count=1, sum=close_to(30, 5)),
+                db_write=has_entries(count=1),
+                bus_publish=has_entries(count=1),
+            ),
+        )
 
     def test_generate_from_linked_id(self):
         linked_id = '666'
@@ -45,5 +283,33 @@ class TestCallLogsManager(TestCase):
         self.manager.generate_from_linked_id(linked_id=linked_id)
 
         self.dao.cel.find_from_linked_id.assert_called_once_with(linked_id)
-        self.generator.from_cel.assert_called_once_with(cels)
+        self.generator.from_cel.assert_called_once_with(
+            cels, self.dao.call_log.find_cel_fingerprints.return_value
+        )
         self.writer.write.assert_called_once_with(call_logs)
+
+    def test_generate_from_linked_ids(self):
+        linked_ids = ['666', '667']
+        cels = self.dao.cel.find_from_linked_ids.return_value = [Mock(), Mock()]
+        call_logs = self.generator.from_cel.return_value = Mock(new_call_logs=[])
+
+        self.manager.generate_from_linked_ids(linked_ids)
+
+        self.dao.cel.find_from_linked_ids.assert_called_once_with(linked_ids)
+        self.generator.from_cel.assert_called_once_with(
+            cels, self.dao.call_log.find_cel_fingerprints.return_value
+        )
+        self.writer.write.assert_called_once_with(call_logs)
+
+    def test_generate_from_linked_ids_isolates_failures(self):
+        linked_ids = ['666', '667']
+        self.dao.cel.find_from_linked_ids.return_value = [Mock(), Mock()]
+        self.dao.cel.find_from_linked_id.return_value = [Mock()]
+        self.generator.from_cel.return_value = Mock(new_call_logs=[])
+        self.writer.write.side_effect = [Exception('batch'), Exception('666'), None]
+
+        self.manager.generate_from_linked_ids(linked_ids)
+
+        self.dao.cel.find_from_linked_id.assert_any_call('666')
+        self.dao.cel.find_from_linked_id.assert_any_call('667')
+        assert self.writer.write.call_count == 3
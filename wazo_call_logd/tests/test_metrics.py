@@ -0,0 +1,70 @@
+# Copyright 2026 The Wazo Authors  (see the AUTHORS file)
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from unittest import TestCase
+
+from hamcrest import assert_that, equal_to, has_entries, has_entry
+
+from ..metrics import GenerationMetrics, Histogram
+
+
+class TestHistogram(TestCase):
+    def test_snapshot_has_cumulative_buckets(self):
+        histogram = Histogram(buckets=(0.1, 1))
+
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value)
+
+        assert_that(
+            histogram.snapshot(),
+            equal_to(
+                {
+                    'count': 4,
+                    'sum': 2.65,
+                    'buckets': {'0.1': 2, '1': 3, '+Inf': 4},
+                }
+            ),
+        )
+
+
+class TestGenerationMetrics(TestCase):
+    def setUp(self):
+        self.metrics = GenerationMetrics(buckets=(1,))
+
+    def test_time_observes_elapsed_time(self):
+        with self.metrics.time('db_write'):
+            pass
+
+        histograms = self.metrics.snapshot()['histograms']
+        assert_that(histograms, has_entry('db_write', has_entries(count=1)))
+
+    def test_time_observes_failures(self):
+        try:
+            with self.metrics.time('db_write'):
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+
+        histograms = self.metrics.snapshot()['histograms']
+        assert_that(histograms, has_entry('db_write', has_entries(count=1)))
+
+    def test_increment(self):
+        self.metrics.increment('confd_calls')
+        self.metrics.increment('confd_calls', 2)
+
+        assert_that(self.metrics.snapshot()['counters'], equal_to({'confd_calls': 3}))
+
+    def test_provide_status(self):
+        self.metrics.observe('bus_publish', 0.5)
+        status = {'generation_metrics': {}}
+
+        self.metrics.provide_status(status)
+
+        assert_that(
+            status['generation_metrics'],
+            has_entries(
+                status='ok',
+                histograms=has_entry('bus_publish', has_entries(count=1, sum=0.5)),
+                counters={},
+            ),
+        )
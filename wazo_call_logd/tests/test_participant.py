@@ -1,13 +1,17 @@
-# Copyright 2013-2023 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from unittest import TestCase
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
-from hamcrest import assert_that, has_properties, none
+from hamcrest import assert_that, equal_to, has_properties, none
 from requests.exceptions import HTTPError
 
-from ..participant import find_participant, find_participant_by_uuid
+from ..participant import (
+    ParticipantResolver,
+    find_participant,
+    find_participant_by_uuid,
+)
 
 
 def confd_mock(lines=None):
@@ -116,3 +120,161 @@ class TestFindParticipant(TestCase):
             result,
             none(),
         )
+
+
+class TestParticipantResolver(TestCase):
+    def setUp(self):
+        self.user = {
+            'uuid': 'user_uuid',
+            'tenant_uuid': 'tenant_uuid',
+            'userfield': None,
+        }
+        lines = [{'id': 12, 'users': [self.user], 'extensions': []}]
+        self.confd = confd_mock(lines)
+        self.confd.users.list.return_value = {'items': [], 'total': 0}
+        self.resolver = ParticipantResolver(self.confd, max_size=10, ttl=60)
+
+    def test_find_participant_is_cached_by_line_name(self):
+        self.resolver.find_participant('PJSIP/abcdef-00000001')
+        result = self.resolver.find_participant('PJSIP/abcdef-00000002')
+
+        assert_that(result, has_properties(uuid='user_uuid', line_id=12))
+        self.confd.lines.list.assert_called_once_with(name='abcdef', recurse=True)
+        self.confd.users.get.assert_called_once_with('user_uuid')
+
+    def test_find_participant_by_uuid_is_cached(self):
+        self.resolver.find_participant_by_uuid('user_uuid')
+        result = self.resolver.find_participant_by_uuid('user_uuid')
+
+        assert_that(result, has_properties(uuid='user_uuid', line_id=12))
+        self.confd.users.get.assert_called_once_with('user_uuid')
+
+    def test_user_event_invalidates_user_entries(self):
+        self.resolver.find_participant('PJSIP/abcdef-00000001')
+        self.resolver.find_participant_by_uuid('user_uuid')
+
+        self.resolver._on_user_event({'uuid': 'user_uuid'})
+        self.resolver.find_participant('PJSIP/abcdef-00000001')
+        self.resolver.find_participant_by_uuid('user_uuid')
+
+        assert_that(self.confd.lines.list.call_count, equal_to(2))
+        assert_that(self.confd.users.get.call_count, equal_to(4))
+
+    def test_confd_errors_are_not_cached(self):
+        self.confd.users.get.side_effect = [
+            HTTPError(response=Mock(status_code=503, request=Mock())),
+            dict(self.user, lines=[]),
+            HTTPError(response=Mock(status_code=503, request=Mock())),
+            dict(self.user, lines=[]),
+        ]
+
+        assert_that(self.resolver.find_participant_by_uuid('user_uuid'), none())
+        result = self.resolver.find_participant_by_uuid('user_uuid')
+        assert_that(result, has_properties(uuid='user_uuid'))
+
+        assert_that(self.resolver.find_participant('PJSIP/abcdef-00000001'), none())
+        result = self.resolver.find_participant('PJSIP/abcdef-00000001')
+        assert_that(result, has_properties(uuid='user_uuid', line_id=12))
+
+    def test_user_event_during_lookup_is_not_overwritten(self):
+        def get_user(uuid):
+            self.resolver._on_user_event({'uuid': uuid})
+            return dict(self.user, lines=[])
+
+        self.confd.users.get.side_effect = get_user
+        self.resolver.find_participant_by_uuid('user_uuid')
+
+        self.confd.users.get.side_effect = None
+        self.confd.users.get.return_value = dict(self.user, lines=[])
+        self.resolver.find_participant_by_uuid('user_uuid')
+
+        assert_that(self.confd.users.get.call_count, equal_to(2))
+
+    def test_line_event_invalidates_line_entry(self):
+        self.resolver.find_participant('PJSIP/abcdef-00000001')
+        self.resolver.find_participant('PJSIP/other-00000001')
+
+        self.resolver._on_line_event({'id': 12, 'name': 'abcdef'})
+        self.resolver.find_participant('PJSIP/abcdef-00000001')
+        self.resolver.find_participant('PJSIP/other-00000001')
+
+        assert_that(self.confd.lines.list.call_count, equal_to(3))
+
+    def test_local_channels_are_not_looked_up(self):
+        result = self.resolver.find_participant('Local/1001@default-00000001;1')
+
+        assert_that(result, none())
+        self.confd.lines.list.assert_not_called()
+
+    def test_prefetch_lists_lines_and_users_in_bulk(self):
+        lines = [
+            {
+                'id': i,
+                'name': f'line{i}',
+                'users': [{'uuid': f'user{i}'}],
+                'extensions': [],
+            }
+            for i in range(20)
+        ]
+        users = [
+            {
+                'uuid': f'user{i}',
+                'tenant_uuid': 'tenant_uuid',
+                'userfield': None,
+                'lines': [{'id': i, 'extensions': []}],
+            }
+            for i in range(20)
+        ]
+        self.confd.lines.list.return_value = {'items': lines, 'total': len(lines)}
+        self.confd.users.list.return_value = {'items': users, 'total': len(users)}
+        line_names = [f'line{i}' for i in range(15)] + ['trunk']
+        self.resolver = ParticipantResolver(self.confd, max_size=100, ttl=60)
+
+        self.resolver.prefetch(line_names, ['user19'])
+
+        self.confd.lines.list.assert_called_once()
+        self.confd.users.list.assert_called_once()
+        assert_that(
+            self.resolver.find_participant('PJSIP/line3-00000001'),
+            has_properties(uuid='user3', line_id=3),
+        )
+        assert_that(
+            self.resolver.find_participant_by_uuid('user19'),
+            has_properties(uuid='user19', line_id=19),
+        )
+        self.confd.lines.list.assert_called_once()
+        self.confd.users.get.assert_not_called()
+
+    def test_prefetch_does_not_cache_misses(self):
+        lines = [
+            {
+                'id': i,
+                'name': f'line{i}',
+                'users': [{'uuid': f'user{i}'}],
+                'extensions': [],
+            }
+            for i in range(10)
+        ]
+        self.confd.lines.list.return_value = {'items': lines, 'total': len(lines)}
+        self.confd.users.list.return_value = {'items': [], 'total': 0}
+
+        self.resolver.prefetch([f'line{i}' for i in range(10)], ['user_uuid'])
+        self.confd.lines.list.return_value = {'items': lines[:1]}
+        self.resolver.find_participant('PJSIP/line0-00000001')
+        self.resolver.find_participant_by_uuid('user_uuid')
+
+        self.confd.lines.list.assert_called_with(name='line0', recurse=True)
+        self.confd.users.get.assert_called_with('user_uuid')
+
+    def test_prefetch_pages_are_bounded_by_the_number_of_lines(self):
+        self.confd.lines.list.return_value = {'items': [], 'total': 100000}
+
+        with patch('wazo_call_logd.participant.PREFETCH_MIN_LINES', 2):
+            self.resolver.prefetch(['line1', 'line2'], [])
+
+        assert_that(self.confd.lines.list.call_count, equal_to(2))
+
+    def test_prefetch_few_lines_are_looked_up_individually(self):
+        self.resolver.prefetch(['abcdef'], [])
+
+        self.confd.lines.list.assert_not_called()
@@ -1,9 +1,13 @@
-# Copyright 2013-2022 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from unittest import TestCase
 from unittest.mock import Mock
 
+from hamcrest import assert_that, calling, equal_to, raises
+from psycopg2.errorcodes import FOREIGN_KEY_VIOLATION, UNIQUE_VIOLATION
+from sqlalchemy.exc import IntegrityError
+
 from wazo_call_logd.generator import CallLogsCreation
 from wazo_call_logd.writer import CallLogsWriter
 
@@ -30,3 +34,80 @@ class TestCallLogsWriter(TestCase):
         self.dao.call_log.delete_from_list.assert_called_once_with(
             call_logs_creation.call_logs_to_delete
         )
+
+    def test_write_registers_forgotten_tenants_again(self):
+        call_logs_creation = CallLogsCreation(
+            new_call_logs=[Mock(recordings=[], tenant_uuid='tenant')],
+            call_logs_to_delete=[],
+        )
+        error = IntegrityError('INSERT', {}, Mock(pgcode=FOREIGN_KEY_VIOLATION))
+        self.dao.call_log.create_from_list.side_effect = [error, None]
+
+        self.writer.write(call_logs_creation)
+
+        self.dao.tenant.forget.assert_called_once_with('tenant')
+        assert_that(
+            self.dao.tenant.create_all_uuids_if_not_exist.call_count, equal_to(2)
+        )
+        assert_that(self.dao.call_log.create_from_list.call_count, equal_to(2))
+
+    def test_write_does_not_retry_other_integrity_errors(self):
+        call_logs_creation = CallLogsCreation(
+            new_call_logs=[Mock(recordings=[], tenant_uuid='tenant')],
+            call_logs_to_delete=[],
+        )
+        error = IntegrityError('INSERT', {}, Mock(pgcode=UNIQUE_VIOLATION))
+        self.dao.call_log.create_from_list.side_effect = error
+
+        assert_that(
+            calling(self.writer.write).with_args(call_logs_creation),
+            raises(IntegrityError),
+        )
+        self.dao.tenant.forget.assert_not_called()
+
+    def test_write_bulk(self):
+        writer = CallLogsWriter(self.dao, bulk=True)
+        call_logs_creation = CallLogsCreation(
+            new_call_logs=[
+                Mock(recordings=[], tenant_uuid='tenant'),
+                Mock(recordings=[], tenant_uuid='tenant'),
+            ],
+            call_logs_to_delete=[1, 2],
+        )
+
+        writer.write(call_logs_creation)
+
+        self.dao.tenant.create_all_uuids_if_not_exist.assert_called_once_with(
+            {'tenant'}
+        )
+        self.dao.call_log.bulk_create_from_list.assert_called_once_with(
+            call_logs_creation.new_call_logs, [1, 2]
+        )
+        self.dao.cel.unassociate_all_from_call_log_ids.assert_called_once_with([1, 2])
+        self.dao.cel.associate_all_to_call_logs.assert_called_once_with(
+            call_logs_creation.new_call_logs
+        )
+        self.dao.call_log.create_from_list.assert_not_called()
+        self.dao.call_log.delete_from_list.assert_not_called()
+
+    def test_write_in_place(self):
+        writer = CallLogsWriter(self.dao, bulk=True, update_in_place=True)
+        call_logs_creation = CallLogsCreation(
+            new_call_logs=[Mock(recordings=[], tenant_uuid='tenant')],
+            call_logs_to_delete=[1, 2],
+        )
+        self.dao.call_log.upsert_from_list.return_value = [2]
+
+        writer.write(call_logs_creation)
+
+        self.dao.tenant.create_all_uuids_if_not_exist.assert_called_once_with(
+            {'tenant'}
+        )
+        self.dao.call_log.upsert_from_list.assert_called_once_with(
+            call_logs_creation.new_call_logs, [1, 2]
+        )
+        self.dao.cel.unassociate_all_from_call_log_ids.assert_called_once_with([2])
+        self.dao.cel.associate_all_to_call_logs.assert_called_once_with(
+            call_logs_creation.new_call_logs
+        )
+        self.dao.call_log.bulk_create_from_list.assert_not_called()
@@ -1,12 +1,45 @@
-# Copyright 2013-2023 The Wazo Authors  (see the AUTHORS file)
+# Copyright 2013-2026 The Wazo Authors  (see the AUTHORS file)
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import logging
+
+from psycopg2.errorcodes import FOREIGN_KEY_VIOLATION
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
 
 class CallLogsWriter:
-    def __init__(self, dao):
+    def __init__(self, dao, bulk=False, update_in_place=False):
         self._dao = dao
+        self._bulk = bulk
+        self._update_in_place = update_in_place
 
     def write(self, call_logs):
+        try:
+            self._write(call_logs)
+        except IntegrityError as e:
+            if getattr(e.orig, 'pgcode', None) != FOREIGN_KEY_VIOLATION:
+                raise
+            # NOTE: the tenants may have been removed by another process,
+            # register them again
+            tenant_uuids = {cdr.tenant_uuid for cdr in call_logs.new_call_logs}
+            logger.info(
+                'Registering tenants %s again', ', '.join(map(str, tenant_uuids))
+            )
+            for tenant_uuid in tenant_uuids:
+                self._dao.tenant.forget(tenant_uuid)
+            self._write(call_logs)
+
+    def _write(self, call_logs):
+        if self._update_in_place:
+            self._write_in_place(call_logs)
+            return
+
+        if self._bulk:
+            self._write_bulk(call_logs)
+            return
+
         self._dao.call_log.delete_from_list(call_logs.call_logs_to_delete)
         self._dao.cel.unassociate_all_from_call_log_ids(call_logs.call_logs_to_delete)
 
@@ -14,3 +47,23 @@ class CallLogsWriter:
         self._dao.tenant.create_all_uuids_if_not_exist(tenant_uuids)
         self._dao.call_log.create_from_list(call_logs.new_call_logs)
         self._dao.cel.associate_all_to_call_logs(call_logs.new_call_logs)
+
+    def _write_bulk(self, call_logs):
+        tenant_uuids = {cdr.tenant_uuid for cdr in call_logs.new_call_logs}
+        self._dao.tenant.create_all_uuids_if_not_exist(tenant_uuids)
+        # NOTE: call logs are committed before CEL are associated, a crash in
+        # between leaves CEL unprocessed rather than CEL pointing to no call log
+        self._dao.call_log.bulk_create_from_list(
+            call_logs.new_call_logs, call_logs.call_logs_to_delete
+        )
+        self._dao.cel.unassociate_all_from_call_log_ids(call_logs.call_logs_to_delete)
+        self._dao.cel.associate_all_to_call_logs(call_logs.new_call_logs)
+
+    def _write_in_place(self, call_logs):
+        tenant_uuids = {cdr.tenant_uuid for cdr in call_logs.new_call_logs}
+        self._dao.tenant.create_all_uuids_if_not_exist(tenant_uuids)
+        deleted_ids = self._dao.call_log.upsert_from_list(
+            call_logs.new_call_logs, call_logs.call_logs_to_delete
+        )
+        self._dao.cel.unassociate_all_from_call_log_ids(deleted_ids)
+        self._dao.cel.associate_all_to_call_logs(call_logs.new_call_logs)